@@ -1,86 +1,85 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import List, Optional
 import pandas as pd
 import numpy as np
+import hmac
 import re
+import threading
 
 # Import schema
-from app.schemas import JobCardSummary, JobCardDetail, SearchRequest, UserColdStart, UserHistory
+from app.config import settings
+from app.schemas import (
+    JobCardSummary, JobCardDetail, JobIngestRequest, SearchBatchRequest, SearchRequest, UserColdStart, UserHistory
+)
 from app.services.data_loader import data_loader
-from app.services.search_engine import search_engine
-from app.services.heuristic import INDUSTRY_KEYWORDS, cold_start_filter, calculate_score_ranking
+from app.services.ingest import ingestor
+from app.services.search_engine import frame_rows, search_engine
+from app.services.query_cache import QueryCache
+from app.services.heuristic import INDUSTRY_KEYWORDS
+from app.services.ranking import top_k_indices
+from app.services.timing import set_label, stage
+from app.services.work_pool import Overloaded, work_pool
 
 router = APIRouter()
 
-# --- 1. HÀM XỬ LÝ LƯƠNG ---
-def format_salary(row):
-    s_str = str(row.get('salary_range', '')).strip()
-    # Nếu salary_range rỗng hoặc là các giá trị rác -> Tự tính toán
-    if not s_str or s_str.lower() in ['nan', 'none', '', '0', 'thỏa thuận']:
-        try:
-            min_s = float(row.get('min_salary_edited', 0))
-            max_s = float(row.get('max_salary_edited', 0))
-            
-            if min_s == 0 and max_s == 0: return "Thỏa thuận"
-            if min_s > 0 and max_s == 0: return f"Trên {int(min_s)} Triệu"
-            if min_s == 0 and max_s > 0: return f"Lên tới {int(max_s)} Triệu"
-            return f"{int(min_s)} - {int(max_s)} Triệu"
-        except:
-            return "Thỏa thuận"
-    return s_str
-
-# --- 2. HELPER CHUYỂN ĐỔI DATAFRAME -> SCHEMA ---
-def df_to_job_cards(df: pd.DataFrame, full_details: bool = False) -> List[Union[JobCardSummary, JobCardDetail]]:
-    results = []
-    
-    # Giá trị mặc định để tránh lỗi NoneType
-    fill_values = {
-        "location": "Unknown", "type": "Unknown", "position": "", "specializations": ""
-    }
-    if full_details:
-        fill_values.update({
-            "description": "", "requirements": "", "benefits": "", "experience": "", "level": ""
-        })
-
-    df_clean = df.fillna(fill_values)
-
-    for idx, row in df_clean.iterrows():
-        # Ưu tiên lấy điểm match_score (từ cold start) hoặc similarity_score (từ search)
-        score = row.get("similarity_score", row.get("match_score", 0.0))
-        job_id = row.get('id', idx)
-
-        # Xử lý list chuyên môn
-        specs_raw = row.get('specializations', [])
-        specs_list = []
-        if isinstance(specs_raw, str):
-            specs_list = [s.strip() for s in specs_raw.split(',') if s.strip()]
-        elif isinstance(specs_raw, list):
-            specs_list = specs_raw
-
-        job_data = {
-            "id": int(job_id),
-            "title": str(row.get('title', row.get('title_processed', 'No Title'))),
-            "location": str(row.get('location', 'Unknown')),
-            "type": str(row.get('type', 'Unknown')),
-            "position": str(row.get('position', '')),
-            "salary_range": format_salary(row), 
-            "specializations": specs_list,
-            "similarity_score": float(score)
-        }
+# --- 1. HELPER GHÉP RESPONSE TỪ JOB CARD DỰNG SẴN ---
+# Trả Response (bytes) trực tiếp: FastAPI bỏ qua bước validate lại theo response_model
+# (job card chỉ được thêm, không đổi row id -> bản mới nhất luôn chứa row id của snapshot request đang dùng)
+def job_cards_response(rows, scores=None) -> Response:
+    with stage("serialize"):
+        return Response(content=data_loader.job_cards.render(rows, scores), media_type="application/json")
+
+def frame_cards_response(df: pd.DataFrame) -> Response:
+    """Kết quả dạng DataFrame (index = row id, cột similarity_score nếu có) -> Response."""
+    scores = df['similarity_score'].to_numpy() if 'similarity_score' in df.columns else None
+    return job_cards_response(df.index.to_numpy(), scores)
+
+# --- 2. POOL XỬ LÝ NẶNG ---
+# Endpoint nặng (encode + chấm điểm) là async và chạy phần tính toán trong work_pool (giới hạn theo số core,
+# hàng đợi có hạn) -> pool đầy trả 503 + Retry-After ngay. Endpoint nhẹ vẫn là def thường (threadpool riêng)
+async def run_heavy(fn, *args):
+    try:
+        return await work_pool.run(fn, *args)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=f"Server đang quá tải ({e.reason}), vui lòng thử lại sau",
+                            headers={"Retry-After": str(e.retry_after)})
 
-        if full_details:
-            job_data.update({
-                "description": str(row.get('description', '')),
-                "requirements": str(row.get('requirements', '')),
-                "benefit": str(row.get('benefits', row.get('benefit', ''))),
-                "experience": str(row.get('experience', '')),
-                "level": str(row.get('level', ''))
-            })
-            results.append(JobCardDetail(**job_data))
-        else:
-            results.append(JobCardSummary(**job_data))
+# --- 3. CACHE KẾT QUẢ XẾP HẠNG (/search) ---
+# Key: (model, search_type, filters, pool_size, phiên bản data/index) + query -> (row ids, scores) tới SEARCH_RESULT_DEPTH
+result_cache = QueryCache(settings.SEARCH_RESULT_CACHE_SIZE, ttl=settings.SEARCH_RESULT_CACHE_TTL)
+result_cache_version = None
+result_cache_lock = threading.Lock()
 
-    return results
+def ranked_search(request: SearchRequest, data, query: str, candidate_rows, depth: int):
+    """Trả về (row ids, scores) đã xếp hạng, lấy từ cache nếu có. data: snapshot dữ liệu của request."""
+    global result_cache_version
+    version = (data.version, search_engine.index_version)
+    with result_cache_lock:
+        if version != result_cache_version:
+            # Dataset / index đổi -> bỏ toàn bộ kết quả cũ
+            result_cache.invalidate()
+            result_cache_version = version
+
+    filters_key = request.filters.model_dump_json() if request.filters else ""
+    cache_key = (request.model_name, request.search_type, filters_key, request.pool_size, version)
+    # Key tra cứu gồm bộ lọc / pool_size do client gửi -> hit / miss đếm chung 1 nhãn
+    cached = result_cache.get(cache_key, query, stats_key="search_result")
+    if cached is not None and (len(cached[0]) >= depth or cached[2]):
+        return cached[0], cached[1]
+
+    df_result = search_engine.search(
+        query=query, 
+        df_jobs=data.df,
+        model_name=request.model_name, 
+        search_field=request.search_type, 
+        top_k=depth,
+        candidate_rows=candidate_rows, # <-- Chỉ chấm điểm các dòng đã lọc
+        pool_size=request.pool_size
+    )
+    rows, scores = frame_rows(df_result)
+    # exhausted = True: đã lấy hết ứng viên, không cần tính sâu hơn
+    result_cache.put(cache_key, query, (rows, scores, len(rows) < depth))
+    return rows, scores
 
 # ==================== API ENDPOINTS ====================
 
@@ -89,7 +88,7 @@ def df_to_job_cards(df: pd.DataFrame, full_details: bool = False) -> List[Union[
 def get_options():
     try:
         # A. Xử lý Location
-        raw_locs = data_loader.df['location'].dropna().astype(str).tolist()
+        raw_locs = data_loader.current().df['location'].dropna().astype(str).tolist()
         loc_set = set()
         
         for item in raw_locs:
@@ -120,27 +119,44 @@ def get_options():
         print(f"Error meta: {e}")
         return {"locations": [], "industries": [], "types": []}
 
+# API Thống kê gom batch encode (kích thước batch, thời gian chờ hàng đợi)
+@router.get("/meta/encoder-stats")
+def get_encoder_stats():
+    return search_engine.encoder.stats()
+
+# API Thống kê cache query (hit / miss)
+@router.get("/meta/query-cache-stats")
+def get_query_cache_stats():
+    return search_engine.query_cache.stats()
+
+# API Danh sách model đã load (RAM, lần dùng cuối, ghim / đang dùng) + ngân sách RAM
+@router.get("/meta/models")
+def get_loaded_models():
+    return search_engine.model_stats()
+
+# API Thống kê pool xử lý nặng (đang chạy / đang chờ / bị từ chối)
+@router.get("/meta/work-pool-stats")
+def get_work_pool_stats():
+    return work_pool.stats()
+
 # 2. API Cold Start (Gợi ý ban đầu)
 @router.post("/cold-start", response_model=List[JobCardSummary])
 def cold_start_endpoint(criteria: UserColdStart):
     try:
         filters_dict = criteria.dict() 
+        data = data_loader.current()
 
-        # Bước 1: Lọc cứng (Dùng hàm chung)
-        df_filtered = cold_start_filter(data_loader.df, filters_dict)
-        
-        if df_filtered.empty:
+        # Bước 1: Lọc cứng (Dùng Filter Index dựng sẵn -> row id)
+        rows = data.filter_index.filter_rows(filters_dict)
+        if data.df.empty or (rows is not None and len(rows) == 0):
             return []
             
-        # Bước 2: Tính điểm Heuristic (Xếp hạng theo cấp bậc/tuổi)
-        df_filtered['match_score'] = df_filtered.apply(
-            lambda row: calculate_score_ranking(row, filters_dict), axis=1
-        )
-        
-        # Bước 3: Sort và lấy Top 20
-        top_jobs = df_filtered.sort_values(by='match_score', ascending=False).head(20)
+        # Bước 2: Tính điểm Heuristic (Xếp hạng theo cấp bậc/tuổi) trên cờ từ khóa dựng sẵn
+        scores = data.heuristic_scorer.scores(criteria.age, rows)
         
-        return df_to_job_cards(top_jobs, full_details=False)
+        # Bước 3: Lấy Top 20 bằng argpartition (đồng điểm -> dòng đứng trước)
+        top = top_k_indices(scores, 20)
+        return job_cards_response(top if rows is None else rows[top], scores[top])
         
     except Exception as e:
         import traceback
@@ -149,81 +165,174 @@ def cold_start_endpoint(criteria: UserColdStart):
 
 # 3. API Search Jobs (Đã tích hợp Bộ lọc bên trái)
 @router.post("/search", response_model=List[JobCardSummary])
-def search_jobs(request: SearchRequest):
+async def search_jobs(request: SearchRequest):
+    return await run_heavy(_search_jobs, request)
+
+def _search_jobs(request: SearchRequest):
+    set_label("model", request.model_name)
     try:
-        # A. Bắt đầu với toàn bộ dữ liệu
-        df_candidate = data_loader.df
+        # A. Bắt đầu với toàn bộ dữ liệu (1 snapshot cho cả request)
+        data = data_loader.current()
+        df_candidate = data.df
+        candidate_rows = None
 
         # B. ÁP DỤNG BỘ LỌC (QUAN TRỌNG: Đã thêm logic này)
         if request.filters:
             filters_dict = request.filters.dict()
-            # Dùng chung hàm lọc của Cold Start để đảm bảo nhất quán
-            # Hàm này sẽ lọc theo Location, Industry, Job Type và Min Salary
-            df_candidate = cold_start_filter(df_candidate, filters_dict)
+            # Dùng chung bộ lọc của Cold Start để đảm bảo nhất quán
+            # Lọc theo Location, Industry, Job Type và Min Salary -> row id (không copy)
+            candidate_rows = data.filter_index.filter_rows(filters_dict)
 
         # Nếu lọc xong mà rỗng -> Trả về rỗng ngay
-        if df_candidate.empty: 
+        if df_candidate.empty or (candidate_rows is not None and len(candidate_rows) == 0): 
             return []
 
         query = request.query.strip()
         
+        start, end = request.offset, request.offset + request.limit
+
         # C. Trường hợp User chỉ lọc mà KHÔNG nhập từ khóa
         if not query:
-            return df_to_job_cards(df_candidate.head(20), full_details=False)
-
-        # D. Trường hợp User CÓ nhập từ khóa -> Gọi AI Search trên tập đã lọc
-        df_result = search_engine.search(
-            query=query, 
-            df_jobs=df_candidate, # <-- Chỉ search trong tập dữ liệu đã lọc sạch
-            model_name=request.model_name, 
-            search_field=request.search_type, 
-            top_k=20
-        )
-
-        return df_to_job_cards(df_result, full_details=False)
+            if candidate_rows is None:
+                return job_cards_response(df_candidate.index[start:end])
+            return job_cards_response(candidate_rows[start:end])
+
+        # D. Trường hợp User CÓ nhập từ khóa -> Gọi AI Search trên tập đã lọc (có cache + phân trang)
+        rows, scores = ranked_search(request, data, query, candidate_rows, max(settings.SEARCH_RESULT_DEPTH, end))
+        return job_cards_response(rows[start:end], scores[start:end])
         
     except Exception as e:
         print(f"Error searching: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 3b. API Batch Search: nhiều query / 1 lần gọi (encode 1 batch, điểm Q x N 1 phép nhân ma trận)
+@router.post("/search/batch", response_model=List[List[JobCardSummary]])
+async def search_jobs_batch(request: SearchBatchRequest):
+    return await run_heavy(_search_jobs_batch, request)
+
+def _search_jobs_batch(request: SearchBatchRequest):
+    set_label("model", request.model_name)
+    try:
+        # A. Bộ lọc riêng từng query (bộ lọc giống nhau -> dùng chung 1 mảng row id)
+        data = data_loader.current()
+        filter_rows = {}
+        candidate_rows = []
+        for item in request.queries:
+            key = item.filters.model_dump_json() if item.filters else ""
+            if key not in filter_rows:
+                filter_rows[key] = data.filter_index.filter_rows(item.filters.model_dump()) if item.filters else None
+            candidate_rows.append(filter_rows[key])
+
+        # B. Query rỗng / lọc rỗng: xử lý như /search, còn lại search chung 1 lần
+        empty = (np.empty(0, dtype=np.int64), None)
+        results = [empty] * len(request.queries)
+        active = []
+        for i, (item, rows) in enumerate(zip(request.queries, candidate_rows)):
+            if data.df.empty or (rows is not None and len(rows) == 0):
+                continue
+            if not item.query.strip():
+                results[i] = (data.df.index[:request.limit] if rows is None else rows[:request.limit], None)
+            else:
+                active.append(i)
+
+        if active:
+            ranked = search_engine.search_many(
+                [request.queries[i].query.strip() for i in active],
+                data.df,
+                model_name=request.model_name,
+                search_field=request.search_type,
+                top_k=request.limit,
+                candidate_rows=[candidate_rows[i] for i in active],
+                pool_size=request.pool_size
+            )
+            for i, result in zip(active, ranked):
+                results[i] = result
+
+        with stage("serialize"):
+            body = b"[" + b",".join(data.job_cards.render(rows, scores) for rows, scores in results) + b"]"
+        return Response(content=body, media_type="application/json")
+
+    except Exception as e:
+        print(f"Error batch searching: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # 4. API Chi tiết Job
 @router.get("/job/{job_id}", response_model=JobCardDetail)
 def get_job_detail(job_id: int):
-    if job_id not in data_loader.df.index: 
+    data = data_loader.current()
+    if job_id not in data.df.index: 
         raise HTTPException(status_code=404, detail="Job Not Found")
-    # Lấy row dưới dạng DataFrame để dùng chung hàm convert
-    row = data_loader.df.loc[[job_id]]
-    return df_to_job_cards(row, full_details=True)[0]
+    # JSON chi tiết đã dựng sẵn lúc load data
+    return Response(content=data.job_cards.render_detail(job_id), media_type="application/json")
 
 # 5. API Recommend (Dựa trên lịch sử xem)
 @router.post("/recommend", response_model=List[JobCardSummary])
-def recommend_for_user(history: UserHistory):
+async def recommend_for_user(history: UserHistory):
+    return await run_heavy(_recommend_for_user, history)
+
+def _recommend_for_user(history: UserHistory):
+    set_label("model", "ensemble")
     try:
+        df = data_loader.current().df
         if not history.viewed_job_ids:
             # Nếu chưa có lịch sử, trả về random
-            return df_to_job_cards(data_loader.df.sample(20), full_details=False)
+            return frame_cards_response(df.sample(20))
             
-        df_res = search_engine.get_user_recommendation(history.viewed_job_ids, data_loader.df, top_k=20)
-        return df_to_job_cards(df_res, full_details=False)
+        df_res = search_engine.get_user_recommendation(history.viewed_job_ids, df, top_k=20)
+        return frame_cards_response(df_res)
     except Exception as e:
         print(f"Error recommend: {e}")
         return []
 
 # 6. API Similar Jobs (Job tương tự)
 @router.get("/job/{job_id}/similar", response_model=List[JobCardSummary])
-def recommend_similar(job_id: int):
+async def recommend_similar(job_id: int):
+    return await run_heavy(_recommend_similar, job_id)
+
+def _recommend_similar(job_id: int):
+    set_label("model", "ensemble")
     try:
-        if job_id not in data_loader.df.index: 
+        df = data_loader.current().df
+        if job_id not in df.index: 
             raise HTTPException(status_code=404, detail="Job Not Found")
             
-        job_row = data_loader.df.loc[job_id]
-        # Ghép title + description ngắn để tìm kiếm
-        content = str(job_row['title']) + " " + str(job_row['description'])[:200]
-        
-        df_res = search_engine.get_recommendation_ensemble(
-            content, data_loader.df, top_k=10, exclude_id=job_id
-        )
-        return df_to_job_cards(df_res, full_details=False)
+        # Dùng vector đã lưu của chính job (hoặc bảng láng giềng dựng sẵn) -> không chạy model
+        df_res = search_engine.get_similar_jobs(job_id, df, top_k=10)
+        return frame_cards_response(df_res)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error similar: {e}")
-        return []
\ No newline at end of file
+        return []
+
+# 7. API Admin: thêm / xóa job khi đang chạy (ghi segment, các worker tự đổi snapshot - không restart)
+# Tắt mặc định (404); bật bằng ADMIN_API_ENABLED=1 + ADMIN_TOKEN, gọi kèm header X-Admin-Token
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not settings.ADMIN_API_ENABLED or not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token không hợp lệ")
+
+@router.post("/admin/jobs", dependencies=[Depends(require_admin)])
+async def ingest_jobs(request: JobIngestRequest):
+    records = []
+    for job in request.jobs:
+        record = job.model_dump()
+        record["min_salary_edited"] = record.pop("min_salary")
+        record["max_salary_edited"] = record.pop("max_salary")
+        records.append(record)
+    try:
+        # Encode job mới bằng các model -> chạy trong pool xử lý nặng như search
+        return await run_heavy(ingestor.ingest, records, request.remove_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Gộp các segment thành 1 base (chạy nền)
+@router.post("/admin/compact", dependencies=[Depends(require_admin)])
+def compact_segments():
+    return {"started": ingestor.compact_async() is not None}
+
+# Phiên bản snapshot + kiểm tra số dòng dữ liệu / ma trận / chỉ mục
+@router.get("/admin/snapshot", dependencies=[Depends(require_admin)])
+def snapshot_status():
+    return ingestor.check_consistency()
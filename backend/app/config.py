@@ -5,8 +5,87 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 class Settings:
     # 1. DATA
     DATA_PATH = os.path.join(BASE_DIR, "data", "df_processed.xlsx")
+    # Snapshot cột (Arrow IPC) dựng từ file Excel -> đọc nhanh, memory-map (cần pyarrow)
+    DATA_SNAPSHOT_PATH = os.path.join(BASE_DIR, "data", "df_processed.arrow")
     STOPWORDS_PATH = os.path.join(BASE_DIR, "vietnamese-stopwords-dash.txt")
+    # Tách từ khi tiền xử lý: "underthesea" (như lúc train) | "longest_match" (ghép từ theo từ điển
+    # TF-IDF, nhanh hơn nhiều; kiểm tra độ khớp: python -m scripts.check_tokenizer_agreement)
+    PREPROCESS_TOKENIZER = os.getenv("PREPROCESS_TOKENIZER", "underthesea")
+    TOKENIZER_VOCAB_KEY = "tfidf_upgrade"
     SIMILARITY_MATRIX_PATH = os.path.join(BASE_DIR, "job_cosine_similarities.pkl")
+    # Bảng top-N job tương tự dựng sẵn (python -m scripts.build_similar_jobs)
+    SIMILAR_JOBS_PATH = os.path.join(BASE_DIR, "job_similar_neighbors.npz")
+    SIMILAR_JOBS_TOP_N = 50
+
+    # Gợi ý trang chủ (/recommend)
+    # "profile": vector user = trung bình giảm dần theo thời gian của vector job đã xem (không chạy model)
+    # "query": ghép text 5 job gần nhất thành query rồi chạy Ensemble Search (cách cũ)
+    RECOMMEND_MODE = "profile"
+    RECOMMEND_HISTORY_DECAY = 0.8
+    USER_PROFILE_CACHE_SIZE = 1024
+
+    # Warmup: số thread nạp song song dữ liệu + model lúc khởi động (tiến độ: GET /ready)
+    WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", "4"))
+
+    # Pool xử lý search / recommend (encode + chấm điểm): WORK_POOL_WORKERS thread (mặc định = số core),
+    # tối đa WORK_POOL_QUEUE request chờ. Đầy hoặc chờ quá WORK_POOL_QUEUE_TIMEOUT giây (0 -> không giới hạn)
+    # -> 503 + Retry-After ngay. Endpoint nhẹ (/job/{id}, /meta/...) không đi qua pool
+    WORK_POOL_WORKERS = int(os.getenv("WORK_POOL_WORKERS", str(os.cpu_count() or 4)))
+    WORK_POOL_QUEUE = int(os.getenv("WORK_POOL_QUEUE", "64"))
+    WORK_POOL_QUEUE_TIMEOUT = float(os.getenv("WORK_POOL_QUEUE_TIMEOUT", "10"))
+
+    # Thêm / xóa job khi đang chạy (python -m scripts.ingest_jobs, hoặc POST /api/admin/jobs nếu bật admin API):
+    # job mới ghi thành segment (dữ liệu + ma trận từng model) trong SEGMENTS_DIR, kèm manifest có phiên bản.
+    # Mỗi worker kiểm tra manifest mỗi SNAPSHOT_POLL_SECONDS giây (0 -> tắt) rồi đổi sang snapshot mới.
+    # Đủ SEGMENT_COMPACT_AT segment -> gộp nền thành 1 thế hệ base mới (memory-map được)
+    SEGMENTS_DIR = os.getenv("SEGMENTS_DIR", os.path.join(BASE_DIR, "segments"))
+    SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "5"))
+    SEGMENT_COMPACT_AT = int(os.getenv("SEGMENT_COMPACT_AT", "8"))
+    # API /api/admin/* (ingest / compact / snapshot) tắt mặc định -> dùng scripts.ingest_jobs.
+    # Bật: ADMIN_API_ENABLED=1 và đặt ADMIN_TOKEN; request phải gửi header "X-Admin-Token: <token>"
+    ADMIN_API_ENABLED = os.getenv("ADMIN_API_ENABLED", "0") == "1"
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+    # Micro-batching encode query (gom các request đồng thời cùng model thành 1 batch)
+    ENCODER_BATCH_WINDOW_MS = float(os.getenv("ENCODER_BATCH_WINDOW_MS", "3"))  # 0 -> tắt
+    ENCODER_MAX_BATCH = int(os.getenv("ENCODER_MAX_BATCH", "16"))
+
+    # Backend suy luận của encoder transformer (query + job mới), theo model key, thiếu key -> "default":
+    # backend: "torch" (như lúc train) | "torch_int8" (quantize động Linear -> int8) | "onnx" (ONNX Runtime,
+    #   cần optimum[onnxruntime]; onnx_file chọn bản export, vd "onnx/model_qint8_avx512_vnni.onnx")
+    # max_seq_length: cắt token query / job (None -> theo model); threads: số thread intra-op (None -> mặc định)
+    # Đổi cấu hình -> kiểm tra lệch cosine so với embedding gốc: python -m scripts.check_encoder_drift
+    ENCODER_BACKENDS = {
+        "default": {
+            "backend": os.getenv("ENCODER_BACKEND", "torch"),
+            "max_seq_length": int(os.getenv("ENCODER_MAX_SEQ_LENGTH")) if os.getenv("ENCODER_MAX_SEQ_LENGTH") else None,
+            "threads": int(os.getenv("ENCODER_THREADS")) if os.getenv("ENCODER_THREADS") else None,
+        },
+    }
+    # Cosine tối thiểu (vector backend mới vs vector gốc) để check_encoder_drift coi là đạt
+    ENCODER_DRIFT_MIN_COSINE = 0.99
+
+    # Cache query đã tiền xử lý + vector query (LRU, TTL)
+    QUERY_CACHE_MAX_ENTRIES = 10000
+    QUERY_CACHE_MAX_MB = 256
+    QUERY_CACHE_TTL = 24 * 3600                        # giây
+    QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH")   # Đặt đường dẫn -> lưu cache khi tắt, nạp lại khi warmup
+
+    # Model Registry: ngân sách RAM cho model đã load (None -> không giới hạn).
+    # Vượt ngân sách -> giải phóng model dùng lâu nhất (LRU), trừ các model ghim (dùng cho Ensemble)
+    MODEL_RAM_BUDGET_MB = float(os.getenv("MODEL_RAM_BUDGET_MB")) if os.getenv("MODEL_RAM_BUDGET_MB") else None
+    PINNED_MODELS = ["tfidf_basic", "tfidf_upgrade", "bge_m3_basic", "bge_m3_upgrade"]
+
+    # Cache kết quả xếp hạng của /search (phân trang offset / limit)
+    SEARCH_RESULT_DEPTH = 200          # Số job xếp hạng lưu cho mỗi query
+    SEARCH_RESULT_CACHE_SIZE = 2000
+    SEARCH_RESULT_CACHE_TTL = 3600     # giây
+
+    # /search/batch: số query tính chung 1 ma trận điểm (Q x N float64) mỗi lần
+    SEARCH_BATCH_BLOCK = 64
+
+    # In log chẩn đoán trên đường search (token query W2V, ...). Thời gian từng stage: GET /metrics
+    SEARCH_DEBUG = os.getenv("SEARCH_DEBUG", "0") == "1"
 
     # 2. MODEL PATHS
     MODEL_PATHS = {
@@ -105,5 +184,44 @@ class Settings:
         },
     }
 
+    # Ma trận embedding / TF-IDF mở bằng memory-map (read-only): nhiều uvicorn worker dùng chung 1 bản
+    # TF-IDF cần tách .npy trước: python -m scripts.convert_tfidf_mmap
+    EMBEDDING_MMAP = os.getenv("EMBEDDING_MMAP", "1") == "1"
+
+    # Quét embedding trên bản nén "int8" (nhỏ hơn 4 lần -> chủ yếu tiết kiệm RAM / page cache), rồi tính lại
+    # chính xác QUANT_SHORTLIST dòng tốt nhất trên bản gốc. Dựng bằng: python -m scripts.build_quantized_index
+    EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION") or None
+    QUANT_SHORTLIST = 200
+
+    # 4. ANN INDEX (HNSW - tùy chọn, cần `pip install hnswlib`)
+    # Dựng bằng: python -m scripts.build_ann_index (lưu file .hnsw cạnh file .npy)
+    ANN_ENABLED = os.getenv("ANN_ENABLED", "0") == "1"
+    ANN_M = 32
+    ANN_EF_CONSTRUCTION = 200
+    ANN_EF_SEARCH = None          # None -> dùng ef đã hiệu chỉnh lúc build
+    ANN_RECALL_K = 20             # recall@k mục tiêu so với quét chính xác (lúc build)
+    ANN_TARGET_RECALL = 0.95
+    ANN_MIN_CANDIDATES = 2000     # Tập lọc nhỏ hơn ngưỡng -> quét chính xác trên candidate
+    ANN_ENSEMBLE_POOL = 500       # Số ứng viên BGE lấy từ ANN trước khi fusion trong ensemble
+
+    # 5. SPARSE RETRIEVAL (inverted index trên từ điển TF-IDF)
+    # Dựng sẵn (tùy chọn, memory-map): python -m scripts.build_inverted_index
+    SPARSE_SCORING = "cosine"     # "cosine" (TF-IDF) | "bm25" cho search_tfidf; model_name chứa "bm25" -> luôn BM25
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    # Cột text đã dùng để fit TF-IDF (đếm lại tf cho BM25)
+    TFIDF_TEXT_COLUMNS = {
+        "tfidf_basic": "title_processed",
+        "tfidf_upgrade": "overall_text_processed",
+    }
+    # Cột text đã dùng để tạo embedding theo field (encode job mới khi ingest)
+    EMBEDDING_TEXT_COLUMNS = {
+        "title": "title_processed",
+        "overall": "overall_text_processed",
+    }
+
+    # 6. ENSEMBLE FAST (model_name="ensemble_fast"): pool TF-IDF (+ ANN) rồi mới fusion trên pool
+    ENSEMBLE_FAST_POOL = 500      # Mặc định, ghi đè theo request bằng pool_size
+
 settings = Settings()
 
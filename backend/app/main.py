@@ -1,18 +1,34 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.api import endpoints
+from app.config import settings
+from app.services import metrics
+from app.services.data_loader import data_loader
+from app.services.ingest import ingestor
 from app.services.search_engine import search_engine
+from app.services.timing import record_stages
+from app.services.warmup import Warmup
+from app.services.work_pool import work_pool
+
+# Dữ liệu + model khởi động, nạp song song
+warmup = Warmup([("data", data_loader.load, ())] + search_engine.warmup_tasks(), settings.WARMUP_WORKERS)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Code chạy khi server khởi động
-    search_engine.warmup() 
+    # Code chạy khi server khởi động: warmup chạy nền, server nhận request ngay (/ready báo tiến độ)
+    warmup.start()
+    # Job thêm / xóa bởi worker / script khác -> đổi sang snapshot mới
+    ingestor.start_watcher(settings.SNAPSHOT_POLL_SECONDS)
     yield
     # Code chạy khi server tắt (nếu cần dọn dẹp)
+    search_engine.save_query_cache()
 # Khởi tạo App
-app = FastAPI(title="Job Recommender AI Demo", version="1.0")
+app = FastAPI(title="Job Recommender AI Demo", version="1.0", lifespan=lifespan)
 
 # Cấu hình CORS (Để Frontend React gọi được API)
 # Cho phép mọi nguồn (trong môi trường dev)
@@ -24,6 +40,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Đo thời gian request + từng stage (preprocess, load, encode, score, fusion, topk, serialize)
+# theo endpoint (đường dẫn route, không phải URL thật) và model -> /metrics
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    labels = {}
+    status = 500
+    with record_stages(labels) as times:
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            if route is not None:
+                metrics.observe_request(route.path, labels.get("model", "none"), status,
+                                        time.perf_counter() - start, times)
+
 # Đăng ký Router
 app.include_router(endpoints.router, prefix="/api")
 
@@ -31,6 +65,17 @@ app.include_router(endpoints.router, prefix="/api")
 def health_check():
     return {"status": "ok", "message": "Backend is running!"}
 
+# Readiness (khác liveness "/"): 200 khi mọi artifact đã nạp xong, 503 + tiến độ từng artifact khi chưa
+@app.get("/ready")
+def readiness_check():
+    report = warmup.report()
+    return JSONResponse(content=report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(content=metrics.render(search_engine.model_stats(), work_pool.stats()),
+                    media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
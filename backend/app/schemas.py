@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 # 1. Input Cold Start (Giữ nguyên)
@@ -19,6 +19,41 @@ class SearchRequest(BaseModel):
     model_name: str = "ensemble"
     search_type: str = "title"
     filters: Optional[UserColdStart] = None
+    # Phân trang ("Xem thêm"): trang sau lấy từ cache kết quả, không chạy lại model
+    offset: int = Field(0, ge=0)
+    limit: int = Field(20, ge=1, le=100)
+    # Chỉ dùng cho model_name="ensemble_fast": số ứng viên đưa vào fusion (None -> settings.ENSEMBLE_FAST_POOL)
+    pool_size: Optional[int] = Field(None, ge=1, le=5000)
+
+# 4. Batch Search: nhiều query / 1 request (mỗi query có bộ lọc riêng)
+class BatchQuery(BaseModel):
+    query: str
+    filters: Optional[UserColdStart] = None
+
+class SearchBatchRequest(BaseModel):
+    queries: List[BatchQuery] = Field(..., min_length=1, max_length=256)
+    model_name: str = "ensemble"
+    search_type: str = "title"
+    limit: int = Field(20, ge=1, le=100)
+    pool_size: Optional[int] = Field(None, ge=1, le=5000)
+
+# 5. Admin: thêm / xóa job khi đang chạy (job mới nhận id = row id tiếp theo)
+class JobIngest(BaseModel):
+    title: str = Field(..., min_length=1)
+    description: str = ""
+    requirements: str = ""
+    benefit: str = ""
+    type: str = "Unknown"
+    location: str = "Unknown"
+    position: str = ""
+    salary_range: str = ""
+    specializations: List[str] = []
+    min_salary: int = 0
+    max_salary: int = 0
+
+class JobIngestRequest(BaseModel):
+    jobs: List[JobIngest] = Field(default_factory=list, max_length=1000)
+    remove_ids: List[int] = Field(default_factory=list)
 
 # ==========================================
 # CẤU TRÚC OUTPUT MỚI (Tách Summarry & Detail)
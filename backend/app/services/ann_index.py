@@ -0,0 +1,133 @@
+import os
+import json
+import numpy as np
+
+# hnswlib là tùy chọn (pip install hnswlib)
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def ann_index_path(embedding_path):
+    """File index lưu cạnh file .npy: job_xxx.npy -> job_xxx.hnsw"""
+    return os.path.splitext(embedding_path)[0] + ".hnsw"
+
+
+def exact_top_k(embeddings, queries, k, exclude=None):
+    """
+    Top-k chính xác theo cosine (dùng làm chuẩn khi đo recall).
+    exclude: với mỗi query, 1 row id không được tính (dòng sinh ra query đó).
+    """
+    emb = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    q = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    scores = q @ emb.T
+    if exclude is not None:
+        scores[np.arange(len(scores)), exclude] = -np.inf
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+class AnnIndex:
+    """
+    Chỉ mục HNSW (cosine) cho 1 ma trận embedding.
+    Label trong index = row id (vị trí dòng) của job.
+    """
+
+    def __init__(self, index, meta):
+        self.index = index
+        self.meta = meta
+        self.n_rows = meta["n_rows"]
+        self.index.set_ef(meta["ef_search"])
+
+    # ------------------ BUILD / IO ------------------
+    @classmethod
+    def build(cls, embeddings, M=32, ef_construction=200, ef_search=64):
+        if hnswlib is None:
+            raise ImportError("Cần cài hnswlib để dựng ANN index (pip install hnswlib)")
+        n_rows, dim = embeddings.shape
+        index = hnswlib.Index(space="cosine", dim=dim)
+        index.init_index(max_elements=n_rows, M=M, ef_construction=ef_construction)
+        index.add_items(np.asarray(embeddings, dtype=np.float32), np.arange(n_rows))
+        meta = {"n_rows": n_rows, "dim": dim, "M": M,
+                "ef_construction": ef_construction, "ef_search": ef_search}
+        return cls(index, meta)
+
+    def save(self, path):
+        self.index.save_index(path)
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path, ef_search=None):
+        if hnswlib is None or not os.path.exists(path):
+            return None
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = hnswlib.Index(space="cosine", dim=meta["dim"])
+        index.load_index(path, max_elements=meta["n_rows"])
+        if ef_search:
+            meta["ef_search"] = ef_search
+        return cls(index, meta)
+
+    # ------------------ QUERY ------------------
+    def search(self, vec, k, rows=None):
+        """
+        Trả về (row_ids, scores) của top-k gần nhất, hoặc None nếu ANN không trả đủ kết quả.
+        rows: allow-list row id (khi có bộ lọc).
+        """
+        vec = np.asarray(vec, dtype=np.float32).reshape(1, -1)
+        n_allowed = self.n_rows if rows is None else len(rows)
+        k = min(k, n_allowed)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        try:
+            if rows is None:
+                labels, distances = self.index.knn_query(vec, k=k)
+            else:
+                allowed = np.zeros(self.n_rows, dtype=bool)
+                allowed[rows[rows < self.n_rows]] = True
+                labels, distances = self.index.knn_query(
+                    vec, k=k, num_threads=1, filter=lambda label: allowed[label]
+                )
+        except RuntimeError:
+            # HNSW không tìm đủ k kết quả (allow-list quá thưa) -> caller quét chính xác
+            return None
+
+        return labels[0].astype(np.int64), 1.0 - distances[0].astype(np.float64)
+
+    def calibrate(self, embeddings, k=20, target_recall=0.95, queries=None, n_queries=200, noise=0.1, seed=0):
+        """
+        Chọn ef_search nhỏ nhất đạt recall@k >= target so với quét chính xác.
+        queries: vector query thật (vd: query trong evalutation/ đã encode) - nên dùng.
+        Không có -> dòng ngẫu nhiên của corpus cộng nhiễu, bỏ chính dòng đó khỏi cả kết quả ANN lẫn đáp án
+        (query trùng 1 dòng đã index luôn tìm thấy chính nó -> recall bị thổi phồng, ef_search chọn quá thấp).
+        """
+        rng = np.random.default_rng(seed)
+        exclude = None
+        if queries is None:
+            exclude = rng.choice(self.n_rows, min(n_queries, self.n_rows), replace=False)
+            rows = np.asarray(embeddings[exclude], dtype=np.float32)
+            scale = noise * np.linalg.norm(rows, axis=1, keepdims=True) / np.sqrt(rows.shape[1])
+            queries = rows + rng.standard_normal(rows.shape).astype(np.float32) * scale
+        queries = np.asarray(queries, dtype=np.float32)
+        extra = 0 if exclude is None else 1
+        k = min(k, self.n_rows - extra)
+        truth = exact_top_k(np.asarray(embeddings, dtype=np.float32), queries, k, exclude)
+
+        recall = 0.0
+        for ef in [k + extra, 32, 64, 128, 256, 512, 1024]:
+            if ef < k + extra: continue
+            self.index.set_ef(ef)
+            labels, _ = self.index.knn_query(queries, k=k + extra)
+            if exclude is not None:
+                # Kết quả ANN đã xếp theo khoảng cách: bỏ dòng gốc (nếu có) rồi giữ k đầu
+                labels = [[l for l in found if l != row][:k] for found, row in zip(labels, exclude)]
+            hits = sum(len(set(a) & set(b)) for a, b in zip(labels, truth))
+            recall = hits / truth.size
+            if recall >= target_recall:
+                break
+
+        self.meta["calibration"] = "perturbed_rows" if exclude is not None else "queries"
+        self.meta.update({"ef_search": ef, "recall_k": k, "recall": recall})
+        return ef, recall
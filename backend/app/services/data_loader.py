@@ -1,40 +1,156 @@
 import pandas as pd
 import numpy as np
 from app.config import settings
-import sys
-# Import hàm tính điểm heuristic
-from app.services.heuristic import calculate_score_ranking
+import threading
+# Import bộ chấm điểm heuristic (vector hóa)
+from app.services.heuristic import HeuristicScorer
+from app.services.filter_index import FilterIndex
+from app.services.job_cards import JobCardStore
+from app.services.job_store import prepare_jobs, read_excel_source, read_snapshot, snapshot_is_fresh
+from app.services.segments import segment_store
+
+class JobSnapshot:
+    """
+    1 phiên bản dữ liệu job + chỉ mục, không sửa sau khi dựng: endpoint lấy 1 bản / request
+    (data_loader.current()) -> các chỉ mục luôn khớp nhau kể cả khi đang đổi snapshot.
+    - jobs: mọi dòng (RangeIndex, row id = vị trí dòng trong ma trận), kể cả job đã xóa
+    - df: job còn phục vụ (index = row id); không có job bị xóa -> chính là jobs (giữ đường quét full)
+    Filter Index / cờ heuristic / job card dựng trên jobs (tra theo row id).
+    base: snapshot trước -> dùng lại phần không đổi, job card chỉ dựng thêm cho job mới.
+    """
+
+    def __init__(self, version, jobs, deleted=(), base=None):
+        deleted = sorted(r for r in set(deleted) if r < len(jobs))
+        self.version = version
+        self.jobs = jobs
+        self.deleted = frozenset(deleted)
+        self.df = jobs.drop(index=deleted) if deleted else jobs
+        self.live_rows = self.df.index.to_numpy() if deleted else None
+
+        same_rows = base is not None and len(base.jobs) == len(jobs)
+        # Dựng chỉ mục lọc 1 lần (thay cho copy + regex mỗi request)
+        if same_rows and base.deleted == self.deleted:
+            self.filter_index = base.filter_index
+        else:
+            self.filter_index = FilterIndex(jobs, self.live_rows)
+        # Cờ từ khóa cấp bậc theo job (cho điểm heuristic cold start)
+        self.heuristic_scorer = base.heuristic_scorer if same_rows else HeuristicScorer(jobs)
+        # JSON job card dựng sẵn (response ghép từ row id, không iterrows mỗi request)
+        if same_rows:
+            self.job_cards = base.job_cards
+        elif base is not None and len(base.jobs) < len(jobs):
+            self.job_cards = JobCardStore(jobs.iloc[len(base.jobs):], base.job_cards)
+        else:
+            self.job_cards = JobCardStore(jobs)
+
 
 class DataLoader:
+    """
+    Dữ liệu job + các chỉ mục dựng từ nó, nạp lười: lần đầu truy cập current() / df / filter_index / ...
+    (hoặc gọi load() trong warmup) -> import module không đọc file, server khởi động ngay.
+    Job thêm / xóa khi đang chạy (segment, xem app.services.ingest) -> snapshot mới thay cả bản (swap).
+    """
+
     def __init__(self):
+        self._load_lock = threading.Lock()
+        self._snapshot = None
+
+    @property
+    def loaded(self):
+        return self._snapshot is not None
+
+    def current(self):
+        """Snapshot đang phục vụ (nạp nếu chưa)."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.load()
+            snapshot = self._snapshot
+        return snapshot
+
+    # Truy cập tắt vào snapshot hiện tại (script / code chỉ đọc 1 thuộc tính)
+    @property
+    def df(self):
+        return self.current().df
+
+    @property
+    def jobs(self):
+        return self.current().jobs
+
+    @property
+    def version(self):
+        # Phiên bản dữ liệu (= phiên bản manifest segment): đổi khi thêm / xóa job -> vô hiệu cache kết quả
+        return self.current().version
+
+    @property
+    def filter_index(self):
+        return self.current().filter_index
+
+    @property
+    def heuristic_scorer(self):
+        return self.current().heuristic_scorer
+
+    @property
+    def job_cards(self):
+        return self.current().job_cards
+
+    def load(self):
+        if self.loaded: return
+        # Khóa đọc snapshot: manifest không đổi giữa chừng lúc đang nạp
+        with segment_store.lock.reading():
+            with self._load_lock:
+                if self.loaded: return
+                self._snapshot = self._load()
+
+    def read_base(self):
+        """Dữ liệu gốc (chưa có job ingest thêm)."""
+        # Ưu tiên snapshot cột (Arrow, memory-map), Excel chỉ là fallback
+        # Tạo snapshot: python -m scripts.build_data_snapshot
+        if snapshot_is_fresh(settings.DATA_SNAPSHOT_PATH, settings.DATA_PATH):
+            print(f"📂 Đang đọc snapshot dữ liệu từ: {settings.DATA_SNAPSHOT_PATH}")
+            df = read_snapshot(settings.DATA_SNAPSHOT_PATH)
+        else:
+            print(f"📂 Đang đọc file dữ liệu từ: {settings.DATA_PATH}")
+            df = read_excel_source(settings.DATA_PATH)
+
+        # Pre-process cơ bản
+        return prepare_jobs(df)
+
+    def _load(self):
         print("🔄 Đang khởi tạo DataLoader...")
         try:
-            print(f"📂 Đang đọc file dữ liệu từ: {settings.DATA_PATH}")
-            self.df = pd.read_excel(settings.DATA_PATH, engine='openpyxl')
-            
-            # Pre-process cơ bản
-            self.df['min_salary_edited'] = self.df['min_salary_edited'].fillna(0).astype(int)
-            self.df['max_salary_edited'] = self.df['max_salary_edited'].fillna(0).astype(int)
-            self.df['location'] = self.df['location'].fillna("Unknown").astype(str)
-            self.df['type'] = self.df['type'].fillna("Unknown").astype(str)
-            
-            # Đảm bảo có cột description và title_processed
-            if 'description' not in self.df.columns:
-                 self.df['description'] = ""
-            if 'title_processed' not in self.df.columns:
-                 self.df['title_processed'] = self.df['title']
-
-            if 'id' not in self.df.columns:
-                self.df['id'] = self.df.index
-
-            print(f"✅ Đã tải xong {len(self.df)} dòng dữ liệu!")
-            
+            # Dữ liệu gốc (hoặc bản đã gộp) + job thêm từ segment
+            jobs = segment_store.load_jobs(self.read_base)
+            print(f"✅ Đã tải xong {len(jobs)} dòng dữ liệu!")
+
+            snapshot = JobSnapshot(segment_store.version, jobs, segment_store.manifest["deleted"])
+            print("✅ Đã dựng Filter Index!")
+            print("✅ Đã dựng Job Card Store!")
+
         except FileNotFoundError:
             print(f"❌ LỖI: Không tìm thấy file tại {settings.DATA_PATH}")
-            sys.exit(1)
+            raise
         except Exception as e:
             print(f"❌ LỖI DATA: {str(e)}")
-            sys.exit(1)
+            raise
+        return snapshot
+
+    def build_snapshot(self, manifest):
+        """Snapshot theo manifest mới, dựng tiếp từ bản hiện tại (None nếu chưa nạp -> nạp lười sau)."""
+        old = self._snapshot
+        if old is None: return None
+        try:
+            jobs = segment_store.extend_jobs(old.jobs, manifest)
+            n_rows = segment_store.n_rows(manifest)
+            if n_rows is not None and n_rows != len(jobs):
+                raise ValueError(f"{len(jobs)} dòng, manifest ghi {n_rows}")
+        except ValueError:
+            # Segment đã được gộp trước khi process này kịp thấy -> đọc lại từ base
+            jobs, old = segment_store.load_jobs(self.read_base, manifest), None
+        return JobSnapshot(manifest["version"], jobs, manifest["deleted"], old)
+
+    def swap(self, snapshot):
+        """Đổi snapshot (1 phép gán): request đang chạy giữ bản cũ, request mới thấy bản mới."""
+        self._snapshot = snapshot
 
     def cold_start_filter(self, criteria):
         """
@@ -52,28 +168,24 @@ class DataLoader:
         # 2. Lọc cứng sơ bộ (Pre-filter) để tăng tốc (Optional)
         # Chỉ giữ lại những job có lương phù hợp hoặc không yêu cầu lương
         # Nếu criteria.min_salary > 0, loại bỏ những job lương quá thấp (nhưng cẩn thận job 'Thỏa thuận' = 0)
-        candidates = self.df.copy()
-        if criteria.min_salary > 0:
+        data = self.current()
+        rows = data.live_rows
+        if criteria.min_salary and criteria.min_salary > 0:
             # Giữ lại job có lương >= mong muốn HOẶC lương = 0 (Thỏa thuận)
-            candidates = candidates[
-                (candidates['max_salary_edited'] >= criteria.min_salary) | 
-                (candidates['max_salary_edited'] == 0)
-            ]
-
-        # Nếu lọc xong mà hết data thì lấy lại toàn bộ
-        if candidates.empty:
-            candidates = self.df.copy()
+            salary = data.jobs['max_salary_edited'].to_numpy()
+            keep = (salary >= criteria.min_salary) | (salary == 0)
+            filtered = np.flatnonzero(keep) if rows is None else rows[keep[rows]]
+            # Nếu lọc xong mà hết data thì lấy lại toàn bộ
+            if len(filtered) > 0:
+                rows = filtered
 
-        # 3. Tính điểm Heuristic cho từng dòng (Apply)
-        # Hàm calculate_score_ranking nhận vào (row, profile)
-        scores = candidates.apply(lambda row: calculate_score_ranking(row, profile), axis=1)
+        # 3. Tính điểm Heuristic (vector hóa trên cờ từ khóa dựng sẵn)
+        scores = data.heuristic_scorer.scores(profile['age'], rows)
 
-        # 4. Gán điểm vào DataFrame và Sort
-        candidates['similarity_score'] = scores
-        
-        # Lấy Top job có điểm cao nhất (ví dụ > 0)
-        # Sắp xếp giảm dần theo điểm
-        top_candidates = candidates.sort_values(by='similarity_score', ascending=False)
+        # 4. Sắp xếp giảm dần theo điểm (đồng điểm -> giữ thứ tự dòng)
+        order = np.argsort(-scores, kind="stable")
+        top_candidates = data.jobs.take(order if rows is None else rows[order])
+        top_candidates['similarity_score'] = scores[order]
         
         return top_candidates
 
@@ -0,0 +1,79 @@
+import os
+
+from app.config import settings
+
+# "torch": như lúc train | "torch_int8": quantize động các lớp Linear -> int8 (chỉ CPU)
+# "onnx": ONNX Runtime qua sentence_transformers (cần optimum[onnxruntime])
+BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+def encoder_options(key, **overrides):
+    """
+    Cấu hình suy luận của transformer `key`: settings.ENCODER_BACKENDS["default"] <- [key] <- overrides
+    (overrides None bị bỏ qua) -> {"backend", "max_seq_length", "threads", "onnx_file"}.
+    """
+    options = {"backend": "torch", "max_seq_length": None, "threads": None, "onnx_file": None}
+    options.update(settings.ENCODER_BACKENDS.get("default", {}))
+    options.update(settings.ENCODER_BACKENDS.get(key, {}))
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    if options["backend"] not in BACKENDS:
+        raise ValueError(f"Backend encoder không hỗ trợ ({key}): {options['backend']}")
+    return options
+
+
+def onnx_files(path):
+    """Các file .onnx trong thư mục model (export sẵn bởi scripts.check_encoder_drift --export-onnx)."""
+    onnx_dir = os.path.join(path, "onnx")
+    if not os.path.isdir(onnx_dir): return []
+    return sorted(f"onnx/{name}" for name in os.listdir(onnx_dir) if name.endswith(".onnx"))
+
+
+def load_encoder(path, options, import_module):
+    """
+    SentenceTransformer (CPU) theo options của encoder_options(). import_module: hàm import thư viện nặng
+    (lazy_import của SearchEngine). Trả về model đã eval(), kèm thuộc tính inference_nbytes (RAM ước lượng:
+    bản int8 / ONNX không có trọng số trong parameters()).
+    """
+    SentenceTransformer = import_module("sentence_transformers").SentenceTransformer
+    backend, threads = options["backend"], options["threads"]
+
+    if backend == "onnx":
+        ort = import_module("onnxruntime")
+        model_kwargs = {}
+        if threads:
+            # Thread intra-op riêng cho session của model này
+            session_options = ort.SessionOptions()
+            session_options.intra_op_num_threads = threads
+            model_kwargs["session_options"] = session_options
+        if options["onnx_file"]:
+            model_kwargs["file_name"] = options["onnx_file"]
+        elif not onnx_files(path):
+            print(f"⚠️ {path}: chưa có bản ONNX -> export lúc load (chậm, export sẵn bằng --export-onnx)")
+        model = SentenceTransformer(path, backend="onnx", model_kwargs=model_kwargs, device="cpu")
+        onnx_path = os.path.join(path, options["onnx_file"] or "onnx/model.onnx")
+        nbytes = os.path.getsize(onnx_path) if os.path.exists(onnx_path) else 0
+    else:
+        if threads:
+            # torch: số thread intra-op là của cả tiến trình (model load sau cùng quyết định)
+            import_module("torch").set_num_threads(threads)
+        model = SentenceTransformer(path, model_kwargs={"low_cpu_mem_usage": False}, device="cpu")
+        if backend == "torch_int8":
+            torch = import_module("torch")
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        nbytes = _state_nbytes(model.state_dict())
+
+    if options["max_seq_length"]:
+        model.max_seq_length = options["max_seq_length"]
+    model.eval()
+    model.inference_nbytes = nbytes
+    return model
+
+
+def _state_nbytes(state):
+    # Lớp Linear int8 lưu trọng số dạng (weight, bias) đóng gói trong state_dict
+    total = 0
+    for value in state.values():
+        for tensor in (value if isinstance(value, (tuple, list)) else (value,)):
+            if hasattr(tensor, "element_size"):
+                total += tensor.numel() * tensor.element_size()
+    return total
@@ -0,0 +1,131 @@
+import re
+import numpy as np
+import pandas as pd
+
+from app.services.heuristic import INDUSTRY_KEYWORDS, normalize
+
+
+class FilterIndex:
+    """
+    Chỉ mục lọc dựng 1 lần khi DataLoader load data.
+    - Location / Type: mã hóa theo giá trị (đã lower) -> bitmap theo từ khóa lọc (cache).
+    - Industry: bitmap cho từng ngành trong INDUSTRY_KEYWORDS (dựng sẵn).
+    - Lương: mảng max_salary đã sort để tra cứu khoảng min_salary.
+    Kết quả lọc là mảng row id (vị trí dòng), không copy DataFrame.
+    Kết quả giống hệt heuristic.cold_start_filter.
+    live_rows: row id còn phục vụ khi có job đã xóa (None = mọi dòng) -> luôn AND vào kết quả.
+    """
+
+    MAX_CACHED_BITMAPS = 256
+
+    def __init__(self, df, live_rows=None):
+        self.n_rows = len(df)
+        self.live = None
+        if live_rows is not None:
+            self.live = np.zeros(self.n_rows, dtype=bool)
+            self.live[live_rows] = True
+
+        # 1. Location / Type: factorize giá trị lower (NaN / không phải str -> -1)
+        self.codes = {}
+        self.uniques = {}
+        for col in ("location", "type"):
+            codes, uniques = pd.factorize(np.array(self._lower(df[col]), dtype=object))
+            self.codes[col] = codes
+            self.uniques[col] = list(uniques)
+
+        # 2. Industry: dựng sẵn bitmap cho mỗi ngành
+        titles = self._lower(df["title"])
+        specs = self._lower(df["specializations"]) if "specializations" in df.columns else None
+        self.industry_bitmaps = {}
+        for industry, keywords in INDUSTRY_KEYWORDS.items():
+            mask = self._contains_any(titles, keywords)
+            if specs is not None:
+                mask |= self._contains_any(specs, keywords)
+            self.industry_bitmaps[industry] = mask
+
+        # 3. Lương: sort 1 lần, lọc bằng searchsorted
+        max_salary = df["max_salary_edited"].to_numpy(dtype=np.float64)
+        self.salary_order = np.argsort(max_salary, kind="stable")
+        self.salary_sorted = max_salary[self.salary_order]
+
+        self._bitmap_cache = {}
+
+    # ------------------ BUILD HELPERS ------------------
+    @staticmethod
+    def _lower(series):
+        # Giống .str.lower(): giá trị không phải chuỗi -> None (bị loại khi lọc)
+        return [v.lower() if isinstance(v, str) else None for v in series.tolist()]
+
+    @staticmethod
+    def _contains_any(values, keywords):
+        return np.fromiter(
+            (v is not None and any(k in v for k in keywords) for v in values),
+            dtype=bool, count=len(values)
+        )
+
+    # ------------------ LOOKUPS ------------------
+    def _column_bitmap(self, col, term):
+        """Bitmap các dòng có `col` chứa `term` (regex như str.contains)."""
+        key = (col, term)
+        bitmap = self._bitmap_cache.get(key)
+        if bitmap is None:
+            pattern = re.compile(term)
+            matched = [i for i, v in enumerate(self.uniques[col]) if pattern.search(v)]
+            bitmap = np.isin(self.codes[col], matched)
+            if len(self._bitmap_cache) >= self.MAX_CACHED_BITMAPS:
+                self._bitmap_cache.clear()
+            self._bitmap_cache[key] = bitmap
+        return bitmap
+
+    def _salary_bitmap(self, min_salary):
+        start = np.searchsorted(self.salary_sorted, min_salary, side="left")
+        bitmap = np.zeros(self.n_rows, dtype=bool)
+        bitmap[self.salary_order[start:]] = True
+        return bitmap
+
+    def filter_bitmap(self, filters):
+        """
+        Trả về bitmap (bool array) các dòng thỏa bộ lọc, hoặc None nếu không có bộ lọc nào
+        (và không có job đã xóa).
+        """
+        bitmaps = []
+
+        # 1. Địa điểm
+        loc = filters.get('location')
+        if loc and loc != "Tất cả":
+            bitmaps.append(self._column_bitmap("location", normalize(loc)))
+
+        # 2. Ngành nghề
+        ind = filters.get('industry')
+        if ind and ind in INDUSTRY_KEYWORDS:
+            bitmaps.append(self.industry_bitmaps[ind])
+
+        # 3. Hình thức
+        job_type = filters.get('job_type')
+        if job_type and job_type != "Tất cả":
+            bitmaps.append(self._column_bitmap("type", normalize(job_type)))
+
+        # 4. Lương (Max Salary >= mức user chọn)
+        min_salary = filters.get('min_salary', 0)
+        if min_salary and float(min_salary) > 0:
+            bitmaps.append(self._salary_bitmap(float(min_salary)))
+
+        if self.live is not None:
+            bitmaps.append(self.live)
+        if not bitmaps:
+            return None
+        mask = bitmaps[0].copy()
+        for bitmap in bitmaps[1:]:
+            mask &= bitmap
+        return mask
+
+    def filter_rows(self, filters):
+        """
+        Trả về mảng row id (tăng dần) thỏa bộ lọc.
+        Không có bộ lọc -> None (dùng toàn bộ corpus, SearchEngine sẽ quét full),
+        trừ khi có job đã xóa -> các dòng còn phục vụ.
+        """
+        mask = self.filter_bitmap(filters)
+        if mask is None:
+            return None
+        return np.flatnonzero(mask)
@@ -1,4 +1,5 @@
 import re
+import numpy as np
 import pandas as pd
 
 # 1. TỪ ĐIỂN MAP NGÀNH NGHỀ
@@ -56,21 +57,74 @@ def cold_start_filter(df, filters):
 
     return filtered_df
 
-# Hàm tính điểm (Giữ nguyên)
+# 2. TỪ KHÓA CẤP BẬC THEO NHÓM TUỔI (khớp trong title hoặc position)
+AGE_KEYWORDS = {
+    "intern": ['thực tập', 'intern', 'part-time', 'sinh viên'],     # < 22
+    "junior": ['fresher', 'junior', 'nhân viên', 'mới'],            # 22 - 24
+    "senior": ['senior', 'chuyên viên', 'leader'],                  # 25 - 29
+    "manager": ['manager', 'trưởng', 'giám đốc'],                   # >= 30
+}
+# 22 - 24: cộng điểm nếu title KHÔNG chứa các từ này
+SENIOR_TITLE_KEYWORDS = ["senior", "trưởng"]
+
+
+def age_bucket(age):
+    if age is None: age = 22
+    if age < 22: return "intern"
+    if age <= 24: return "junior"
+    if age <= 29: return "senior"
+    return "manager"
+
+# Hàm tính điểm cho 1 dòng (bản tham chiếu của HeuristicScorer)
 def calculate_score_ranking(row, profile):
     score = 0.0
     title = normalize(row.get('title', ''))
     position = normalize(row.get('position', ''))
-    age = profile.get('age', 22)
-    
-    if age < 22:
-        if any(k in title or k in position for k in ['thực tập', 'intern', 'part-time', 'sinh viên']): score += 50
-    elif 22 <= age <= 24:
-        if any(k in title or k in position for k in ['fresher', 'junior', 'nhân viên', 'mới']): score += 30
-        if "senior" not in title and "trưởng" not in title: score += 20
-    elif 25 <= age <= 29:
-        if any(k in title or k in position for k in ['senior', 'chuyên viên', 'leader']): score += 50
-    else:
-        if any(k in title or k in position for k in ['manager', 'trưởng', 'giám đốc']): score += 50
-
-    return score
\ No newline at end of file
+    bucket = age_bucket(profile.get('age', 22))
+
+    if any(k in title or k in position for k in AGE_KEYWORDS[bucket]):
+        score += 30 if bucket == "junior" else 50
+    if bucket == "junior" and not any(k in title for k in SENIOR_TITLE_KEYWORDS):
+        score += 20
+
+    return score
+
+
+class HeuristicScorer:
+    """
+    Điểm heuristic theo tuổi, vector hóa: cờ từ khóa (bool theo job) dựng 1 lần khi load data,
+    mỗi request chỉ còn 1 phép tính mảng theo nhóm tuổi thay vì DataFrame.apply từng dòng.
+    Kết quả giống hệt calculate_score_ranking.
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        titles = self._normalized(df, "title")
+        positions = self._normalized(df, "position")
+
+        self.flags = {
+            bucket: np.fromiter(
+                (any(k in t or k in p for k in keywords) for t, p in zip(titles, positions)),
+                dtype=bool, count=self.n_rows
+            )
+            for bucket, keywords in AGE_KEYWORDS.items()
+        }
+        self.not_senior_title = np.fromiter(
+            (not any(k in t for k in SENIOR_TITLE_KEYWORDS) for t in titles),
+            dtype=bool, count=self.n_rows
+        )
+
+    @staticmethod
+    def _normalized(df, col):
+        if col not in df.columns:
+            return [""] * len(df)
+        return [normalize(v) for v in df[col].tolist()]
+
+    def scores(self, age, rows=None):
+        """Điểm (float) của các dòng `rows` (None = toàn bộ) cho 1 độ tuổi."""
+        bucket = age_bucket(age)
+        flags = self.flags[bucket] if rows is None else self.flags[bucket][rows]
+        if bucket != "junior":
+            return flags * 50.0
+        not_senior = self.not_senior_title if rows is None else self.not_senior_title[rows]
+        return flags * 30.0 + not_senior * 20.0
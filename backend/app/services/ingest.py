@@ -0,0 +1,161 @@
+import threading
+import time
+
+from app.config import settings
+from app.services.data_loader import data_loader
+from app.services.job_store import build_job_rows
+from app.services.search_engine import search_engine
+from app.services.segments import segment_store
+
+
+class JobIngestor:
+    """
+    Thêm / xóa job khi đang chạy, không dựng lại toàn bộ dữ liệu / embedding:
+    - ingest(): tiền xử lý + encode CHỈ các job mới bằng model đang dùng, ghi thành 1 segment
+      (dữ liệu + ma trận từng model) và manifest phiên bản mới. 1 writer tại 1 thời điểm (file lock),
+      kể cả giữa nhiều worker / script.
+    - sync(): mỗi worker (thread poll manifest) dựng snapshot mới ngoài lock rồi đổi con trỏ dưới khóa ghi
+      -> request đang chạy xong trên bản cũ, request sau thấy bản mới, không request nào bị từ chối.
+      Mỗi lần đổi đều kiểm tra số dòng dữ liệu với mọi ma trận / chỉ mục.
+    - compact(): gộp base + segment thành thế hệ base mới (memory-map được), chạy nền.
+    Job bị xóa chỉ bị ẩn (row id giữ nguyên); bỏ hẳn khỏi ma trận khi dựng lại offline.
+    """
+
+    def __init__(self, loader, engine, store):
+        self.loader = loader
+        self.engine = engine
+        self.store = store
+        self.last_check = None
+        self._sync_lock = threading.Lock()
+        self._compacting = threading.Lock()
+
+    # ------------------ ĐỔI SNAPSHOT (mọi worker) ------------------
+    def sync(self):
+        """Đổi sang manifest mới nhất nếu có. -> True nếu đã đổi."""
+        with self._sync_lock:
+            manifest = self.store.read_manifest()
+            if manifest["version"] == self.store.version: return False
+
+            start = time.perf_counter()
+            data = self.loader.build_snapshot(manifest)
+            prepared = self.engine.prepare_snapshot(manifest)
+            with self.store.lock.writing():
+                # DataLoader vừa nạp xong (theo manifest cũ) sau lúc dựng trước -> dựng luôn
+                self.loader.swap(data or self.loader.build_snapshot(manifest))
+                changed = self.engine.swap_snapshot(manifest, prepared)
+                self.store.manifest = manifest
+            self.engine.refresh_model_sizes(changed)
+
+            self.last_check = check = self.check_consistency()
+            print(f"✅ Snapshot v{manifest['version']}: {check['n_rows']} job ({check['live_rows']} đang phục vụ), "
+                  f"{len(manifest['segments'])} segment, {(time.perf_counter() - start) * 1000:.0f} ms")
+            if not check["ok"]:
+                print(f"⚠️ Lệch số dòng với dữ liệu ({check['n_rows']}): {check['mismatched']}")
+            return True
+
+    def check_consistency(self):
+        """
+        Số dòng dữ liệu job (kể cả job đã xóa) so với mọi ma trận / chỉ mục đang load.
+        Lệch -> các dòng thiếu nhận điểm 0 (vd: model không load được lúc ingest).
+        """
+        manifest = self.store.manifest
+        sizes = self.engine.matrix_rows()
+        live_rows = None
+        if self.loader.loaded:
+            data = self.loader.current()
+            n_rows, live_rows = len(data.jobs), len(data.df)
+            sizes.update({"job_cards": len(data.job_cards), "filter_index": data.filter_index.n_rows,
+                          "heuristic_scorer": data.heuristic_scorer.n_rows})
+        else:
+            n_rows = self.store.n_rows(manifest)
+        mismatched = {name: rows for name, rows in sizes.items() if n_rows is not None and rows != n_rows}
+        return {
+            "ok": not mismatched,
+            "version": manifest["version"],
+            "generation": manifest["generation"],
+            "segments": len(manifest["segments"]),
+            "deleted": len(manifest["deleted"]),
+            "n_rows": n_rows,
+            "live_rows": live_rows,
+            "sizes": sizes,
+            "mismatched": mismatched,
+        }
+
+    def start_watcher(self, interval):
+        """Thread nền: mỗi `interval` giây đổi sang manifest mới (worker / script khác ghi). <= 0 -> tắt."""
+        if interval <= 0: return None
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"❌ Đổi snapshot lỗi: {e}")
+        thread = threading.Thread(target=run, name="snapshot-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    # ------------------ GHI (1 writer) ------------------
+    def ingest(self, jobs=None, remove_ids=()):
+        """
+        Thêm job mới (list dict / DataFrame, cột như file dữ liệu) và / hoặc xóa job theo id (= row id).
+        -> {"version", "added_ids", "removed_ids", "consistency"}. Xóa id không có / đã xóa -> ValueError.
+        """
+        removed = sorted({int(i) for i in remove_ids})
+        new_rows = None
+        with self.store.writer():
+            # Bắt kịp manifest (worker / script khác có thể vừa ghi) -> row id mới nối tiếp đúng
+            self.sync()
+            data = self.loader.current()
+            missing = [i for i in removed if i not in data.df.index]
+            if missing:
+                raise ValueError(f"Không có job (hoặc đã xóa): {missing}")
+            if jobs is not None and len(jobs):
+                new_rows = build_job_rows(jobs, len(data.jobs), self.engine.preprocess_many)
+            if new_rows is None and not removed:
+                return {"version": self.store.version, "added_ids": [], "removed_ids": [],
+                        "consistency": self.check_consistency()}
+
+            start = time.perf_counter()
+            matrices = self.engine.encode_jobs(new_rows) if new_rows is not None else {}
+            manifest = self.store.add_segment(new_rows, matrices, removed, n_base=len(data.jobs))
+            print(f"💾 Ingest v{manifest['version']}: +{0 if new_rows is None else len(new_rows)} job "
+                  f"({len(matrices)} ma trận), -{len(removed)} job, {time.perf_counter() - start:.1f}s")
+        self.sync()
+
+        if len(self.store.manifest["segments"]) >= settings.SEGMENT_COMPACT_AT:
+            self.compact_async()
+        return {
+            "version": manifest["version"],
+            "added_ids": [] if new_rows is None else new_rows.index.tolist(),
+            "removed_ids": removed,
+            "consistency": self.last_check,
+        }
+
+    def compact(self):
+        """Gộp mọi segment thành thế hệ base mới rồi đổi snapshot. -> manifest mới, None nếu không có segment."""
+        start = time.perf_counter()
+        with self.store.writer():
+            manifest = self.store.compact(self.engine.matrix_paths(), self.loader.read_base)
+        if manifest is None: return None
+        print(f"✅ Gộp segment -> thế hệ {manifest['generation']} ({manifest['n_base']} job, "
+              f"{time.perf_counter() - start:.1f}s)")
+        self.sync()
+        return manifest
+
+    def compact_async(self):
+        """compact() ở thread nền (bỏ qua nếu đang gộp). -> thread hoặc None."""
+        if not self._compacting.acquire(blocking=False): return None
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"❌ Gộp segment lỗi: {e}")
+            finally:
+                self._compacting.release()
+        thread = threading.Thread(target=run, name="segment-compact", daemon=True)
+        thread.start()
+        return thread
+
+
+ingestor = JobIngestor(data_loader, search_engine, segment_store)
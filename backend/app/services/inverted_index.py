@@ -0,0 +1,198 @@
+import os
+import numpy as np
+from scipy import sparse
+
+from app.services.matrix_store import inverse_row_norms, load_dense
+from app.services.ranking import top_k_indices
+
+SCORINGS = ("cosine", "bm25")
+
+
+def inverted_index_paths(matrix_path, scoring):
+    """tfidf_matrix_x.pkl -> tfidf_matrix_x.cosine.{indptr,docs,weights,max}.npy"""
+    base = os.path.splitext(matrix_path)[0]
+    return {part: f"{base}.{scoring}.{part}.npy" for part in ("indptr", "docs", "weights", "max")}
+
+
+def term_counts(vectorizer, texts):
+    """Ma trận đếm tf (job x term) theo đúng analyzer + từ điển của TfidfVectorizer đã fit."""
+    from sklearn.feature_extraction.text import CountVectorizer  # chỉ cần khi dựng BM25
+
+    counter = CountVectorizer(analyzer=vectorizer.build_analyzer(), vocabulary=vectorizer.vocabulary_)
+    return counter.transform(texts)
+
+
+class InvertedIndex:
+    """
+    Inverted index trên từ điển TF-IDF: mỗi term -> posting list (job id tăng dần, trọng số tính sẵn).
+    - cosine: trọng số = tfidf / ||dòng|| -> tổng theo term của query (đã chuẩn hóa) = cosine
+    - bm25: trọng số = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)), tf đếm lại từ text
+    Chi phí 1 query chỉ phụ thuộc độ dài posting list của các term trong query, không phụ thuộc corpus.
+    """
+
+    def __init__(self, indptr, docs, weights, n_docs, scoring="cosine"):
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+        self.n_docs = n_docs
+        self.n_terms = len(indptr) - 1
+        self.scoring = scoring
+        # Trọng số lớn nhất của từng term (cận trên cho MaxScore)
+        self.max_weights = self._max_weights()
+
+    def _max_weights(self):
+        lengths = np.diff(self.indptr)
+        out = np.zeros(self.n_terms, dtype=np.float32)
+        nonempty = lengths > 0
+        if nonempty.any():
+            out[nonempty] = np.maximum.reduceat(self.weights, self.indptr[:-1][nonempty])
+        return out
+
+    # ------------------ BUILD / IO ------------------
+    @classmethod
+    def from_tfidf(cls, matrix):
+        """Từ ma trận TF-IDF (job x term) đã lưu: trọng số = giá trị đã chia norm dòng."""
+        matrix = sparse.csr_matrix(matrix)
+        normalized = sparse.diags(inverse_row_norms(matrix)) @ matrix
+        return cls._from_doc_term(normalized, "cosine")
+
+    @classmethod
+    def from_counts(cls, counts, k1=1.5, b=0.75):
+        """BM25 từ ma trận đếm tf (job x term) theo cùng từ điển với vectorizer."""
+        counts = sparse.csr_matrix(counts, dtype=np.float64)
+        n_docs = counts.shape[0]
+        doc_len = np.asarray(counts.sum(axis=1)).ravel()
+        avgdl = doc_len.mean() if n_docs and doc_len.mean() > 0 else 1.0
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+        tf = counts.data
+        norm = np.repeat(k1 * (1 - b + b * doc_len / avgdl), np.diff(counts.indptr))
+        weights = counts.copy()
+        weights.data = idf[counts.indices] * tf * (k1 + 1) / (tf + norm)
+        return cls._from_doc_term(weights, "bm25")
+
+    @classmethod
+    def _from_doc_term(cls, doc_term, scoring):
+        postings = sparse.csc_matrix(doc_term)
+        postings.sort_indices()
+        return cls(postings.indptr.astype(np.int64), postings.indices.astype(np.int32),
+                   postings.data.astype(np.float32), doc_term.shape[0], scoring)
+
+    def save(self, matrix_path):
+        paths = inverted_index_paths(matrix_path, self.scoring)
+        np.save(paths["indptr"], self.indptr)
+        np.save(paths["docs"], self.docs)
+        np.save(paths["weights"], self.weights)
+        np.save(paths["max"], np.asarray([self.n_docs], dtype=np.int64))
+        return paths
+
+    @classmethod
+    def load(cls, matrix_path, scoring="cosine", mmap=True):
+        """Load index đã dựng sẵn (memory-map), None nếu chưa có."""
+        paths = inverted_index_paths(matrix_path, scoring)
+        if not all(os.path.exists(p) for p in paths.values()):
+            return None
+        n_docs = int(np.load(paths["max"])[0])
+        return cls(load_dense(paths["indptr"], mmap), load_dense(paths["docs"], mmap),
+                   load_dense(paths["weights"], mmap), n_docs, scoring)
+
+    # ------------------ QUERY ------------------
+    def postings(self, term):
+        start, stop = self.indptr[term], self.indptr[term + 1]
+        return self.docs[start:stop], self.weights[start:stop]
+
+    def query_weights(self, vec):
+        """Vector query (sparse 1 x V) -> (term ids, trọng số term) theo kiểu chấm điểm của index."""
+        vec = sparse.csr_matrix(vec)
+        terms = vec.indices.astype(np.int64)
+        keep = terms < self.n_terms
+        terms = terms[keep]
+        if self.scoring == "bm25":
+            return terms, np.ones(len(terms), dtype=np.float64)
+        weights = vec.data[keep].astype(np.float64)
+        norm = np.sqrt(np.dot(vec.data, vec.data))
+        return terms, (weights / norm if norm > 0 else weights)
+
+    def score_all(self, vec, allowed=None):
+        """
+        Term-at-a-time, không cắt tỉa: (job id tăng dần, điểm) của mọi job chứa ít nhất 1 term.
+        allowed: mask bool theo job (bộ lọc) hoặc None.
+        """
+        terms, q_weights = self.query_weights(vec)
+        docs, weights = [], []
+        for term, qw in zip(terms, q_weights):
+            d, w = self._filtered_postings(term, allowed)
+            docs.append(d)
+            weights.append(w * qw)
+        return self._accumulate(docs, weights)
+
+    def top_k(self, vec, k, allowed=None):
+        """
+        Top-k theo TAAT + cắt tỉa kiểu MaxScore:
+        - Duyệt term theo cận trên (max weight * trọng số query) giảm dần.
+        - θ = điểm thứ k đã biết (cận dưới của điểm thứ k cuối cùng). Khi tổng cận trên của các term
+          còn lại < θ, job chưa gặp không thể vào top-k -> chỉ cộng điểm cho ứng viên đã có
+          (tra ứng viên trong posting list), ứng viên có điểm + cận trên còn lại < θ bị loại.
+        Cùng kết quả với score_all + top-k (chỉ khác làm tròn số thực), đồng điểm -> job id nhỏ hơn trước.
+        """
+        terms, q_weights = self.query_weights(vec)
+        if len(terms) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        bounds = self.max_weights[terms] * q_weights
+        order = np.argsort(-bounds, kind="stable")
+        terms, q_weights, bounds = terms[order], q_weights[order], bounds[order]
+        # rest[i] = tổng cận trên của các term từ i trở đi
+        rest = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])
+
+        # Pha 1: term "thiết yếu". Cận dưới của θ: điểm cuối của 1 job >= trọng số của nó ở từng term
+        # -> điểm thứ k trong 1 posting list đã là cận dưới hợp lệ (không cần accumulator)
+        docs, weights = [], []
+        theta = -np.inf
+        i = 0
+        while i < len(terms):
+            d, w = self._filtered_postings(terms[i], allowed)
+            docs.append(d)
+            weights.append(w * q_weights[i])
+            if len(d) >= k:
+                theta = max(theta, np.partition(weights[-1], len(d) - k)[len(d) - k])
+            i += 1
+            if rest[i] < theta: break
+
+        cand_docs, cand_scores = self._accumulate(docs, weights)
+        if len(cand_scores) >= k:
+            theta = max(theta, np.partition(cand_scores, len(cand_scores) - k)[len(cand_scores) - k])
+
+        # Pha 2: term còn lại không thể đưa job mới vào top-k -> chỉ cập nhật ứng viên
+        while i < len(terms) and len(cand_docs):
+            cand_keep = cand_scores + rest[i] >= theta
+            cand_docs, cand_scores = cand_docs[cand_keep], cand_scores[cand_keep]
+            d, w = self._filtered_postings(terms[i], allowed)
+            if len(d):
+                pos = np.minimum(np.searchsorted(d, cand_docs), len(d) - 1)
+                cand_scores = cand_scores + np.where(d[pos] == cand_docs, w[pos] * q_weights[i], 0.0)
+            if len(cand_scores) >= k:
+                theta = max(theta, np.partition(cand_scores, len(cand_scores) - k)[len(cand_scores) - k])
+            i += 1
+
+        top = top_k_indices(cand_scores, k)
+        return cand_docs[top], cand_scores[top]
+
+    def _filtered_postings(self, term, allowed=None):
+        d, w = self.postings(term)
+        if allowed is not None:
+            keep = allowed[d]
+            d, w = d[keep], w[keep]
+        return d, w
+
+    @staticmethod
+    def _accumulate(docs, weights):
+        """Cộng điểm theo job id: (job id tăng dần, tổng điểm)."""
+        docs = [d for d in docs if len(d)]
+        if not docs:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        all_docs = np.concatenate(docs).astype(np.int64, copy=False)
+        all_weights = np.concatenate([w for w in weights if len(w)]).astype(np.float64, copy=False)
+        unique, inverse = np.unique(all_docs, return_inverse=True)
+        return unique, np.bincount(inverse, weights=all_weights, minlength=len(unique))
@@ -0,0 +1,113 @@
+import json
+import math
+
+import numpy as np
+
+# orjson là tùy chọn (pip install orjson): nhanh hơn json chuẩn nhiều lần
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """obj -> JSON bytes (UTF-8, không khoảng trắng thừa)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# --- XỬ LÝ LƯƠNG ---
+def format_salary(row):
+    s_str = str(row.get('salary_range', '')).strip()
+    # Nếu salary_range rỗng hoặc là các giá trị rác -> Tự tính toán
+    if not s_str or s_str.lower() in ['nan', 'none', '', '0', 'thỏa thuận']:
+        try:
+            min_s = float(row.get('min_salary_edited', 0))
+            max_s = float(row.get('max_salary_edited', 0))
+
+            if min_s == 0 and max_s == 0: return "Thỏa thuận"
+            if min_s > 0 and max_s == 0: return f"Trên {int(min_s)} Triệu"
+            if min_s == 0 and max_s > 0: return f"Lên tới {int(max_s)} Triệu"
+            return f"{int(min_s)} - {int(max_s)} Triệu"
+        except:
+            return "Thỏa thuận"
+    return s_str
+
+
+def parse_specializations(specs_raw):
+    if isinstance(specs_raw, str):
+        return [s.strip() for s in specs_raw.split(',') if s.strip()]
+    if isinstance(specs_raw, list):
+        return [str(s) for s in specs_raw]
+    return []
+
+
+# Giá trị mặc định để tránh lỗi NoneType
+FILL_VALUES = {
+    "location": "Unknown", "type": "Unknown", "position": "", "specializations": "",
+    "description": "", "requirements": "", "benefits": "", "experience": "", "level": ""
+}
+
+
+def job_card_fields(row, idx):
+    """1 dòng job -> (trường JobCardSummary trừ điểm, trường thêm của JobCardDetail), đúng thứ tự schema."""
+    summary = {
+        "id": int(row.get('id', idx)),
+        "title": str(row.get('title', row.get('title_processed', 'No Title'))),
+        "location": str(row.get('location', 'Unknown')),
+        "type": str(row.get('type', 'Unknown')),
+        "position": str(row.get('position', '')),
+        "salary_range": format_salary(row),
+        "specializations": parse_specializations(row.get('specializations', [])),
+    }
+    detail = {
+        "description": str(row.get('description', '')),
+        "requirements": str(row.get('requirements', '')),
+        "benefit": str(row.get('benefits', row.get('benefit', ''))),
+        "experience": str(row.get('experience', '')),
+        "level": str(row.get('level', '')),
+    }
+    return summary, detail
+
+
+def score_json(score):
+    # NaN / inf -> null (giống Pydantic)
+    score = float(score)
+    return dumps(score) if math.isfinite(score) else b"null"
+
+
+class JobCardStore:
+    """
+    JSON của từng job card dựng sẵn 1 lần khi load data (lương đã format, chuyên môn đã tách).
+    - summary: mảnh JSON tới trước điểm: `{"id":..,...,"similarity_score":` -> chỉ cần nối điểm + `}`
+    - detail: JSON đầy đủ của JobCardDetail (điểm 0.0)
+    Endpoint ghép response (bytes) trực tiếp từ row id: không fillna / iterrows / Pydantic mỗi request.
+    Row id = vị trí dòng trong df (df dùng RangeIndex).
+    base: store của snapshot trước -> chỉ dựng thêm các job mới (df = các dòng nối tiếp sau base).
+    """
+
+    def __init__(self, df, base=None):
+        self.summary_json = list(base.summary_json) if base is not None else []
+        self.detail_json = list(base.detail_json) if base is not None else []
+        records = df.fillna(FILL_VALUES).to_dict("records")
+        for idx, row in zip(df.index.tolist(), records):
+            summary, detail = job_card_fields(row, idx)
+            prefix = dumps(summary)[:-1] + b',"similarity_score":'
+            self.summary_json.append(prefix)
+            self.detail_json.append(prefix + b"0.0," + dumps(detail)[1:])
+
+    def __len__(self):
+        return len(self.summary_json)
+
+    def render(self, rows, scores=None):
+        """Danh sách JobCardSummary (JSON bytes) theo row id; không có điểm -> 0.0."""
+        rows = np.asarray(rows, dtype=np.int64).tolist()
+        if scores is None:
+            parts = [self.summary_json[r] + b"0.0}" for r in rows]
+        else:
+            parts = [self.summary_json[r] + score_json(s) + b"}" for r, s in zip(rows, scores)]
+        return b"[" + b",".join(parts) + b"]"
+
+    def render_detail(self, row):
+        return self.detail_json[row]
@@ -0,0 +1,122 @@
+import os
+import pandas as pd
+
+# pyarrow là tùy chọn: có thì đọc snapshot cột (Arrow IPC) thay cho Excel
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+# Cột ít giá trị khác nhau -> lưu dạng category (nhỏ hơn, so sánh nhanh hơn)
+CATEGORICAL_COLUMNS = ["location", "type"]
+
+
+def prepare_jobs(df):
+    """
+    Pre-process cơ bản, dùng chung cho dữ liệu đọc từ Excel và từ snapshot.
+    Gọi nhiều lần vẫn cho cùng kết quả.
+    """
+    df['min_salary_edited'] = df['min_salary_edited'].fillna(0).astype(int)
+    df['max_salary_edited'] = df['max_salary_edited'].fillna(0).astype(int)
+    for col in CATEGORICAL_COLUMNS:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            if "Unknown" not in df[col].cat.categories:
+                df[col] = df[col].cat.add_categories("Unknown")
+            df[col] = df[col].fillna("Unknown")
+        else:
+            df[col] = df[col].fillna("Unknown").astype(str)
+
+    # Đảm bảo có cột description và title_processed
+    if 'description' not in df.columns:
+         df['description'] = ""
+    if 'title_processed' not in df.columns:
+         df['title_processed'] = df['title']
+
+    if 'id' not in df.columns:
+        df['id'] = df.index
+    return df
+
+
+# Các phần ghép thành overall_text (nối bằng ". ", bỏ phần trống) - như lúc dựng dữ liệu train
+OVERALL_TEXT_PARTS = ["title", "description", "requirements", "benefit"]
+
+
+def overall_texts(df):
+    """overall_text của từng job: các phần OVERALL_TEXT_PARTS có nội dung, nối bằng ". "."""
+    return [
+        ". ".join(str(v) for v in parts if pd.notna(v) and str(v).strip())
+        for parts in df.reindex(columns=OVERALL_TEXT_PARTS).itertuples(index=False)
+    ]
+
+
+def build_job_rows(records, start, preprocess_many):
+    """
+    Job mới (list dict / DataFrame, cột giống file dữ liệu) -> DataFrame đã prepare với row id
+    start, start+1, ... (cột id = row id), overall_text và các cột *_processed tiền xử lý như lúc train.
+    """
+    df = pd.DataFrame(records).reset_index(drop=True)
+    if df.empty: return df
+    if "title" not in df.columns or df["title"].isna().any():
+        raise ValueError("Job mới cần có title")
+    if "specializations" in df.columns:
+        # Dữ liệu gốc lưu danh sách chuyên môn dạng chuỗi "['A', 'B']"
+        df["specializations"] = [str(v) if isinstance(v, list) else v for v in df["specializations"]]
+    for col in OVERALL_TEXT_PARTS + ["min_salary_edited", "max_salary_edited", "location", "type"]:
+        if col not in df.columns:
+            df[col] = None
+
+    df["overall_text"] = overall_texts(df)
+    df["title_processed"] = preprocess_many(df["title"].astype(str).tolist())
+    df["overall_text_processed"] = preprocess_many(df["overall_text"].tolist())
+
+    df.index = pd.RangeIndex(start, start + len(df))
+    df["id"] = df.index
+    return prepare_jobs(df)
+
+
+def read_excel_source(path):
+    return pd.read_excel(path, engine='openpyxl')
+
+
+def snapshot_is_fresh(snapshot_path, source_path):
+    """Snapshot dùng được nếu tồn tại và không cũ hơn file Excel nguồn."""
+    if feather is None or not os.path.exists(snapshot_path):
+        return False
+    if os.path.exists(source_path) and os.path.getmtime(source_path) > os.path.getmtime(snapshot_path):
+        return False
+    return True
+
+
+def read_snapshot(path):
+    """Đọc snapshot Arrow IPC qua memory-map (cột số không phải copy lại)."""
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas()
+
+
+def write_snapshot(df, path):
+    """
+    Ghi DataFrame đã prepare ra snapshot Arrow IPC (không nén để memory-map được).
+    Cột object lẫn kiểu (vd: số + chuỗi từ Excel) được chuyển về chuỗi, giữ nguyên NaN.
+    Trả về danh sách cột đã chuyển kiểu.
+    """
+    if feather is None:
+        raise ImportError("Cần cài pyarrow để ghi snapshot (pip install pyarrow)")
+
+    df = df.reset_index(drop=True).copy()
+    converted = []
+    for col in df.columns:
+        if df[col].dtype != object: continue
+        types = {type(v) for v in df[col].dropna().tolist()}
+        if len(types) > 1:
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+            converted.append(col)
+
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype("category")
+
+    tmp = path + ".tmp"
+    feather.write_feather(df, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+    return converted
@@ -0,0 +1,158 @@
+import os
+import threading
+import weakref
+
+import joblib
+import numpy as np
+from scipy import sparse
+
+# Số dòng xử lý mỗi lần khi duyệt ma trận memory-map (tránh copy cả ma trận vào RAM)
+CHUNK_ROWS = 16384
+
+
+# ------------------ DENSE (.npy) ------------------
+def load_dense(path, mmap=True):
+    """Mở file .npy ở chế độ read-only memory-map: N worker dùng chung 1 bản trong page cache."""
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+# ------------------ SPARSE (TF-IDF) ------------------
+def sparse_mmap_paths(path):
+    """tfidf_matrix_x.pkl -> tfidf_matrix_x.data.npy / .indices.npy / .indptr.npy / .shape.npy"""
+    base = os.path.splitext(path)[0]
+    return {part: f"{base}.{part}.npy" for part in ("data", "indices", "indptr", "shape")}
+
+
+def save_sparse_mmap(matrix, path):
+    """Tách ma trận CSR thành các file .npy để có thể memory-map."""
+    matrix = sparse.csr_matrix(matrix)
+    matrix.sort_indices()
+    paths = sparse_mmap_paths(path)
+    np.save(paths["data"], matrix.data)
+    np.save(paths["indices"], matrix.indices)
+    np.save(paths["indptr"], matrix.indptr)
+    np.save(paths["shape"], np.asarray(matrix.shape, dtype=np.int64))
+    return paths
+
+
+def load_sparse(path, mmap=True):
+    """
+    Load ma trận TF-IDF: ưu tiên bản tách .npy (memory-map, dùng chung giữa các worker),
+    không có thì đọc file pickle gốc.
+    """
+    paths = sparse_mmap_paths(path)
+    if mmap and all(os.path.exists(p) for p in paths.values()):
+        shape = tuple(int(n) for n in np.load(paths["shape"]))
+        return sparse.csr_matrix(
+            (load_dense(paths["data"]), load_dense(paths["indices"]), load_dense(paths["indptr"])),
+            shape=shape, copy=False
+        )
+    return joblib.load(path)
+
+
+# ------------------ VALIDATION ------------------
+def validate_matrix(name, matrix, n_rows=None):
+    """
+    Kiểm tra ma trận lúc load: 2 chiều, kiểu số thực, số dòng khớp số job.
+    Sai kiểu -> ValueError. Lệch số dòng -> chỉ cảnh báo (các dòng thiếu nhận điểm 0).
+    """
+    if matrix.ndim != 2:
+        raise ValueError(f"{name}: cần ma trận 2 chiều, nhận shape {matrix.shape}")
+    if not np.issubdtype(matrix.dtype, np.floating):
+        raise ValueError(f"{name}: cần kiểu float, nhận {matrix.dtype}")
+    if n_rows is not None and matrix.shape[0] != n_rows:
+        print(f"⚠️ {name}: {matrix.shape[0]} dòng nhưng dữ liệu có {n_rows} job")
+
+
+# ------------------ ROW NORMS ------------------
+def inverse_row_norms(matrix):
+    """1 / ||row|| cho từng dòng (0 nếu dòng toàn 0), duyệt theo khối."""
+    if sparse.issparse(matrix):
+        sq = np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+    else:
+        sq = np.empty(matrix.shape[0], dtype=np.float64)
+        for start in range(0, matrix.shape[0], CHUNK_ROWS):
+            block = np.asarray(matrix[start:start + CHUNK_ROWS], dtype=np.float64)
+            sq[start:start + CHUNK_ROWS] = np.einsum("ij,ij->i", block, block)
+    norms = np.sqrt(sq)
+    inv = np.zeros_like(norms)
+    np.divide(1.0, norms, out=inv, where=norms > 0)
+    return inv
+
+
+class RowNormCache:
+    """
+    Cache 1/||row|| theo ma trận (tính 1 lần lúc load).
+    Cosine = (M @ v) * inv_norm / ||v||, không cần chuẩn hóa (copy) cả ma trận mỗi query
+    như sklearn cosine_similarity. Entry tự xóa khi ma trận bị giải phóng.
+    """
+
+    def __init__(self):
+        self._norms = {}
+        self._lock = threading.Lock()
+
+    def get(self, matrix):
+        key = id(matrix)
+        entry = self._norms.get(key)
+        if entry is not None and entry[0]() is matrix:
+            return entry[1]
+
+        return self.put(matrix, inverse_row_norms(matrix))
+
+    def put(self, matrix, inv_norms):
+        """Gán norm tính sẵn (vd: lưu kèm bản nén) -> không phải đọc toàn bộ ma trận lúc load."""
+        key = id(matrix)
+        with self._lock:
+            self._norms[key] = (weakref.ref(matrix, lambda _, k=key: self._norms.pop(k, None)), inv_norms)
+        return inv_norms
+
+
+def cosine_scores(vec, matrix, inv_norms, rows=None):
+    """
+    Cosine giữa 1 vector query (1 x d, dense hoặc sparse) và các dòng `rows` của ma trận.
+    Kết quả giống sklearn cosine_similarity(vec, matrix[rows]).
+    """
+    sub = matrix if rows is None else matrix[rows]
+    inv = inv_norms if rows is None else inv_norms[rows]
+
+    if sparse.issparse(vec):
+        q_norm = np.sqrt(vec.multiply(vec).sum())
+        dots = sub @ vec.T
+        dots = dots.toarray().ravel() if sparse.issparse(dots) else np.asarray(dots).ravel()
+    else:
+        vec = np.asarray(vec).ravel()
+        q_norm = np.linalg.norm(vec)
+        if sparse.issparse(sub):
+            dots = np.asarray(sub @ vec).ravel()
+        else:
+            dots = sub @ vec.astype(sub.dtype, copy=False)
+
+    if q_norm == 0:
+        return np.zeros(len(dots))
+    return dots * inv / q_norm
+
+
+def cosine_scores_many(vecs, matrix, inv_norms, rows=None):
+    """
+    Cosine giữa Q vector query (Q x d, dense hoặc sparse) và các dòng `rows`: ma trận điểm Q x n,
+    tính bằng 1 phép nhân ma trận. Query có norm 0 -> cả dòng điểm 0.
+    """
+    sub = matrix if rows is None else matrix[rows]
+    inv = inv_norms if rows is None else inv_norms[rows]
+
+    if sparse.issparse(vecs):
+        vecs = sparse.csr_matrix(vecs)
+        q_norms = np.sqrt(np.asarray(vecs.multiply(vecs).sum(axis=1)).ravel())
+        dots = sub @ vecs.T
+        dots = dots.toarray() if sparse.issparse(dots) else np.asarray(dots)
+    else:
+        vecs = np.asarray(vecs)
+        q_norms = np.linalg.norm(vecs, axis=1)
+        if sparse.issparse(sub):
+            dots = np.asarray(sub @ vecs.T)
+        else:
+            dots = sub @ vecs.astype(sub.dtype, copy=False).T
+
+    inv_q = np.zeros_like(q_norms, dtype=np.float64)
+    np.divide(1.0, q_norms, out=inv_q, where=q_norms > 0)
+    return dots.T * inv[None, :] * inv_q[:, None]
@@ -0,0 +1,125 @@
+import threading
+from bisect import bisect_left
+
+from app.config import settings
+
+# Ngưỡng bucket (giây) cho histogram độ trễ
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Nhãn model cố định (model_name của frontend + model key trong settings). model_name do client gửi tùy ý
+# -> giá trị khác gộp thành "other", không sinh series mới cho mỗi chuỗi lạ
+MODEL_LABELS = frozenset([
+    "none", "ensemble", "ensemble_fast", "bge", "mpnet", "labse", "doc2vec", "doc2vec_dbow",
+    "tfidf", "bm25", "w2v", "w2v_sg",
+] + list(settings.MODEL_PATHS))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra: pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Histogram kiểu Prometheus: đếm theo bucket (lũy kế khi xuất), tổng và số lần quan sát theo từng bộ nhãn."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [số đếm từng bucket (+Inf ở cuối), tổng]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect_left(self.buckets, value)  # bucket đầu tiên có le >= value
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for le, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', _number(le)))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter("job_api_requests_total", "Số request theo endpoint và mã trạng thái", ("endpoint", "status"))
+REQUEST_SECONDS = Histogram("job_api_request_duration_seconds", "Thời gian xử lý request", ("endpoint", "model"))
+STAGE_SECONDS = Histogram("job_api_stage_duration_seconds", "Thời gian từng stage của request",
+                          ("endpoint", "model", "stage"))
+
+
+def observe_request(endpoint, model, status, seconds, stage_ms):
+    """Ghi 1 request: stage_ms = {stage: ms} từ timing.record_stages()."""
+    model = model if model in MODEL_LABELS else "other"
+    REQUESTS.inc((endpoint, str(status)))
+    REQUEST_SECONDS.observe((endpoint, model), seconds)
+    for name, ms in stage_ms.items():
+        STAGE_SECONDS.observe((endpoint, model, name), ms / 1000)
+
+
+def render(model_stats=None, pool_stats=None):
+    """
+    Toàn bộ metrics ở định dạng text của Prometheus.
+    model_stats: SearchEngine.model_stats(), pool_stats: WorkPool.stats() (tùy chọn).
+    """
+    lines = REQUESTS.render() + REQUEST_SECONDS.render() + STAGE_SECONDS.render()
+    if pool_stats is not None:
+        lines += ["# HELP job_work_pool_requests Request nặng đang chạy / đang chờ trong pool",
+                  "# TYPE job_work_pool_requests gauge",
+                  f'job_work_pool_requests{{state="running"}} {pool_stats["running"]}',
+                  f'job_work_pool_requests{{state="queued"}} {pool_stats["queued"]}',
+                  "# HELP job_work_pool_rejected_total Request bị từ chối (503) theo lý do",
+                  "# TYPE job_work_pool_rejected_total counter"]
+        lines += [f'job_work_pool_rejected_total{{reason="{reason}"}} {count}'
+                  for reason, count in pool_stats["rejected"].items()]
+    if model_stats is not None:
+        lines += ["# HELP job_model_memory_bytes RAM ước lượng của model đã load",
+                  "# TYPE job_model_memory_bytes gauge"]
+        lines += [f'job_model_memory_bytes{{model="{_escape(m["key"])}"}} {m["nbytes"]}'
+                  for m in model_stats["models"]]
+        lines += ["# HELP job_model_evictions_total Số lần giải phóng model (LRU)",
+                  "# TYPE job_model_evictions_total counter",
+                  f"job_model_evictions_total {model_stats['evictions']}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,207 @@
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+
+
+def estimate_nbytes(obj):
+    """Ước lượng RAM (byte) của model / ma trận / index đã load."""
+    if obj is None:
+        return 0
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if sparse.issparse(obj):
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes
+    if hasattr(obj, "inference_nbytes"):  # SentenceTransformer qua encoder_backend (int8 / ONNX)
+        return obj.inference_nbytes
+    if hasattr(obj, "parameters"):  # torch module (SentenceTransformer)
+        return sum(p.numel() * p.element_size() for p in obj.parameters())
+    if hasattr(obj, "vocabulary_"):  # TfidfVectorizer
+        vocab = obj.vocabulary_
+        return sys.getsizeof(vocab) + sum(sys.getsizeof(t) for t in vocab) + estimate_nbytes(getattr(obj, "idf_", None))
+    if hasattr(obj, "vectors"):  # KeyedVectors
+        return estimate_nbytes(obj.vectors)
+    if hasattr(obj, "wv"):  # Doc2Vec: vector từ + vector văn bản + trọng số output
+        parts = (obj.wv, getattr(obj, "dv", None))
+        return sum(estimate_nbytes(getattr(p, "vectors", None)) for p in parts if p is not None) \
+            + estimate_nbytes(getattr(obj, "syn1neg", None))
+    if hasattr(obj, "nbytes"):  # QuantizedMatrix
+        return int(obj.nbytes)
+    if hasattr(obj, "indptr") and hasattr(obj, "weights"):  # InvertedIndex
+        return obj.indptr.nbytes + obj.docs.nbytes + obj.weights.nbytes
+    if hasattr(obj, "meta") and "n_rows" in getattr(obj, "meta", {}):  # AnnIndex (HNSW): vector + 2M liên kết / node
+        meta = obj.meta
+        return meta["n_rows"] * (meta["dim"] * 4 + meta.get("M", 16) * 2 * 4)
+    return 0
+
+
+class _Entry:
+    def __init__(self, key, nbytes, pinned, load_seconds):
+        self.key = key
+        self.nbytes = nbytes
+        self.pinned = pinned
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+
+    def to_dict(self, in_use):
+        return {
+            "key": self.key,
+            "size_mb": round(self.nbytes / 1024 / 1024, 1),
+            "nbytes": int(self.nbytes),
+            "pinned": self.pinned,
+            "in_use": in_use,
+            "uses": self.uses,
+            "load_seconds": round(self.load_seconds, 2),
+            "loaded_at": datetime.fromtimestamp(self.loaded_at).isoformat(timespec="seconds"),
+            "last_used": datetime.fromtimestamp(self.last_used).isoformat(timespec="seconds"),
+        }
+
+
+class ModelRegistry:
+    """
+    Quản lý các model đã load của SearchEngine:
+    - Single-flight: mỗi key có 1 lock load riêng -> N request đồng thời đầu tiên chỉ load 1 lần,
+      các request còn lại chờ rồi dùng chung. Load key khác nhau vẫn chạy song song.
+    - Ngân sách RAM (budget_bytes, None = không giới hạn): vượt ngân sách sau khi load
+      -> giải phóng model dùng lâu nhất (LRU), bỏ qua model ghim (pinned) và model đang được
+      request khác dùng (trong session()).
+    unload(key) là callback của engine: xóa model + ma trận / index đi kèm.
+    """
+
+    def __init__(self, unload, budget_bytes=None, pinned=()):
+        self.unload = unload
+        self.budget_bytes = budget_bytes
+        self.pinned = frozenset(pinned)
+        self._entries = OrderedDict()  # key -> _Entry, cũ nhất đứng đầu
+        self._load_locks = {}
+        self._in_use = Counter()
+        self._evictions = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # ------------------ SESSION (model đang dùng) ------------------
+    @contextmanager
+    def session(self):
+        """Giữ các model được ensure() trong khối này khỏi bị evict tới khi request xong."""
+        if getattr(self._local, "held", None) is not None:
+            yield  # session lồng nhau -> dùng session ngoài
+            return
+        self._local.held = set()
+        try:
+            yield
+        finally:
+            held, self._local.held = self._local.held, None
+            with self._lock:
+                for key in held:
+                    self._in_use[key] -= 1
+                    if self._in_use[key] <= 0: del self._in_use[key]
+
+    def _hold(self, key):
+        # Gọi khi đang giữ self._lock
+        held = getattr(self._local, "held", None)
+        if held is not None and key not in held:
+            held.add(key)
+            self._in_use[key] += 1
+
+    # ------------------ LOAD ------------------
+    def _touch(self, key):
+        # Gọi khi đang giữ self._lock
+        entry = self._entries.get(key)
+        if entry is None: return False
+        entry.last_used = time.time()
+        entry.uses += 1
+        self._entries.move_to_end(key)
+        self._hold(key)
+        return True
+
+    def ensure(self, key, load):
+        """
+        Đảm bảo model `key` đã load. load() thực hiện load và trả về số byte,
+        hoặc None nếu load thất bại (không đăng ký, lần sau thử lại).
+        """
+        with self._lock:
+            if self._touch(key): return True
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if self._touch(key): return True
+                self._hold(key)
+
+            start = time.perf_counter()
+            nbytes = load()
+            if nbytes is None: return False
+
+            with self._lock:
+                entry = self._entries[key] = _Entry(key, nbytes, key in self.pinned, time.perf_counter() - start)
+                entry.uses += 1
+                victims = self._pick_victims(key)
+
+        for victim in victims:
+            self._evict(victim)
+        return True
+
+    def _pick_victims(self, loaded_key):
+        # Gọi khi đang giữ self._lock: chọn theo LRU tới khi tổng RAM <= ngân sách
+        if self.budget_bytes is None: return []
+        total = sum(e.nbytes for e in self._entries.values())
+        victims = []
+        for key, entry in self._entries.items():
+            if total <= self.budget_bytes: break
+            if entry.pinned or key == loaded_key or self._in_use.get(key): continue
+            victims.append(key)
+            total -= entry.nbytes
+        for key in victims:
+            del self._entries[key]
+        if total > self.budget_bytes:
+            print(f"⚠️ Model Registry: {total / 1024 / 1024:.0f} MB vượt ngân sách "
+                  f"{self.budget_bytes / 1024 / 1024:.0f} MB (còn lại đều đang dùng / được ghim)")
+        return victims
+
+    def _evict(self, key, reason="LRU"):
+        # Giữ lock load của key: request load lại key này sẽ chờ unload xong
+        with self._load_locks[key]:
+            with self._lock:
+                # Request khác đã load lại key trước khi kịp unload -> giữ nguyên
+                if key in self._entries: return
+            self.unload(key)
+        with self._lock:
+            self._evictions += 1
+        print(f"💾 Model Registry: đã giải phóng {key} ({reason})")
+
+    def release(self, key):
+        """Giải phóng model ngay (vd: script dựng lần lượt từng model). Đang được dùng -> giữ lại, trả về False."""
+        with self._lock:
+            if key not in self._entries or self._in_use.get(key): return False
+            del self._entries[key]
+        self._evict(key, "release")
+        return True
+
+    def resize(self, key, nbytes):
+        """Cập nhật RAM của model đã load (vd: dựng thêm index sau khi load)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: return
+            entry.nbytes = nbytes
+            victims = self._pick_victims(key)
+        for victim in victims:
+            self._evict(victim)
+
+    # ------------------ STATS ------------------
+    def stats(self):
+        with self._lock:
+            models = [e.to_dict(self._in_use.get(k, 0)) for k, e in reversed(self._entries.items())]
+            total = sum(e.nbytes for e in self._entries.values())
+            return {
+                "budget_mb": None if self.budget_bytes is None else round(self.budget_bytes / 1024 / 1024, 1),
+                "total_mb": round(total / 1024 / 1024, 1),
+                "evictions": self._evictions,
+                "models": models,
+            }
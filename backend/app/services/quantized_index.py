@@ -0,0 +1,98 @@
+import os
+import numpy as np
+
+from app.services.matrix_store import inverse_row_norms, load_dense
+
+# Chỉ int8: float16 không có phép nhân nhanh trên CPU qua numpy (quét chậm hơn bản gốc nhiều lần)
+QUANT_KINDS = ("int8",)
+
+# Số dòng giải nén (-> float32) mỗi lần khi quét: vừa cache CPU, buffer dùng lại giữa các khối
+SCAN_BLOCK_ROWS = 256
+
+
+def quantized_paths(embedding_path, kind):
+    """job_xxx.npy -> job_xxx.int8.npy (mã) + job_xxx.int8.npz (scale theo chiều, norm dòng gốc)"""
+    base = os.path.splitext(embedding_path)[0]
+    return f"{base}.{kind}.npy", f"{base}.{kind}.npz"
+
+
+class QuantizedMatrix:
+    """
+    Bản nén int8 của 1 ma trận embedding float32: x ~ codes * scale (scale theo từng chiều = max|x_j| / 127).
+    Lợi ích chính là bộ nhớ: nhỏ hơn 4 lần (RAM / page cache, đọc đĩa khi memory-map), quét đọc ít byte hơn.
+    Phép nhân vẫn là float32 (giải nén từng khối nhỏ rồi BLAS) - numpy không có tích int8 nhanh hơn BLAS,
+    nên tốc độ quét chỉ nhỉnh hơn bản gốc khi ma trận nằm sẵn trong RAM.
+    Norm dòng lấy từ bản gốc -> điểm xấp xỉ chỉ lệch ở tích vô hướng.
+    Điểm cuối cùng phải tính lại chính xác trên dòng gốc (re-rank shortlist).
+    """
+
+    def __init__(self, kind, codes, scales, inv_norms):
+        if kind not in QUANT_KINDS:
+            raise ValueError(f"Kiểu lượng tử hóa không hỗ trợ: {kind}")
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+        self.inv_norms = inv_norms
+        self.shape = codes.shape
+
+    # ------------------ BUILD / IO ------------------
+    @classmethod
+    def build(cls, embeddings, kind="int8"):
+        if kind not in QUANT_KINDS:
+            raise ValueError(f"Kiểu lượng tử hóa không hỗ trợ: {kind}")
+        inv_norms = inverse_row_norms(embeddings)
+        dim = embeddings.shape[1]
+
+        max_abs = np.zeros(dim, dtype=np.float32)
+        for start in range(0, embeddings.shape[0], SCAN_BLOCK_ROWS * 64):
+            block = np.abs(np.asarray(embeddings[start:start + SCAN_BLOCK_ROWS * 64], dtype=np.float32))
+            np.maximum(max_abs, block.max(axis=0), out=max_abs)
+        scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+        codes = np.empty(embeddings.shape, dtype=np.int8)
+        for start in range(0, embeddings.shape[0], SCAN_BLOCK_ROWS * 64):
+            block = np.asarray(embeddings[start:start + SCAN_BLOCK_ROWS * 64], dtype=np.float32)
+            codes[start:start + len(block)] = np.clip(np.rint(block / scales), -127, 127)
+        return cls(kind, codes, scales, inv_norms)
+
+    def save(self, embedding_path):
+        codes_path, meta_path = quantized_paths(embedding_path, self.kind)
+        np.save(codes_path, self.codes)
+        np.savez(meta_path, scales=self.scales, inv_norms=self.inv_norms)
+        return codes_path
+
+    @classmethod
+    def load(cls, embedding_path, kind, mmap=True):
+        """Load bản nén (memory-map) nếu đã dựng, None nếu chưa có."""
+        codes_path, meta_path = quantized_paths(embedding_path, kind)
+        if not (os.path.exists(codes_path) and os.path.exists(meta_path)):
+            return None
+        with np.load(meta_path) as meta:
+            return cls(kind, load_dense(codes_path, mmap), meta["scales"], meta["inv_norms"])
+
+    @property
+    def nbytes(self):
+        return self.codes.size * self.codes.itemsize
+
+    # ------------------ SCAN ------------------
+    def dot(self, vec, rows=None):
+        """Tích vô hướng xấp xỉ giữa query (d,) và các dòng, giải nén từng khối vào 1 buffer float32."""
+        q = np.asarray(vec, dtype=np.float32).ravel() * self.scales
+        n = self.shape[0] if rows is None else len(rows)
+        out = np.empty(n, dtype=np.float32)
+        buf = np.empty((SCAN_BLOCK_ROWS, self.shape[1]), dtype=np.float32)
+        for start in range(0, n, SCAN_BLOCK_ROWS):
+            stop = min(start + SCAN_BLOCK_ROWS, n)
+            block = self.codes[start:stop] if rows is None else self.codes[rows[start:stop]]
+            b = buf[:stop - start]
+            b[...] = block
+            np.matmul(b, q, out=out[start:stop])
+        return out
+
+    def scores(self, vec, rows=None):
+        """Cosine xấp xỉ (norm dòng lấy từ bản gốc)."""
+        q_norm = np.linalg.norm(np.asarray(vec, dtype=np.float64))
+        if q_norm == 0:
+            return np.zeros(self.shape[0] if rows is None else len(rows))
+        inv = self.inv_norms if rows is None else self.inv_norms[rows]
+        return self.dot(vec, rows) * inv / q_norm
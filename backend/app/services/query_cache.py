@@ -0,0 +1,129 @@
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(query):
+    """Chuẩn hóa query làm key cache: lower + gộp khoảng trắng."""
+    if not isinstance(query, str): return ""
+    return " ".join(query.lower().split())
+
+
+def _size_of(value):
+    """Ước lượng số byte của 1 giá trị cache (chuỗi token, ndarray, sparse, tuple)."""
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_size_of(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "data") and hasattr(value, "indices"):  # scipy sparse
+        return value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """
+    LRU cache cho query đã tiền xử lý và vector query.
+    - Key: (model key, query đã chuẩn hóa). Chuỗi token dùng key "preprocess".
+    - Loại bỏ theo LRU khi vượt max_entries hoặc max_bytes, hết hạn sau ttl giây.
+    - Đếm hit / miss theo từng model key (hoặc stats_key truyền vào get() khi key tra cứu không cố định).
+    - Có thể lưu ra đĩa (pickle) để restart vẫn "ấm".
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=256 * 1024 * 1024, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, size, created_at)
+        self._bytes = 0
+        self._hits = {}
+        self._misses = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_key, query, stats_key=None):
+        """stats_key: nhãn đếm hit / miss thay cho model_key (model_key do client quyết định -> không đếm theo nó)."""
+        key = (model_key, normalize_query(query))
+        stats_key = model_key if stats_key is None else stats_key
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl and time.time() - item[2] > self.ttl:
+                self._remove(key)
+                item = None
+            if item is None:
+                self._misses[stats_key] = self._misses.get(stats_key, 0) + 1
+                return None
+            self._data.move_to_end(key)
+            self._hits[stats_key] = self._hits.get(stats_key, 0) + 1
+            return item[0]
+
+    def put(self, model_key, query, value, created_at=None):
+        key = (model_key, normalize_query(query))
+        size = _size_of(value)
+        if size > self.max_bytes: return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, created_at or time.time())
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def get_or_compute(self, model_key, query, compute):
+        value = self.get(model_key, query)
+        if value is None:
+            value = compute()
+            self.put(model_key, query, value)
+        return value
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, model_key=None):
+        """Xóa cache của 1 model key (vd: model được load lại) hoặc toàn bộ."""
+        with self._lock:
+            for key in [k for k in self._data if model_key is None or k[0] == model_key]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            keys = set(self._hits) | set(self._misses)
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": sum(self._hits.values()),
+                "misses": sum(self._misses.values()),
+                "per_model": {k: {"hits": self._hits.get(k, 0), "misses": self._misses.get(k, 0)} for k in sorted(keys, key=str)},
+            }
+
+    # ------------------ PERSISTENCE ------------------
+    def save(self, path, fingerprints=None):
+        """Lưu cache ra đĩa. fingerprints: {model_key: dấu vân tay file model} để phát hiện model đổi."""
+        with self._lock:
+            items = [(k, v[0], v[2]) for k, v in self._data.items()]
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"fingerprints": fingerprints or {}, "items": items}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def load(self, path, fingerprints=None):
+        """Nạp cache từ đĩa, bỏ các entry hết hạn hoặc của model đã thay đổi."""
+        if not path or not os.path.exists(path): return 0
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+        saved = payload.get("fingerprints", {})
+        fingerprints = fingerprints or {}
+        now = time.time()
+        loaded = 0
+        for (model_key, query), value, created_at in payload.get("items", []):
+            if model_key in fingerprints and saved.get(model_key) != fingerprints[model_key]:
+                continue
+            if self.ttl and now - created_at > self.ttl:
+                continue
+            self.put(model_key, query, value, created_at)
+            loaded += 1
+        return loaded
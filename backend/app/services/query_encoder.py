@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+# Bucket (ms) cho phân phối thời gian chờ trong hàng đợi
+WAIT_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 250, float("inf")]
+
+
+class _KeyStats:
+    def __init__(self):
+        self.batches = 0
+        self.queries = 0
+        self.batch_sizes = Counter()
+        self.wait_buckets = [0] * len(WAIT_BUCKETS_MS)
+        self.wait_sum_ms = 0.0
+
+    def record(self, batch_size, waits_ms):
+        self.batches += 1
+        self.queries += batch_size
+        self.batch_sizes[batch_size] += 1
+        for w in waits_ms:
+            self.wait_sum_ms += w
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if w <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+
+    def to_dict(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "batch_size_hist": dict(sorted(self.batch_sizes.items())),
+            "queue_wait_ms_hist": {
+                ("+Inf" if b == float("inf") else str(b)): c
+                for b, c in zip(WAIT_BUCKETS_MS, np.cumsum(self.wait_buckets).tolist())
+            },
+            "avg_queue_wait_ms": self.wait_sum_ms / self.queries if self.queries else 0.0,
+        }
+
+
+class BatchingEncoder:
+    """
+    Gom các request encode đồng thời của cùng 1 model key thành 1 batch.
+    - Request đầu tiên mở 1 "cửa sổ" window_ms; các request tới trong cửa sổ
+      (tối đa max_batch) được encode chung 1 lần forward pass.
+    - Mỗi caller nhận lại đúng vector của mình.
+    window_ms <= 0 -> encode trực tiếp (batch 1) như cũ.
+    """
+
+    def __init__(self, window_ms=3, max_batch=16):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._queues = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def encode(self, key, model, text):
+        """Encode 1 câu query -> vector (1 x d), đã chuẩn hóa."""
+        if self.window_ms <= 0:
+            return model.encode([text], normalize_embeddings=True)
+
+        future = Future()
+        self._queue_for(key).put((text, model, future, time.perf_counter()))
+        return future.result()
+
+    def _queue_for(self, key):
+        with self._lock:
+            q = self._queues.get(key)
+            if q is None:
+                q = self._queues[key] = queue.Queue()
+                self._stats[key] = _KeyStats()
+                threading.Thread(target=self._worker, args=(key, q), daemon=True,
+                                 name=f"encoder-{key}").start()
+            return q
+
+    def _worker(self, key, q):
+        while True:
+            batch = [q.get()]
+            deadline = time.perf_counter() + self.window_ms / 1000
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0: break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            texts = [item[0] for item in batch]
+            model = batch[0][1]
+            try:
+                vectors = model.encode(texts, normalize_embeddings=True, batch_size=len(texts))
+                for i, (_, _, future, _) in enumerate(batch):
+                    future.set_result(vectors[i:i + 1])
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+
+            with self._lock:
+                self._stats[key].record(len(batch), [(started - item[3]) * 1000 for item in batch])
+
+    def stats(self):
+        with self._lock:
+            return {key: s.to_dict() for key, s in self._stats.items()}
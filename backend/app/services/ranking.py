@@ -0,0 +1,28 @@
+import numpy as np
+
+
+def top_k_indices(scores, k):
+    """
+    Trả về vị trí của top-k điểm cao nhất, sắp xếp giảm dần.
+    Dùng argpartition (O(n)) thay cho sort toàn bộ. Khi đồng điểm,
+    vị trí nhỏ hơn đứng trước -> giống DataFrame.nlargest(keep='first').
+    """
+    scores = np.asarray(scores)
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+
+    # Ngưỡng = điểm thứ k
+    part = np.argpartition(-scores, k - 1)[:k]
+    threshold = scores[part].min()
+
+    # Lấy toàn bộ job > ngưỡng, phần còn lại bù bằng job = ngưỡng theo thứ tự vị trí
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[: k - len(above)]
+    picked = np.concatenate([above, ties])
+
+    order = np.argsort(-scores[picked], kind="stable")
+    return picked[order]
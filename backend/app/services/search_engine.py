@@ -1,61 +1,344 @@
+import os
+import sys
+import importlib
 import pandas as pd
 import numpy as np
-import re
-import string
+import threading
+import functools
+import zlib
 import joblib
+from scipy import sparse
 import warnings
-from underthesea import word_tokenize
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
 from app.config import settings
-
-# Import Gensim an toàn
-try:
-    from gensim.models import KeyedVectors, Doc2Vec
-except ImportError:
-    KeyedVectors = None
-    Doc2Vec = None
+from app.services.ranking import top_k_indices
+from app.services.ann_index import AnnIndex, ann_index_path
+from app.services.user_profile import UserProfile, UserProfileCache
+from app.services.query_encoder import BatchingEncoder
+from app.services.query_cache import QueryCache
+from app.services.matrix_store import (
+    RowNormCache, cosine_scores, cosine_scores_many, inverse_row_norms, validate_matrix
+)
+from app.services.quantized_index import QUANT_KINDS, QuantizedMatrix
+from app.services.inverted_index import InvertedIndex, term_counts
+from app.services.text_preprocess import TextPreprocessor, load_stopwords
+from app.services.encoder_backend import encoder_options, load_encoder
+from app.services.model_registry import ModelRegistry, estimate_nbytes
+from app.services.segments import segment_store
+from app.services.timing import stage, timed
+from app.services.warmup import Warmup
 
 
 warnings.filterwarnings("ignore")
 
+# Thư viện nặng (sentence_transformers / torch, gensim) chỉ import khi load model đầu tiên của họ đó.
+# Warmup load nhiều model song song -> 1 thread import tại 1 thời điểm
+_import_lock = threading.Lock()
+
+
+def lazy_import(name):
+    with _import_lock:
+        return importlib.import_module(name)
+
+
+def holds_models(method):
+    """
+    Các model load trong lúc gọi hàm không bị registry evict cho tới khi hàm trả về,
+    và snapshot (ma trận / index) không bị đổi giữa chừng (khóa đọc của segment store).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.segments.lock.reading(), self.registry.session():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def frame_rows(df):
+    """DataFrame kết quả search -> (row ids, scores)."""
+    if df.empty:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return df.index.to_numpy(), df['similarity_score'].to_numpy()
+
+
 class SearchEngine:
     def __init__(self):
         self.models = {}       
         self.embeddings = {}   
-        self.stopwords = []
-
-        try:
-            with open(settings.STOPWORDS_PATH, 'r', encoding='utf-8') as f:
-                self.stopwords = f.read().splitlines()
-        except:
-            self.stopwords = []
+        self.ann_indexes = {}
+        self.row_norms = RowNormCache()
+        self.quantized = {}    # emb_key -> QuantizedMatrix (bản nén để quét nhanh)
+        self.sparse_indexes = {}  # (tfidf key, 'cosine' | 'bm25') -> InvertedIndex
+        self.similar_table = None
+        self.user_profiles = UserProfileCache(settings.USER_PROFILE_CACHE_SIZE)
+        self.encoder = BatchingEncoder(settings.ENCODER_BATCH_WINDOW_MS, settings.ENCODER_MAX_BATCH)
+        self.query_cache = QueryCache(
+            settings.QUERY_CACHE_MAX_ENTRIES, settings.QUERY_CACHE_MAX_MB * 1024 * 1024, settings.QUERY_CACHE_TTL
+        )
+        self._doc2vec_lock = threading.Lock()
+        # Load model 1 lần / key (single-flight) + ngân sách RAM, LRU evict model không ghim
+        budget = settings.MODEL_RAM_BUDGET_MB
+        self.registry = ModelRegistry(
+            self._unload_model, None if budget is None else int(budget * 1024 * 1024), settings.PINNED_MODELS
+        )
+        # Job thêm khi đang chạy: ma trận = base + các dòng từ segment (xem app.services.ingest)
+        self.segments = segment_store
+        # Phiên bản index (embedding / ANN): tăng khi snapshot index thay đổi -> vô hiệu cache kết quả
+        self.index_version = self.segments.version
+        # Regex biên dịch sẵn + stopword dạng frozenset (tra O(1))
+        self.preprocessor = TextPreprocessor(load_stopwords(settings.STOPWORDS_PATH), settings.PREPROCESS_TOKENIZER)
+        self.stopwords = self.preprocessor.stopwords
 
     # ------------------ UTILS ------------------
     def preprocess_text(self, text):
-        if not text or not isinstance(text, str): return ""
-        text = text.lower()
-        text = re.sub(f"[{re.escape(string.punctuation)}]", " ", text)
-        text = re.sub(r"\s+", " ", text).strip()
-        tokens = word_tokenize(text, format="text").split()
-        return " ".join([w for w in tokens if w not in self.stopwords])
-    
+        return self.preprocessor.preprocess(text)
+
+    def preprocess_many(self, texts):
+        """preprocess_text hàng loạt cho các luồng offline / eval."""
+        return self.preprocessor.preprocess_many(texts)
+
+    @timed("preprocess")
+    def preprocess_query(self, query):
+        """preprocess_text cho query người dùng (có cache theo query đã chuẩn hóa)."""
+        return self.query_cache.get_or_compute("preprocess", query, lambda: self.preprocess_text(query))
+
+    @timed("encode")
+    def encode_query(self, key, query_str):
+        """Encode query bằng transformer `key` qua bộ gom batch dùng chung -> (1 x d), có cache."""
+        return self.query_cache.get_or_compute(
+            key, query_str, lambda: np.array(self.encoder.encode(key, self.models[key], query_str))
+        )
+
+    @timed("encode")
+    def vectorize_tfidf(self, key, query_str):
+        """Vector TF-IDF (sparse 1 x V) của query, có cache."""
+        return self.query_cache.get_or_compute(key, query_str, lambda: self.models[key].transform([query_str]))
+
+    @timed("encode")
+    def infer_doc2vec(self, key, tokens):
+        """
+        infer_vector của Doc2Vec là ngẫu nhiên -> seed RNG của model theo nội dung query
+        để cùng 1 query luôn ra cùng 1 vector (kể cả sau khi cache bị xóa / restart).
+        """
+        model = self.models[key]
+        seed = zlib.crc32(" ".join(tokens).encode("utf-8"))
+        with self._doc2vec_lock:
+            model.random = np.random.RandomState(seed)
+            return model.infer_vector(tokens, epochs=20)
+
+    # ------------------ QUERY CACHE (lưu / nạp đĩa) ------------------
+    @staticmethod
+    def _path_fingerprint(path):
+        """
+        mtime của file model. Thư mục model (transformer): mtime + kích thước từng file bên trong
+        (ghi đè trọng số / config tại chỗ không đổi mtime của thư mục).
+        """
+        if not os.path.exists(path): return None
+        if not os.path.isdir(path): return str(os.path.getmtime(path))
+        files = []
+        for root, _, names in os.walk(path):
+            for name in names:
+                file_path = os.path.join(root, name)
+                stat = os.stat(file_path)
+                files.append(f"{os.path.relpath(file_path, path)}:{stat.st_mtime}:{stat.st_size}")
+        digest = zlib.crc32("\n".join(sorted(files)).encode("utf-8"))
+        return f"{len(files)}|{digest:08x}"
+
+    def _model_fingerprints(self):
+        """Dấu vân tay file model -> bỏ vector cache cũ khi model bị thay."""
+        paths = dict(settings.MODEL_PATHS, preprocess=settings.STOPWORDS_PATH)
+        prints = {k: self._path_fingerprint(p) for k, p in paths.items()}
+        # Đổi backend suy luận / max_seq_length / file ONNX -> vector query của transformer cũng đổi
+        for key in prints:
+            if any(x in key for x in ["mpnet", "bge", "labse"]):
+                options = encoder_options(key)
+                prints[key] = f"{prints[key]}|{options['backend']}|{options['max_seq_length']}|{options['onnx_file']}"
+        # Đổi tokenizer -> chuỗi token của query cũng đổi
+        prints["preprocess"] = f"{prints['preprocess']}|{self.preprocessor.tokenizer}"
+        return prints
+
+    def load_query_cache(self):
+        if not settings.QUERY_CACHE_PATH: return
+        try:
+            n = self.query_cache.load(settings.QUERY_CACHE_PATH, self._model_fingerprints())
+            print(f"✅ Loaded Query Cache: {n} entries")
+        except Exception as e:
+            print(f"❌ Load Query Cache Error: {e}")
+
+    def save_query_cache(self):
+        if not settings.QUERY_CACHE_PATH: return
+        try:
+            self.query_cache.save(settings.QUERY_CACHE_PATH, self._model_fingerprints())
+            print(f"💾 Saved Query Cache -> {settings.QUERY_CACHE_PATH}")
+        except Exception as e:
+            print(f"❌ Save Query Cache Error: {e}")
+
     def preprocess_tokens(self, text):
         s = self.preprocess_text(text)
         return s.split() if s else []
 
-    def _safe_map_results(self, df_jobs, full_scores, top_k):
-        # Lấy index hợp lệ
-        valid_indices = [i for i in df_jobs.index if i < len(full_scores)]
-        if not valid_indices: return pd.DataFrame()
+    def _candidate_rows(self, df_jobs, n_rows, candidate_rows=None):
+        """
+        Xác định các dòng (positional row id) cần chấm điểm.
+        - candidate_rows: danh sách row id đã lọc sẵn (vd: từ cold_start_filter).
+        - Nếu không có -> lấy theo df_jobs.index (index = vị trí dòng trong ma trận).
+        Trả về None khi tập ứng viên là toàn bộ corpus (không có bộ lọc) -> quét full.
+        """
+        if candidate_rows is None:
+            idx = df_jobs.index
+            if isinstance(idx, pd.RangeIndex) and idx.start == 0 and idx.step == 1 and len(idx) == n_rows:
+                return None
+            candidate_rows = idx
+        return np.asarray(candidate_rows, dtype=np.int64)
 
-        subset_scores = full_scores[valid_indices]
-        
-        df_results = df_jobs.loc[valid_indices].copy()
-        df_results['similarity_score'] = subset_scores
-        
-        # Sắp xếp giảm dần
-        return df_results.nlargest(top_k, 'similarity_score')
+    @timed("score")
+    def _score_rows(self, vec, matrix, rows=None):
+        """
+        Cosine giữa vector query và các dòng `rows` của ma trận (dense hoặc sparse).
+        rows=None -> quét toàn bộ. Row id vượt quá kích thước ma trận nhận điểm 0.
+        """
+        inv_norms = self.row_norms.get(matrix)
+        if rows is None:
+            return cosine_scores(vec, matrix, inv_norms)
+
+        scores = np.zeros(len(rows), dtype=np.float64)
+        valid = rows < matrix.shape[0]
+        if valid.any():
+            scores[valid] = cosine_scores(vec, matrix, inv_norms, rows[valid])
+        return scores
+
+    def _jobs_df(self):
+        """
+        DataFrame mọi job (kể cả job đã xóa: row id = vị trí dòng trong ma trận),
+        None nếu DataLoader chưa được khởi tạo / chưa nạp xong dữ liệu (không tự nạp:
+        warmup load model song song với task "data", không chờ dữ liệu).
+        """
+        module = sys.modules.get("app.services.data_loader")
+        loader = getattr(module, "data_loader", None)
+        return loader.jobs if loader is not None and loader.loaded else None
+
+    def _expected_rows(self):
+        """Số job trong dữ liệu đang phục vụ (None nếu chưa có dữ liệu -> bỏ qua kiểm tra số dòng)."""
+        df = self._jobs_df()
+        return len(df) if df is not None else None
+
+    def _register_matrix(self, emb_key, matrix, inv_norms=None):
+        """Kiểm tra shape / dtype với số job rồi tính sẵn norm dòng (1 lần / process)."""
+        validate_matrix(emb_key, matrix, self._expected_rows())
+        self.embeddings[emb_key] = matrix
+        if inv_norms is not None:
+            self.row_norms.put(matrix, inv_norms)
+        else:
+            self.row_norms.get(matrix)
+
+    # ------------------ MODEL REGISTRY ------------------
+    def _matrix_keys(self, key):
+        """Key trong self.embeddings của model: TF-IDF -> '{key}_matrix', còn lại '{key}_{field}'."""
+        paths = settings.EMBEDDING_PATHS.get(key)
+        if isinstance(paths, dict):
+            return [f"{key}_{field}" for field in paths]
+        return [f"{key}_matrix"]
+
+    def _model_nbytes(self, key):
+        """RAM của model + ma trận / bản nén / ANN / inverted index đi kèm."""
+        total = estimate_nbytes(self.models.get(key))
+        for emb_key in self._matrix_keys(key):
+            for store in (self.embeddings, self.quantized, self.ann_indexes):
+                total += estimate_nbytes(store.get(emb_key))
+        for (index_key, _), index in list(self.sparse_indexes.items()):
+            if index_key == key: total += estimate_nbytes(index)
+        return total
+
+    def _ensure_model(self, key, load):
+        """
+        Load model qua registry: request đồng thời cùng key chỉ load 1 lần, xong thì kiểm tra ngân sách RAM.
+        -> True nếu model đã / vừa load được.
+        """
+        def run():
+            with stage("load"):
+                load()
+            return self._model_nbytes(key) if key in self.models else None
+        # Khóa đọc trước lock load của registry: model load xong theo đúng 1 snapshot
+        with self.segments.lock.reading():
+            return self.registry.ensure(key, run)
+
+    def _unload_model(self, key):
+        """Callback của registry khi evict: xóa model và mọi thứ đi kèm (ma trận mmap tự đóng khi hết tham chiếu)."""
+        self.models.pop(key, None)
+        for emb_key in self._matrix_keys(key):
+            self.embeddings.pop(emb_key, None)
+            self.quantized.pop(emb_key, None)
+            self.ann_indexes.pop(emb_key, None)
+        for index_key in [k for k in list(self.sparse_indexes) if k[0] == key]:
+            self.sparse_indexes.pop(index_key, None)
+
+    def model_stats(self):
+        return self.registry.stats()
+
+    def load_embeddings(self, key):
+        """Load ma trận embedding (.npy) của model: memory-map read-only, các worker dùng chung page cache."""
+        kind = settings.EMBEDDING_QUANTIZATION
+        if kind and kind not in QUANT_KINDS:
+            print(f"⚠️ EMBEDDING_QUANTIZATION={kind} không hỗ trợ (chỉ {', '.join(QUANT_KINDS)}) -> quét bản gốc")
+            kind = None
+        for field, path in (settings.EMBEDDING_PATHS.get(key) or {}).items():
+            if not path: continue
+            emb_key = f"{key}_{field}"
+            if not self.segments.has_matrix(emb_key, path):
+                print(f"⚠️ {emb_key}: chưa có ma trận {path} (dựng: python -m scripts.build_embeddings)")
+                continue
+            matrix = self.segments.load_matrix(emb_key, path, False, settings.EMBEDDING_MMAP)
+
+            # Bản nén (nếu đã dựng) -> quét trên bản nén, bản gốc chỉ đọc các dòng trong shortlist
+            quantized = QuantizedMatrix.load(path, kind, settings.EMBEDDING_MMAP) if kind else None
+            if quantized is not None and quantized.shape != matrix.shape:
+                print(f"⚠️ Bản {kind} của {emb_key} lệch shape với embedding -> bỏ qua")
+                quantized = None
+
+            self._register_matrix(emb_key, matrix, quantized.inv_norms if quantized is not None else None)
+            if quantized is not None:
+                self.quantized[emb_key] = quantized
+                print(f"✅ Loaded {kind} {emb_key} ({quantized.nbytes / 1024 / 1024:.0f} MB)")
+
+    @timed("topk")
+    def _map_results(self, df_jobs, rows, scores, top_k):
+        """
+        Map điểm (đã tính theo `rows`) về DataFrame kết quả top_k.
+        Chỉ copy các dòng lọt top_k thay vì toàn bộ df_jobs.
+        """
+        if rows is None:
+            rows = np.arange(len(scores))
+        if len(rows) == 0: return pd.DataFrame()
+
+        top = top_k_indices(scores, top_k)
+        df_results = df_jobs.loc[rows[top]].copy()
+        df_results['similarity_score'] = scores[top]
+        return df_results
+
+    def _rank_candidates(self, vec, matrix, df_jobs, top_k, candidate_rows=None, quantized=None):
+        # Chỉ chấm điểm các row id hợp lệ (nằm trong ma trận) của tập ứng viên
+        rows = self._candidate_rows(df_jobs, matrix.shape[0], candidate_rows)
+        if rows is not None:
+            rows = rows[rows < matrix.shape[0]]
+
+        # Có bản nén: quét xấp xỉ -> shortlist -> tính lại cosine chính xác trên dòng gốc
+        if quantized is not None:
+            with stage("score"):
+                approx = quantized.scores(vec, rows)
+                shortlist = np.sort(top_k_indices(approx, max(top_k, settings.QUANT_SHORTLIST)))
+            rows = shortlist if rows is None else rows[shortlist]
+
+        scores = self._score_rows(vec, matrix, rows)
+        return self._map_results(df_jobs, rows, scores, top_k)
+
+    @timed("score")
+    def _ann_search(self, emb_key, vec, k, rows=None):
+        """
+        Top-k bằng ANN index (nếu đã bật & đã load). rows: allow-list khi có bộ lọc.
+        Trả về None -> caller quét chính xác (tập lọc nhỏ thì quét chính xác rẻ hơn).
+        """
+        index = self.ann_indexes.get(emb_key)
+        if index is None: return None
+        if rows is not None and len(rows) < settings.ANN_MIN_CANDIDATES: return None
+        return index.search(vec, k, rows)
 
     def normalize_scores(self, scores):
         """
@@ -70,83 +353,139 @@ class SearchEngine:
     # =========================================================
     # 1. ENSEMBLE CORE (MÔ HÌNH CHÍNH)
     # =========================================================
-    def search_ensemble(self, query, df_jobs, search_field="overall", top_k=20):
+    def search_ensemble(self, query, df_jobs, search_field="overall", top_k=20, candidate_rows=None):
         """
         Hàm Search Lai ghép (Weighted Hybrid):
         - 70% BGE-M3 (Semantic)
         - 30% TF-IDF (Keyword)
+        Chỉ chấm điểm các dòng ứng viên (candidate_rows hoặc df_jobs.index),
+        chỉ quét toàn bộ ma trận khi không có bộ lọc.
         """
-        query_str = self.preprocess_text(query)
-        indices = df_jobs.index
+        query_str = self.preprocess_query(query)
+        if candidate_rows is not None:
+            rows_out = np.asarray(candidate_rows, dtype=np.int64)
+        else:
+            rows_out = df_jobs.index.to_numpy()
+        if len(rows_out) == 0: return pd.DataFrame()
 
+        bge_key = "bge_m3_basic" if search_field == "title" else "bge_m3_upgrade"
+        emb_key = f"{bge_key}_{search_field}"
+        vec_bge = None
+
+        # --- ANN (tùy chọn): thu hẹp ứng viên về pool gần nhất theo BGE rồi mới fusion ---
+        if emb_key in self.ann_indexes:
+            try:
+                vec_bge = self.encode_query(bge_key, query_str)
+                matrix = self.embeddings[emb_key]
+                ann = self._ann_search(emb_key, vec_bge, settings.ANN_ENSEMBLE_POOL,
+                                       self._candidate_rows(df_jobs, matrix.shape[0], candidate_rows))
+                if ann is not None:
+                    rows_out = candidate_rows = np.sort(ann[0])
+            except Exception as e:
+                print(f"⚠️ Ensemble ANN Error: {e}")
 
         # --- A. Tính điểm TF-IDF (30%) ---
         try:
             tfidf_key = "tfidf_basic" if search_field == "title" else "tfidf_upgrade"
             self.load_tfidf(tfidf_key)
             
-            vec_tfidf = self.models[tfidf_key].transform([query_str])
-            # Tính trên toàn bộ DB
-            raw_tfidf = cosine_similarity(vec_tfidf, self.embeddings[f"{tfidf_key}_matrix"]).flatten()
-            
-            # Slice theo tập candidate
-            if max(indices) < len(raw_tfidf):
-                sub_tfidf = raw_tfidf[indices]
-            else:
-                sub_tfidf = np.zeros(len(indices))
+            vec_tfidf = self.vectorize_tfidf(tfidf_key, query_str)
+            matrix = self.embeddings[f"{tfidf_key}_matrix"]
+            # Inverted index: chỉ duyệt posting list của các term trong query
+            rows = self._candidate_rows(df_jobs, matrix.shape[0], candidate_rows)
+            sub_tfidf = self._sparse_scores(tfidf_key, vec_tfidf, rows)
         except Exception as e:
             print(f"⚠️ Ensemble TF-IDF Error: {e}")
-            sub_tfidf = np.zeros(len(indices))
+            sub_tfidf = np.zeros(len(rows_out))
 
         # --- B. Tính điểm BGE-M3 (70%) ---
         try:
-            bge_key = "bge_m3_basic" if search_field == "title" else "bge_m3_upgrade"
             self.load_transformer(bge_key)
             
-            vec_bge = self.models[bge_key].encode([query_str], normalize_embeddings=True)
-            
-            # Chọn embedding matrix
-            emb_key = f"{bge_key}_{search_field}"
-
-        
-            # print(f"🔍 DEBUG ENSEMBLE:")
-            # print(f"   - Mode: {search_field}")
-            # print(f"   - Cần tìm key: '{emb_key}'")
-            # print(f"   - Các key hiện có trong RAM: {list(self.embeddings.keys())}")
-            
-            # if emb_key not in self.embeddings:
-            #     print(f"   ❌ LỖI: Không tìm thấy ma trận vector '{emb_key}'!")
-            # else:
-            #     print(f"   ✅ Đã tìm thấy ma trận vector. Shape: {self.embeddings[emb_key].shape}")
+            if vec_bge is None:
+                vec_bge = self.encode_query(bge_key, query_str)
             
             # Tính toán
             if emb_key in self.embeddings and self.embeddings[emb_key] is not None:
-                raw_bge = cosine_similarity(vec_bge, self.embeddings[emb_key]).flatten()
-                if max(indices) < len(raw_bge):
-                    sub_bge = raw_bge[indices]
-                else:
-                    sub_bge = np.zeros(len(indices))
+                matrix = self.embeddings[emb_key]
+                rows = self._candidate_rows(df_jobs, matrix.shape[0], candidate_rows)
+                sub_bge = self._score_rows(vec_bge, matrix, rows)
             else:
-                sub_bge = np.zeros(len(indices))
+                sub_bge = np.zeros(len(rows_out))
 
-            print(len(indices), max(indices), len(vec_bge), len(raw_bge))
-            
         except Exception as e:
             print(f"⚠️ Ensemble BGE Error: {e}")
-            sub_bge = np.zeros(len(indices))
+            sub_bge = np.zeros(len(rows_out))
 
         # --- C. Tổng hợp (Weighted Sum) ---
-        # Chuẩn hóa về [0, 1] trước khi cộng
-        norm_tfidf = self.normalize_scores(sub_tfidf)
-        norm_bge = self.normalize_scores(sub_bge)
+        with stage("fusion"):
+            # Chuẩn hóa về [0, 1] trước khi cộng
+            norm_tfidf = self.normalize_scores(sub_tfidf)
+            norm_bge = self.normalize_scores(sub_bge)
 
-        # Công thức Ensemble: 0.7 * Semantic + 0.3 * Keyword
-        final_scores = 0.7 * norm_bge + 0.3 * norm_tfidf
+            # Công thức Ensemble: 0.7 * Semantic + 0.3 * Keyword
+            final_scores = 0.7 * norm_bge + 0.3 * norm_tfidf
 
-        # Map kết quả
-        df_results = df_jobs.copy()
-        df_results['similarity_score'] = final_scores
-        return df_results.nlargest(top_k, 'similarity_score')
+        # Map kết quả (chỉ copy top_k dòng)
+        return self._map_results(df_jobs, rows_out, final_scores, top_k)
+
+    def search_ensemble_fast(self, query, df_jobs, search_field="overall", top_k=20, candidate_rows=None, pool_size=None):
+        """
+        Ensemble 2 tầng (retrieve -> rerank):
+        1. Pool ứng viên = top pool_size theo TF-IDF (inverted index) ∪ top pool_size theo ANN BGE-M3 (nếu có)
+        2. Fusion 0.7 BGE-M3 + 0.3 TF-IDF (chuẩn hóa min-max) chỉ trên pool
+        Không quét dense toàn bộ corpus. Pool rỗng (query không khớp term nào, không có ANN)
+        hoặc pool >= tập ứng viên hoặc TF-IDF không load được -> chạy ensemble đầy đủ.
+        """
+        pool_size = pool_size or settings.ENSEMBLE_FAST_POOL
+        query_str = self.preprocess_query(query)
+        tfidf_key = "tfidf_basic" if search_field == "title" else "tfidf_upgrade"
+        bge_key = "bge_m3_basic" if search_field == "title" else "bge_m3_upgrade"
+        emb_key = f"{bge_key}_{search_field}"
+
+        try:
+            self.load_tfidf(tfidf_key)
+            matrix = self.embeddings[f"{tfidf_key}_matrix"]
+        except Exception as e:
+            print(f"⚠️ Ensemble Fast TF-IDF Error: {e}")
+            return self.search_ensemble(query, df_jobs, search_field, top_k, candidate_rows)
+        rows = self._candidate_rows(df_jobs, matrix.shape[0], candidate_rows)
+        if rows is not None:
+            rows = np.sort(rows[rows < matrix.shape[0]])
+        n_candidates = matrix.shape[0] if rows is None else len(rows)
+        if pool_size >= n_candidates:
+            return self.search_ensemble(query, df_jobs, search_field, top_k, candidate_rows)
+
+        vec_tfidf = self.vectorize_tfidf(tfidf_key, query_str)
+        with stage("score"):
+            pools = [self.sparse_index(tfidf_key).top_k(vec_tfidf, pool_size, self._row_mask(rows, matrix.shape[0]))[0]]
+
+        vec_bge = None
+        if emb_key in self.ann_indexes:
+            try:
+                vec_bge = self.encode_query(bge_key, query_str)
+                ann = self._ann_search(emb_key, vec_bge, pool_size, rows)
+                if ann is not None: pools.append(np.asarray(ann[0], dtype=np.int64))
+            except Exception as e:
+                print(f"⚠️ Ensemble Fast ANN Error: {e}")
+
+        pool = np.unique(np.concatenate(pools))
+        if len(pool) == 0:
+            return self.search_ensemble(query, df_jobs, search_field, top_k, candidate_rows)
+
+        sub_tfidf = self._sparse_scores(tfidf_key, vec_tfidf, pool)
+        try:
+            self.load_transformer(bge_key)
+            if vec_bge is None:
+                vec_bge = self.encode_query(bge_key, query_str)
+            sub_bge = self._score_rows(vec_bge, self.embeddings[emb_key], pool)
+        except Exception as e:
+            print(f"⚠️ Ensemble Fast BGE Error: {e}")
+            sub_bge = np.zeros(len(pool))
+
+        with stage("fusion"):
+            final_scores = 0.7 * self.normalize_scores(sub_bge) + 0.3 * self.normalize_scores(sub_tfidf)
+        return self._map_results(df_jobs, pool, final_scores, top_k)
 
     # =========================================================
     # 2. RECOMMENDATION FUNCTIONS (Dùng Ensemble)
@@ -169,14 +508,125 @@ class SearchEngine:
             
         return df_results.head(top_k)
 
+    def _vector_ensemble_scores(self, vec_tfidf, vec_bge, df_full):
+        """
+        Điểm Ensemble (0.7 BGE-M3 + 0.3 TF-IDF, overall) từ vector query có sẵn
+        (không tokenize, không chạy model). Trả về mảng điểm theo thứ tự df_full.
+        """
+        n_jobs = len(df_full)
+
+        # Model không load được (thiếu / hỏng artifact) -> thành phần đó 0 điểm như search_ensemble
+        tfidf_matrix = self._loaded_matrix(self.load_tfidf, "tfidf_upgrade", "tfidf_upgrade_matrix")
+        bge_matrix = self._loaded_matrix(self.load_transformer, "bge_m3_upgrade", "bge_m3_upgrade_overall")
+
+        sub = {}
+        for name, vec, matrix in (("tfidf", vec_tfidf, tfidf_matrix), ("bge", vec_bge, bge_matrix)):
+            if matrix is None or vec is None:
+                sub[name] = np.zeros(n_jobs)
+                continue
+            rows = self._candidate_rows(df_full, matrix.shape[0])
+            sub[name] = self._score_rows(vec, matrix, rows)
+
+        with stage("fusion"):
+            return 0.7 * self.normalize_scores(sub["bge"]) + 0.3 * self.normalize_scores(sub["tfidf"])
+
+    def _loaded_matrix(self, load, key, emb_key):
+        """Ma trận emb_key của model `key` (load nếu cần), None nếu model không load được."""
+        try:
+            if not load(key): return None
+        except Exception as e:
+            print(f"⚠️ Load {key} Error: {e}")
+            return None
+        return self.embeddings.get(emb_key)
+
+    def _stored_vectors(self, row):
+        """Vector TF-IDF + BGE-M3 (overall) đã lưu của 1 job, None nếu thiếu / model không load được."""
+        vectors = []
+        for matrix in (self._loaded_matrix(self.load_tfidf, "tfidf_upgrade", "tfidf_upgrade_matrix"),
+                       self._loaded_matrix(self.load_transformer, "bge_m3_upgrade", "bge_m3_upgrade_overall")):
+            vectors.append(matrix[row:row + 1] if matrix is not None and row < matrix.shape[0] else None)
+        return vectors
+
+    def item_scores(self, row, df_full):
+        """Điểm Ensemble của 1 job so với toàn bộ corpus, dùng chính vector đã lưu của job."""
+        vec_tfidf, vec_bge = self._stored_vectors(row)
+        return self._vector_ensemble_scores(vec_tfidf, vec_bge, df_full)
+
+    def load_similar_table(self):
+        """Load bảng top-N job tương tự dựng offline (nếu có)."""
+        if self.similar_table is not None: return
+        try:
+            with np.load(settings.SIMILAR_JOBS_PATH) as data:
+                self.similar_table = {"ids": data["ids"], "scores": data["scores"]}
+            print(f"✅ Loaded Similar Jobs table {self.similar_table['ids'].shape}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"❌ Load Similar Jobs Error: {e}")
+
+    @holds_models
+    def get_similar_jobs(self, job_id, df_full, top_k=10):
+        """
+        Dùng cho: Gợi ý công việc tương tự (Item-to-Item) - không cần model inference.
+        1. Có bảng láng giềng dựng sẵn (khớp đúng tập job, chưa thêm / xóa job) -> tra trực tiếp.
+        2. Không có -> tính từ vector BGE-M3 + dòng TF-IDF đã lưu của job.
+        """
+        table = self.similar_table
+        if (table is not None and self._candidate_rows(df_full, table["ids"].shape[0]) is None
+                and top_k <= table["ids"].shape[1]):
+            ids = table["ids"][job_id, :top_k]
+            df_results = df_full.loc[ids].copy()
+            df_results['similarity_score'] = table["scores"][job_id, :top_k].astype(np.float64)
+            return df_results
+
+        scores = self.item_scores(job_id, df_full)
+        rows_out = df_full.index.to_numpy()
+        keep = rows_out != job_id
+        return self._map_results(df_full, rows_out[keep], scores[keep], top_k)
+
+    def build_user_profile(self, valid_ids):
+        """
+        Profile theo lịch sử xem. Nếu lịch sử = lịch sử đã gặp + vài job mới
+        -> dùng lại profile của tiền tố (cache) và chỉ cộng thêm các job mới (O(d) / job).
+        """
+        viewed = tuple(valid_ids)
+        profile = self.user_profiles.get(viewed)
+        if profile is not None: return profile
+
+        # Tìm tiền tố dài nhất đã có trong cache
+        base = None
+        for n in range(len(viewed) - 1, 0, -1):
+            base = self.user_profiles.get(viewed[:n])
+            if base is not None: break
+        profile = base.copy() if base is not None else UserProfile(settings.RECOMMEND_HISTORY_DECAY)
+
+        for job_id in viewed[len(profile.viewed):]:
+            vec_tfidf, vec_bge = self._stored_vectors(job_id)
+            if vec_tfidf is None or vec_bge is None: return None
+            profile.add_view(job_id, vec_bge, vec_tfidf)
+
+        self.user_profiles.put(profile)
+        return profile
+
+    @holds_models
     def get_user_recommendation(self, viewed_ids, df_full, top_k=20):
         """
         Dùng cho: Gợi ý trang chủ (User Personalization)
-        Dựa trên lịch sử xem -> Tạo Query -> Ensemble Search
+        - RECOMMEND_MODE='profile': vector user từ embedding đã lưu -> Ensemble (không chạy model)
+        - RECOMMEND_MODE='query': Lịch sử xem -> Tạo Query -> Ensemble Search
         """
         valid_ids = [i for i in viewed_ids if i in df_full.index]
         if not valid_ids: return pd.DataFrame()
 
+        if settings.RECOMMEND_MODE == "profile":
+            profile = self.build_user_profile(valid_ids)
+            if profile is not None:
+                vec_bge, vec_tfidf = profile.vectors()
+                scores = self._vector_ensemble_scores(vec_tfidf, vec_bge, df_full)
+                rows_out = df_full.index.to_numpy()
+                keep = ~np.isin(rows_out, valid_ids)
+                return self._map_results(df_full, rows_out[keep], scores[keep], top_k)
+
         # Lấy 5 job gần nhất để tạo context (tránh nhiễu nếu lấy quá nhiều)
         recent_jobs = df_full.loc[valid_ids].tail(5)
         
@@ -201,39 +651,114 @@ class SearchEngine:
     
     # --- TF-IDF ---
     def load_tfidf(self, key):
+        return self._ensure_model(key, lambda: self._load_tfidf(key))
+
+    def _load_tfidf(self, key):
         if key in self.models: return
         print(f"🔄 TF-IDF: Loading {key}...")
-        self.models[key] = joblib.load(settings.MODEL_PATHS[key])
-        self.embeddings[f"{key}_matrix"] = joblib.load(settings.EMBEDDING_PATHS[key])
+        model = joblib.load(settings.MODEL_PATHS[key])
+        matrix = self.segments.load_matrix(f"{key}_matrix", settings.EMBEDDING_PATHS[key], True, settings.EMBEDDING_MMAP)
+        self._register_matrix(f"{key}_matrix", matrix)
+        self._load_sparse_index(key, "cosine", lambda: InvertedIndex.from_tfidf(matrix), matrix.shape[0])
+        if key == settings.TOKENIZER_VOCAB_KEY and self.preprocessor.tokenizer == "longest_match":
+            self.preprocessor.set_vocabulary(model.vocabulary_)
+            self.query_cache.invalidate("preprocess")
+        self.models[key] = model
+
+    def _load_sparse_index(self, key, scoring, build, n_rows):
+        """Inverted index đã dựng sẵn (python -m scripts.build_inverted_index) nếu khớp số dòng, không thì dựng lúc load."""
+        index = InvertedIndex.load(settings.EMBEDDING_PATHS[key], scoring, settings.EMBEDDING_MMAP)
+        if index is not None and index.n_docs != n_rows:
+            print(f"⚠️ Inverted index {key} ({scoring}) lệch số dòng với ma trận -> dựng lại")
+            index = None
+        self.sparse_indexes[(key, scoring)] = index if index is not None else build()
+        return self.sparse_indexes[(key, scoring)]
+
+    def sparse_index(self, key, scoring="cosine"):
+        """Inverted index của TF-IDF `key`. BM25 dựng lần đầu được dùng (đếm lại tf từ cột text)."""
+        index = self.sparse_indexes.get((key, scoring))
+        if index is not None: return index
+        if scoring != "bm25":
+            raise ValueError(f"Kiểu chấm điểm không hỗ trợ: {scoring}")
+
+        n_rows = self.embeddings[f"{key}_matrix"].shape[0]
+        def build():
+            df = self._jobs_df()
+            if df is None:
+                raise ValueError("Cần dữ liệu job (DataLoader) để dựng BM25")
+            texts = df[settings.TFIDF_TEXT_COLUMNS[key]].fillna("").astype(str)
+            return InvertedIndex.from_counts(term_counts(self.models[key], texts), settings.BM25_K1, settings.BM25_B)
+        index = self._load_sparse_index(key, scoring, build, n_rows)
+        self.registry.resize(key, self._model_nbytes(key))
+        return index
+
+    def _row_mask(self, rows, n_rows):
+        """Row id -> mask bool (bộ lọc cho inverted index), None khi không lọc."""
+        if rows is None: return None
+        mask = np.zeros(n_rows, dtype=bool)
+        mask[rows[rows < n_rows]] = True
+        return mask
+
+    @timed("score")
+    def _sparse_scores(self, key, vec, rows=None):
+        """Cosine TF-IDF theo thứ tự `rows` (None -> toàn bộ) qua inverted index. Job không chứa term nào = 0."""
+        n_rows = self.embeddings[f"{key}_matrix"].shape[0]
+        docs, scores = self.sparse_index(key).score_all(vec)
+        full = np.zeros(n_rows)
+        full[docs] = scores
+        if rows is None: return full
+        out = np.zeros(len(rows))
+        valid = rows < n_rows
+        out[valid] = full[rows[valid]]
+        return out
 
-    def search_tfidf(self, query, df_jobs, search_field, top_k):
+    def search_tfidf(self, query, df_jobs, search_field, top_k, candidate_rows=None, scoring=None):
+        """
+        Top-k TF-IDF (cosine) hoặc BM25 qua inverted index (TAAT + MaxScore).
+        Không đủ top_k job khớp term -> bù các job điểm 0 theo thứ tự dòng (như quét toàn bộ).
+        """
         key = "tfidf_basic" if search_field == "title" else "tfidf_upgrade"
         self.load_tfidf(key)
-        query_str = self.preprocess_text(query)
-        vec = self.models[key].transform([query_str])
-        scores = cosine_similarity(vec, self.embeddings[f"{key}_matrix"]).flatten()
-        return self._safe_map_results(df_jobs, scores, top_k)
+        query_str = self.preprocess_query(query)
+        vec = self.vectorize_tfidf(key, query_str)
+
+        n_rows = self.embeddings[f"{key}_matrix"].shape[0]
+        rows = self._candidate_rows(df_jobs, n_rows, candidate_rows)
+        if rows is not None:
+            rows = rows[rows < n_rows]
+        with stage("score"):
+            docs, scores = self.sparse_index(key, scoring or settings.SPARSE_SCORING).top_k(
+                vec, top_k, self._row_mask(rows, n_rows)
+            )
+
+        if len(docs) < top_k:
+            pool = np.arange(n_rows) if rows is None else rows
+            pad = pool[~np.isin(pool, docs)][:top_k - len(docs)]
+            docs = np.concatenate([docs, pad])
+            scores = np.concatenate([scores, np.zeros(len(pad))])
+        return self._map_results(df_jobs, docs, scores, top_k)
 
     # --- WORD2VEC ---
     def load_w2v(self, key):
+        return self._ensure_model(key, lambda: self._load_w2v(key))
+
+    def _load_w2v(self, key):
         if key in self.models: return
         if key not in settings.MODEL_PATHS: return
         print(f"🔄 Word2Vec: Loading {key}...")
         try:
-            self.models[key] = KeyedVectors.load(settings.MODEL_PATHS[key])
-            emb_conf = settings.EMBEDDING_PATHS.get(key, {})
-            if emb_conf:
-                if emb_conf.get("title"): self.embeddings[f"{key}_title"] = np.load(emb_conf["title"])
-                if emb_conf.get("overall"): self.embeddings[f"{key}_overall"] = np.load(emb_conf["overall"])
+            self.models[key] = lazy_import("gensim.models").KeyedVectors.load(settings.MODEL_PATHS[key])
+            self.load_embeddings(key)
             print(f"✅ Loaded {key}")
         except Exception as e:
             print(f"❌ Load W2V Error: {e}")
 
+    @timed("encode")
     def _get_avg_vector(self, text, model):
         words = self.preprocess_tokens(text)
         valid = [w for w in words if w in model]
 
-        if len(text) < 100: 
+        if settings.SEARCH_DEBUG and len(text) < 100:
             print(f"🔎 Query: '{text}'")
             print(f"   Tokens gốc: {words}")
             print(f"   Valid W2V:  {valid}") # <--- QUAN TRỌNG: Xem danh sách này có rỗng hoặc toàn từ rác không?
@@ -241,7 +766,7 @@ class SearchEngine:
         if not valid: return np.zeros(model.vector_size)
         return np.mean([model[w] for w in valid], axis=0)
 
-    def search_w2v(self, query, df_jobs, model_name, search_field, top_k):
+    def search_w2v(self, query, df_jobs, model_name, search_field, top_k, candidate_rows=None):
         is_sg = "_sg" in model_name
         base = "w2v_average"
         suffix = "basic" if search_field == "title" else "upgrade"
@@ -250,31 +775,33 @@ class SearchEngine:
         self.load_w2v(target_key)
         if target_key not in self.models: return pd.DataFrame()
 
-        query_vec = self._get_avg_vector(query, self.models[target_key])
+        query_vec = self.query_cache.get_or_compute(
+            target_key, query, lambda: self._get_avg_vector(query, self.models[target_key])
+        )
         emb_key = f"{target_key}_{search_field}"
         if emb_key not in self.embeddings: # Fallback
             emb_key = f"{target_key}_title" if search_field == "overall" else f"{target_key}_overall"
             if emb_key not in self.embeddings: return pd.DataFrame()
 
-        scores = cosine_similarity(query_vec.reshape(1, -1), self.embeddings[emb_key]).flatten()
-        return self._safe_map_results(df_jobs, scores, top_k)
+        return self._rank_candidates(query_vec.reshape(1, -1), self.embeddings[emb_key], df_jobs, top_k,
+                                    candidate_rows, self.quantized.get(emb_key))
 
     # --- DOC2VEC ---
     def load_doc2vec(self, key):
+        return self._ensure_model(key, lambda: self._load_doc2vec(key))
+
+    def _load_doc2vec(self, key):
         if key in self.models: return
         if key not in settings.MODEL_PATHS: return
         print(f"🔄 Doc2Vec: Loading {key}...")
         try:
-            self.models[key] = Doc2Vec.load(settings.MODEL_PATHS[key])
-            emb_conf = settings.EMBEDDING_PATHS.get(key, {})
-            if emb_conf:
-                if emb_conf.get("title"): self.embeddings[f"{key}_title"] = np.load(emb_conf["title"])
-                if emb_conf.get("overall"): self.embeddings[f"{key}_overall"] = np.load(emb_conf["overall"])
+            self.models[key] = lazy_import("gensim.models").Doc2Vec.load(settings.MODEL_PATHS[key])
+            self.load_embeddings(key)
             print(f"✅ Loaded {key}")
         except Exception as e:
             print(f"❌ Load Doc2Vec Error: {e}")
 
-    def search_doc2vec(self, query, df_jobs, model_name, search_field, top_k):
+    def search_doc2vec(self, query, df_jobs, model_name, search_field, top_k, candidate_rows=None):
         is_dbow = "dbow" in model_name
         base = "w2v_doc2vec"
         suffix = "basic" if search_field == "title" else "upgrade"
@@ -283,100 +810,450 @@ class SearchEngine:
         self.load_doc2vec(target_key)
         if target_key not in self.models: return pd.DataFrame()
 
-        tokens = self.preprocess_tokens(query)
-        query_vec = self.models[target_key].infer_vector(tokens, epochs=20)
+        query_str = self.preprocess_query(query)
+        tokens = query_str.split() if query_str else []
+        query_vec = self.query_cache.get_or_compute(
+            target_key, query_str, lambda: self.infer_doc2vec(target_key, tokens)
+        )
         
         emb_key = f"{target_key}_{search_field}"
         if emb_key not in self.embeddings: # Fallback
             emb_key = f"{target_key}_title" if search_field == "overall" else f"{target_key}_overall"
             if emb_key not in self.embeddings: return pd.DataFrame()
 
-        scores = cosine_similarity(query_vec.reshape(1, -1), self.embeddings[emb_key]).flatten()
-        return self._safe_map_results(df_jobs, scores, top_k)
+        return self._rank_candidates(query_vec.reshape(1, -1), self.embeddings[emb_key], df_jobs, top_k,
+                                    candidate_rows, self.quantized.get(emb_key))
 
     # --- TRANSFORMER ---
     def load_transformer(self, key):
+        return self._ensure_model(key, lambda: self._load_transformer(key))
+
+    def _load_transformer(self, key):
         if key in self.models: return
         print(f"🔄 Transformer: Loading {key}...")
         try:
-            self.models[key] = SentenceTransformer(
-                settings.MODEL_PATHS[key], 
-                model_kwargs={"low_cpu_mem_usage": False},
-                device="cpu" 
-            )
-            self.models[key].eval()  
-            emb = settings.EMBEDDING_PATHS.get(key)
-            if emb:
-                if emb.get("title"): self.embeddings[f"{key}_title"] = np.load(emb["title"])
-                if emb.get("overall"): self.embeddings[f"{key}_overall"] = np.load(emb["overall"])
+            options = encoder_options(key)
+            self.models[key] = load_encoder(settings.MODEL_PATHS[key], options, lazy_import)
+            if options["backend"] != "torch" or options["max_seq_length"]:
+                print(f"   {key}: backend {options['backend']}, max_seq_length {self.models[key].max_seq_length}")
+            self.load_embeddings(key)
+            if settings.ANN_ENABLED: self.load_ann(key)
             print(f"✅ Loaded {key}")
         except Exception as e:
             print(f"❌ Load Transformer Error: {e}")
 
-    def search_transformer(self, query, df_jobs, model_name, search_field, top_k):
+    def load_ann(self, key):
+        """Load ANN index (.hnsw cạnh file .npy) cho các ma trận embedding của model."""
+        for field, path in (settings.EMBEDDING_PATHS.get(key) or {}).items():
+            emb_key = f"{key}_{field}"
+            if not path or emb_key in self.ann_indexes: continue
+            index = AnnIndex.load(ann_index_path(path), settings.ANN_EF_SEARCH)
+            if index is None: continue
+            if index.n_rows != self.embeddings[emb_key].shape[0]:
+                print(f"⚠️ ANN index {emb_key} lệch số dòng với embedding -> bỏ qua")
+                continue
+            self.ann_indexes[emb_key] = index
+            print(f"✅ Loaded ANN {emb_key} (ef={index.meta['ef_search']})")
+
+    @staticmethod
+    def _transformer_key(model_name, search_field):
         suffix = "basic" if search_field == "title" else "upgrade"
         family = "mpnet"
         if "bge" in model_name: family = "bge_m3"
         elif "labse" in model_name: family = "labse"
-        target_key = f"{family}_{suffix}"
+        return f"{family}_{suffix}"
+
+    def _embedding_key(self, target_key, search_field):
+        """Ma trận embedding theo search_field, không có thì dùng field còn lại (None nếu không có cả 2)."""
+        emb_key = f"{target_key}_{search_field}"
+        if emb_key not in self.embeddings: # Fallback
+            emb_key = f"{target_key}_title" if search_field == "overall" else f"{target_key}_overall"
+            if emb_key not in self.embeddings: return None
+        return emb_key
+
+    def search_transformer(self, query, df_jobs, model_name, search_field, top_k, candidate_rows=None):
+        target_key = self._transformer_key(model_name, search_field)
 
         self.load_transformer(target_key)
         if target_key not in self.models: return pd.DataFrame()
 
-        query_str = self.preprocess_text(query)
-        vec = self.models[target_key].encode([query_str], normalize_embeddings=True)
+        query_str = self.preprocess_query(query)
+        vec = self.encode_query(target_key, query_str)
         
-        emb_key = f"{target_key}_{search_field}"
-        if emb_key not in self.embeddings: # Fallback
-            emb_key = f"{target_key}_title" if search_field == "overall" else f"{target_key}_overall"
-            if emb_key not in self.embeddings: return pd.DataFrame()
+        emb_key = self._embedding_key(target_key, search_field)
+        if emb_key is None: return pd.DataFrame()
+
+        # ANN (nếu có) -> top_k gần đúng, không quét toàn bộ ma trận
+        if emb_key in self.ann_indexes:
+            matrix = self.embeddings[emb_key]
+            rows = self._candidate_rows(df_jobs, matrix.shape[0], candidate_rows)
+            ann = self._ann_search(emb_key, vec, top_k, rows)
+            if ann is not None:
+                return self._map_results(df_jobs, ann[0], ann[1], top_k)
 
-        scores = cosine_similarity(vec, self.embeddings[emb_key]).flatten()
-        return self._safe_map_results(df_jobs, scores, top_k)
+        return self._rank_candidates(vec, self.embeddings[emb_key], df_jobs, top_k, candidate_rows,
+                                    self.quantized.get(emb_key))
 
     # =========================================================
     # MAIN DISPATCHER
     # =========================================================
-    def search(self, query, df_jobs, model_name="ensemble", search_field="title", top_k=20):
+    @holds_models
+    def search(self, query, df_jobs, model_name="ensemble", search_field="title", top_k=20, candidate_rows=None,
+               pool_size=None):
         """
         Dispatcher trung tâm:
         - Nếu model_name='ensemble' -> Gọi hàm Ensemble.
+        - Nếu model_name='ensemble_fast' -> Ensemble 2 tầng trên pool pool_size ứng viên.
         - Nếu khác -> Gọi các hàm Single Model.
+        candidate_rows: row id (vị trí dòng) đã lọc -> chỉ chấm điểm các dòng này.
         """
         # 1. Ensemble (Mô hình chính)
         if model_name == "ensemble":
-            return self.search_ensemble(query, df_jobs, search_field, top_k)
+            return self.search_ensemble(query, df_jobs, search_field, top_k, candidate_rows)
+
+        elif model_name == "ensemble_fast":
+            return self.search_ensemble_fast(query, df_jobs, search_field, top_k, candidate_rows, pool_size)
 
         # 2. TF-IDF
-        elif "tfidf" in model_name:
-            return self.search_tfidf(query, df_jobs, search_field, top_k)
+        elif "tfidf" in model_name or "bm25" in model_name:
+            scoring = "bm25" if "bm25" in model_name else None
+            return self.search_tfidf(query, df_jobs, search_field, top_k, candidate_rows, scoring)
 
         # 3. Doc2Vec
         elif "doc2vec" in model_name:
-            return self.search_doc2vec(query, df_jobs, model_name, search_field, top_k)
+            return self.search_doc2vec(query, df_jobs, model_name, search_field, top_k, candidate_rows)
 
         # 4. Word2Vec
         elif "w2v" in model_name:
-            return self.search_w2v(query, df_jobs, model_name, search_field, top_k)
+            return self.search_w2v(query, df_jobs, model_name, search_field, top_k, candidate_rows)
 
         # 5. Transformers (MPNet, BGE, LaBSE)
         elif any(x in model_name for x in ["mpnet", "bge", "labse"]):
-            return self.search_transformer(query, df_jobs, model_name, search_field, top_k)
+            return self.search_transformer(query, df_jobs, model_name, search_field, top_k, candidate_rows)
 
         else:
             print(f"⚠️ Model không hỗ trợ: {model_name}")
             return pd.DataFrame()
         
-    def warmup(self):
+    # =========================================================
+    # BATCH SEARCH (nhiều query / 1 lần gọi)
+    # =========================================================
+    @holds_models
+    def search_many(self, queries, df_jobs, model_name="ensemble", search_field="title", top_k=20,
+                    candidate_rows=None, pool_size=None):
+        """
+        Search nhiều query 1 lần -> list (row ids, scores) theo thứ tự `queries`.
+        - Tiền xử lý mỗi query khác nhau 1 lần (có cache)
+        - Query chưa có trong cache: encode 1 batch (transformer) / transform 1 lần (TF-IDF)
+        - Điểm Q x N bằng 1 phép nhân ma trận (mỗi khối SEARCH_BATCH_BLOCK query), top-k từng dòng bằng argpartition
+        candidate_rows: None hoặc list (mỗi query 1 mảng row id / None): bộ lọc riêng từng query,
+        các query dùng chung 1 object row id được chấm điểm chung 1 nhóm.
+        Gom batch cho ensemble / TF-IDF cosine / transformer quét chính xác. Các model khác
+        (và khi có ANN / bản nén) chạy lần lượt qua search() -> kết quả giống /search.
+        """
+        if candidate_rows is None:
+            candidate_rows = [None] * len(queries)
+        plan = self._batch_plan(model_name, search_field)
+        if plan is None:
+            return [frame_rows(self.search(q, df_jobs, model_name, search_field, top_k, rows, pool_size))
+                    for q, rows in zip(queries, candidate_rows)]
+
+        query_strs = [self.preprocess_query(q) for q in queries]
+        vectors = {}
+        for kind, key, _, _ in plan:
+            vectors[key] = self._encode_many(key, query_strs) if kind == "dense" else self._vectorize_tfidf_many(key, query_strs)
+
+        groups = {}
+        for i, rows in enumerate(candidate_rows):
+            groups.setdefault(id(rows), (rows, []))[1].append(i)
+
+        results = [None] * len(queries)
+        block = settings.SEARCH_BATCH_BLOCK
+        for rows, idx in groups.values():
+            rows_out, component_rows = self._batch_rows(plan, df_jobs, rows)
+            if len(rows_out) == 0:
+                for i in idx: results[i] = frame_rows(pd.DataFrame())
+                continue
 
+            for start in range(0, len(idx), block):
+                part = idx[start:start + block]
+                final = None
+                for (kind, key, emb_key, weight), c_rows in zip(plan, component_rows):
+                    sub = self._score_rows_many(vectors[key][part], self.embeddings[emb_key], c_rows)
+                    if len(plan) > 1:
+                        with stage("fusion"):
+                            sub = weight * self.normalize_scores_many(sub)
+                    final = sub if final is None else final + sub
+
+                with stage("topk"):
+                    for i, row_scores in zip(part, final):
+                        top = top_k_indices(row_scores, top_k)
+                        results[i] = (rows_out[top], row_scores[top])
+        return results
+
+    def _batch_plan(self, model_name, search_field):
+        """
+        Các thành phần điểm của model: [(kind 'dense' | 'tfidf', model key, emb key, trọng số)].
+        None -> model không gom batch được (chạy từng query).
+        """
+        if model_name == "ensemble":
+            tfidf_key = "tfidf_basic" if search_field == "title" else "tfidf_upgrade"
+            bge_key = "bge_m3_basic" if search_field == "title" else "bge_m3_upgrade"
+            emb_key = f"{bge_key}_{search_field}"
+            # TF-IDF không load được -> đi đường search() (search_ensemble cho TF-IDF 0 điểm)
+            if self._loaded_matrix(self.load_tfidf, tfidf_key, f"{tfidf_key}_matrix") is None: return None
+            self.load_transformer(bge_key)
+            # ANN thu hẹp pool theo từng query / thiếu embedding -> đi đường search() như cũ
+            if emb_key in self.ann_indexes or emb_key not in self.embeddings: return None
+            # Cùng thứ tự cộng với search_ensemble: 0.7 * BGE + 0.3 * TF-IDF
+            return [("dense", bge_key, emb_key, 0.7), ("tfidf", tfidf_key, f"{tfidf_key}_matrix", 0.3)]
+
+        if "tfidf" in model_name and "bm25" not in model_name and settings.SPARSE_SCORING == "cosine":
+            key = "tfidf_basic" if search_field == "title" else "tfidf_upgrade"
+            self.load_tfidf(key)
+            return [("tfidf", key, f"{key}_matrix", 1.0)]
+
+        if any(x in model_name for x in ["mpnet", "bge", "labse"]) and "ensemble" not in model_name:
+            target_key = self._transformer_key(model_name, search_field)
+            self.load_transformer(target_key)
+            if target_key not in self.models: return None
+            emb_key = self._embedding_key(target_key, search_field)
+            if emb_key is None or emb_key in self.ann_indexes or emb_key in self.quantized: return None
+            return [("dense", target_key, emb_key, 1.0)]
+        return None
+
+    def _batch_rows(self, plan, df_jobs, candidate_rows):
+        """
+        (row id kết quả, row id cần chấm cho từng thành phần) - giống đường search() từng query:
+        ensemble giữ mọi ứng viên (dòng ngoài ma trận = 0 điểm), model đơn bỏ dòng ngoài ma trận.
+        """
+        if len(plan) > 1:
+            rows_out = np.asarray(candidate_rows if candidate_rows is not None else df_jobs.index, dtype=np.int64)
+            return rows_out, [self._candidate_rows(df_jobs, self.embeddings[emb_key].shape[0], candidate_rows)
+                              for _, _, emb_key, _ in plan]
+
+        n_rows = self.embeddings[plan[0][2]].shape[0]
+        rows = self._candidate_rows(df_jobs, n_rows, candidate_rows)
+        if rows is None:
+            return np.arange(n_rows), [None]
+        rows = rows[rows < n_rows]
+        return rows, [rows]
+
+    def _cached_many(self, key, query_strs, compute):
+        """Giá trị cache của từng query; các query chưa có được tính 1 lần bằng compute(list query)."""
+        values = {q: self.query_cache.get(key, q) for q in dict.fromkeys(query_strs)}
+        missing = [q for q, v in values.items() if v is None]
+        if missing:
+            for q, value in zip(missing, compute(missing)):
+                self.query_cache.put(key, q, value)
+                values[q] = value
+        return [values[q] for q in query_strs]
+
+    @timed("encode")
+    def _encode_many(self, key, query_strs):
+        """Vector (Q x d) của các query, phần chưa có trong cache encode chung 1 batch."""
+        def compute(missing):
+            encoded = self.models[key].encode(missing, normalize_embeddings=True, batch_size=settings.ENCODER_MAX_BATCH)
+            return [np.array(encoded[i:i + 1]) for i in range(len(missing))]
+        return np.vstack(self._cached_many(key, query_strs, compute))
+
+    @timed("encode")
+    def _vectorize_tfidf_many(self, key, query_strs):
+        """Vector TF-IDF (sparse Q x V), phần chưa có trong cache transform 1 lần."""
+        def compute(missing):
+            matrix = self.models[key].transform(missing)
+            return [matrix[i] for i in range(len(missing))]
+        return sparse.vstack(self._cached_many(key, query_strs, compute), format="csr")
+
+    @timed("score")
+    def _score_rows_many(self, vecs, matrix, rows=None):
+        """Như _score_rows cho Q query -> ma trận điểm Q x len(rows)."""
+        inv_norms = self.row_norms.get(matrix)
+        if rows is None:
+            return cosine_scores_many(vecs, matrix, inv_norms)
+
+        scores = np.zeros((vecs.shape[0], len(rows)), dtype=np.float64)
+        valid = rows < matrix.shape[0]
+        if valid.any():
+            scores[:, valid] = cosine_scores_many(vecs, matrix, inv_norms, rows[valid])
+        return scores
+
+    @staticmethod
+    def normalize_scores_many(scores):
+        """normalize_scores cho từng dòng của ma trận điểm Q x n."""
+        min_s = scores.min(axis=1, keepdims=True)
+        span = scores.max(axis=1, keepdims=True) - min_s
+        out = np.zeros_like(scores)
+        np.divide(scores - min_s, span, out=out, where=span != 0)
+        return out
+
+    # =========================================================
+    # INGEST: job thêm khi đang chạy (điều phối ở app.services.ingest)
+    # =========================================================
+    @staticmethod
+    def matrix_paths():
+        """emb_key -> (file ma trận gốc, sparse?) của mọi model trong settings."""
+        paths = {}
+        for key, value in settings.EMBEDDING_PATHS.items():
+            if isinstance(value, dict):
+                paths.update({f"{key}_{field}": (path, False) for field, path in value.items() if path})
+            else:
+                paths[f"{key}_matrix"] = (value, True)
+        return paths
+
+    def job_encoder(self, key, batch_size=None):
+        """
+        Hàm (list text đã tiền xử lý -> ma trận vector) của model dense `key`, None nếu không load được.
+        Dùng chung cho ingest job mới và dựng lại toàn bộ (scripts.build_embeddings) -> vector nhất quán.
+        """
+        if key.startswith("w2v_average"):
+            self.load_w2v(key)
+            model = self.models.get(key)
+            if model is None: return None
+            def encode(texts):
+                vectors = []
+                for text in texts:
+                    valid = [w for w in text.split() if w in model]
+                    vectors.append(np.mean([model[w] for w in valid], axis=0) if valid else np.zeros(model.vector_size))
+                return np.vstack(vectors)
+            return encode
+        if key.startswith("w2v_doc2vec"):
+            self.load_doc2vec(key)
+            if key not in self.models: return None
+            return lambda texts: np.vstack([self.infer_doc2vec(key, text.split()) for text in texts])
+        self.load_transformer(key)
+        model = self.models.get(key)
+        if model is None: return None
+        batch_size = batch_size or settings.ENCODER_MAX_BATCH
+        return lambda texts: model.encode(texts, normalize_embeddings=True, batch_size=batch_size)
+
+    def encode_jobs(self, jobs):
+        """
+        Vector các job mới (đã có cột *_processed) cho mọi ma trận có trên đĩa, bằng model đã train
+        (TF-IDF chỉ transform, không fit lại) -> {emb_key: ma trận len(jobs) dòng}.
+        Model không load được -> bỏ qua (ma trận đó thiếu dòng, kiểm tra nhất quán sẽ báo).
+        """
+        paths = self.matrix_paths()
+        matrices = {}
+        with self.registry.session():
+            for key, value in settings.EMBEDDING_PATHS.items():
+                emb_keys = [k for k in self._matrix_keys(key) if k in paths and self.segments.has_matrix(k, *paths[k])]
+                if not emb_keys: continue
+
+                if not isinstance(value, dict):
+                    self.load_tfidf(key)
+                    if key not in self.models:
+                        print(f"⚠️ Ingest: không load được {key} -> bỏ qua")
+                        continue
+                    texts = jobs[settings.TFIDF_TEXT_COLUMNS[key]].fillna("").astype(str)
+                    matrices[emb_keys[0]] = self.models[key].transform(texts)
+                    continue
+
+                encode = self.job_encoder(key)
+                if encode is None:
+                    print(f"⚠️ Ingest: không load được {key} -> bỏ qua {', '.join(emb_keys)}")
+                    continue
+                for emb_key in emb_keys:
+                    field = emb_key[len(key) + 1:]
+                    texts = jobs[settings.EMBEDDING_TEXT_COLUMNS[field]].fillna("").astype(str).tolist()
+                    dtype = self.segments.matrix_dtype(emb_key, paths[emb_key][0])
+                    matrices[emb_key] = np.asarray(encode(texts), dtype=dtype)
+        return matrices
+
+    def _prepare_matrix(self, emb_key, matrix, manifest):
+        """(ma trận, inverted index cosine | None) của emb_key theo manifest mới, None nếu không đổi."""
+        if self.segments.matrix_signature(emb_key, manifest) == self.segments.matrix_signature(emb_key):
+            return None
+        default_path, is_sparse = self.matrix_paths()[emb_key]
+        if self.segments.base_changed(emb_key, manifest):
+            # Thế hệ base mới (đã gộp): mở lại bằng memory-map thay cho bản nối trong RAM
+            new = self.segments.load_matrix(emb_key, default_path, is_sparse, settings.EMBEDDING_MMAP, manifest)
+        else:
+            new = self.segments.extend_matrix(emb_key, matrix, manifest)
+        # Row id không đổi -> norm các dòng cũ dùng lại, chỉ tính cho dòng mới
+        n_old = min(matrix.shape[0], new.shape[0])
+        self.row_norms.put(new, np.concatenate([self.row_norms.get(matrix)[:n_old], inverse_row_norms(new[n_old:])]))
+        return new, InvertedIndex.from_tfidf(new) if is_sparse else None
+
+    def prepare_snapshot(self, manifest):
+        """
+        Dựng trước (ngoài lock, request vẫn chạy trên bản cũ) ma trận + norm dòng + inverted index
+        của các model đang load theo manifest mới -> {emb_key: (ma trận, inverted index | None)}.
+        """
+        prepared = {}
+        for emb_key, matrix in list(self.embeddings.items()):
+            entry = self._prepare_matrix(emb_key, matrix, manifest)
+            if entry is not None:
+                prepared[emb_key] = entry
+        return prepared
+
+    def swap_snapshot(self, manifest, prepared):
+        """
+        Đổi sang ma trận đã dựng - gọi dưới segments.lock.writing(), sau khi đổi dữ liệu job và trước khi
+        đổi segments.manifest. Bản nén / ANN chưa có job mới bị tắt (quét chính xác) tới khi dựng lại offline.
+        -> model key có ma trận đã đổi.
+        """
+        changed = set()
+        for emb_key, matrix in list(self.embeddings.items()):
+            # Model load sau lúc dựng trước -> dựng luôn (hiếm)
+            entry = prepared.get(emb_key) or self._prepare_matrix(emb_key, matrix, manifest)
+            if entry is None: continue
+            new, index = entry
+            self._register_matrix(emb_key, new)
+            quantized = self.quantized.get(emb_key)
+            if quantized is not None and quantized.shape != new.shape:
+                print(f"⚠️ Bản nén {emb_key} chưa có job mới -> quét trên ma trận gốc")
+                del self.quantized[emb_key]
+            ann = self.ann_indexes.get(emb_key)
+            if ann is not None and ann.n_rows != new.shape[0]:
+                print(f"⚠️ ANN index {emb_key} chưa có job mới -> quét chính xác")
+                del self.ann_indexes[emb_key]
+            key = emb_key.rsplit("_", 1)[0]
+            if index is not None:
+                self.sparse_indexes[(key, "cosine")] = index
+                # BM25 dựng lại lần đầu được dùng (đếm tf trên dữ liệu mới)
+                self.sparse_indexes.pop((key, "bm25"), None)
+            changed.add(key)
+        self.index_version = manifest["version"]
+        return changed
+
+    def refresh_model_sizes(self, keys):
+        """Cập nhật RAM của model sau khi đổi snapshot (gọi ngoài khóa ghi: registry có thể evict)."""
+        for key in keys:
+            self.registry.resize(key, self._model_nbytes(key))
+
+    def matrix_rows(self):
+        """Số dòng của mọi ma trận / bản nén / ANN / inverted index đang load (kiểm tra với số job)."""
+        rows = {emb_key: matrix.shape[0] for emb_key, matrix in list(self.embeddings.items())}
+        rows.update({f"{emb_key}.quantized": q.shape[0] for emb_key, q in list(self.quantized.items())})
+        rows.update({f"{emb_key}.ann": index.n_rows for emb_key, index in list(self.ann_indexes.items())})
+        rows.update({f"{key}.{scoring}_index": index.n_docs
+                     for (key, scoring), index in list(self.sparse_indexes.items())})
+        return rows
+
+    def warmup_tasks(self):
+        """Artifact nạp lúc khởi động: [(tên, hàm load, các artifact phải xong trước)]."""
+        models = [("tfidf_basic", self.load_tfidf), ("tfidf_upgrade", self.load_tfidf),
+                  ("bge_m3_basic", self.load_transformer), ("bge_m3_upgrade", self.load_transformer)]
+        tasks = [(key, functools.partial(self._warmup_model, load, key), ()) for key, load in models]
+        # Nạp sẵn model tách từ của underthesea (lần gọi đầu chậm)
+        tasks.append(("tokenizer", lambda: self.preprocessor.preprocess("khởi động hệ thống", "underthesea"), ()))
+        tasks.append(("similar_table", self.load_similar_table, ()))
+        # Cache query kiểm tra dấu vân tay model / tokenizer -> nạp sau cùng như trước đây
+        tasks.append(("query_cache", self.load_query_cache, tuple(key for key, _ in models)))
+        return tasks
+
+    def _warmup_model(self, load, key):
+        # Theo kết quả load (không xét self.models): có ngân sách RAM thì model vừa load
+        # có thể đã bị evict khi các model warmup khác load xong -> vẫn tính là đã nạp được
+        if not load(key):
+            raise RuntimeError(f"Không load được {key}")
+
+    def warmup(self):
+        """Nạp các artifact khởi động song song (WARMUP_WORKERS thread), chặn tới khi xong."""
         print("Đang khởi động hệ thống")
-        
-        self.load_tfidf("tfidf_basic")
-        self.load_tfidf("tfidf_upgrade")
-        
-        self.load_transformer("bge_m3_basic") 
-        self.load_transformer("bge_m3_upgrade")
-        
-        
-        print("Hệ thống đã sẵn sàng! (Warmup complete)")
+        warmup = Warmup(self.warmup_tasks(), settings.WARMUP_WORKERS)
+        warmup.run()
+        print(f"Hệ thống đã sẵn sàng! (Warmup complete, {warmup.report()['seconds']:.1f}s)")
+        return warmup
 search_engine = SearchEngine()
@@ -0,0 +1,317 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from app.config import settings
+from app.services.matrix_store import load_dense, load_sparse, save_sparse_mmap, sparse_mmap_paths
+
+# fcntl chỉ có trên Unix: không có -> chỉ khóa trong process (1 writer / process)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MANIFEST_NAME = "manifest.json"
+
+
+def empty_manifest():
+    """Chưa ingest lần nào: chỉ có dữ liệu / ma trận gốc."""
+    return {
+        "version": 1,
+        "generation": 0,
+        "n_base": None,       # số job của base (ghi ở lần ingest đầu)
+        "base": {"jobs": None, "matrices": {}},  # file base đã gộp (None / thiếu -> file gốc trong settings)
+        "segments": [],
+        "deleted": [],        # row id đã xóa (tombstone)
+        "garbage": [],        # file của snapshot trước, xóa ở lần gộp sau
+    }
+
+
+class SnapshotLock:
+    """
+    Khóa đọc / ghi cho snapshot đang phục vụ: request (đọc) chạy song song, đổi snapshot (ghi) chờ
+    các request đang chạy xong rồi mới đổi con trỏ -> không request nào thấy dữ liệu / ma trận lệch nhau.
+    Ưu tiên ghi (request mới chờ khi có lượt ghi đang đợi). Đọc lồng nhau / đọc trong lúc ghi
+    ở cùng thread không khóa lại.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def reading(self):
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            with self._cond:
+                while self._writer or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                with self._cond:
+                    self._readers -= 1
+                    if self._readers == 0: self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        # Thread đang ghi đọc thoải mái (depth > 0 -> reading() không khóa)
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class SegmentStore:
+    """
+    Dữ liệu job + ma trận theo segment trong thư mục `root`:
+    - base: dữ liệu / ma trận gốc (settings) hoặc thế hệ đã gộp gần nhất (gen_XXXX.*)
+    - segment: job mới nối tiếp cuối (seg_XXXXXX.jobs.pkl) + ma trận các dòng đó cho từng emb_key
+      (.npy dense, .npz TF-IDF)
+    - manifest.json: phiên bản, danh sách segment, row id đã xóa. Ghi nguyên tử (file tạm + os.replace).
+    Row id không bao giờ bị đánh lại: job mới nhận row id tiếp theo, job bị xóa chỉ bị ẩn.
+    self.manifest là bản đang phục vụ trong process (đổi dưới self.lock.writing()).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = SnapshotLock()
+        self._writer_lock = threading.Lock()
+        self.manifest = self.read_manifest()
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    # ------------------ MANIFEST ------------------
+    def read_manifest(self):
+        path = self.path(MANIFEST_NAME)
+        if not os.path.exists(path):
+            return empty_manifest()
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp = self.path(MANIFEST_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path(MANIFEST_NAME))
+
+    @staticmethod
+    def n_rows(manifest):
+        """Tổng số dòng (kể cả job đã xóa) của snapshot, None nếu chưa ingest lần nào."""
+        if manifest["n_base"] is None: return None
+        return manifest["n_base"] + sum(seg["rows"] for seg in manifest["segments"])
+
+    @contextmanager
+    def writer(self):
+        """1 writer (ingest / gộp) tại 1 thời điểm, kể cả giữa nhiều worker / script (flock)."""
+        os.makedirs(self.root, exist_ok=True)
+        with self._writer_lock, open(self.path(".lock"), "a") as f:
+            if fcntl is not None: fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None: fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ------------------ ĐỌC ------------------
+    def _base_matrix_path(self, emb_key, default_path, manifest):
+        name = manifest["base"]["matrices"].get(emb_key)
+        return self.path(name) if name else default_path
+
+    def has_matrix(self, emb_key, default_path, is_sparse=False):
+        """Có ma trận base cho emb_key (file gốc hoặc bản đã gộp)."""
+        path = self._base_matrix_path(emb_key, default_path, self.manifest)
+        if not path: return False
+        if is_sparse and all(os.path.exists(p) for p in sparse_mmap_paths(path).values()):
+            return True
+        return os.path.exists(path)
+
+    def matrix_dtype(self, emb_key, default_path):
+        """dtype của ma trận dense base (chỉ đọc header .npy qua memory-map)."""
+        return load_dense(self._base_matrix_path(emb_key, default_path, self.manifest), True).dtype
+
+    def matrix_signature(self, emb_key, manifest=None):
+        """(file base, số segment) -> so 2 manifest xem ma trận emb_key có đổi không."""
+        manifest = manifest or self.manifest
+        return (manifest["base"]["matrices"].get(emb_key),
+                sum(1 for seg in manifest["segments"] if emb_key in seg["matrices"]))
+
+    def base_changed(self, emb_key, manifest):
+        return manifest["base"]["matrices"].get(emb_key) != self.manifest["base"]["matrices"].get(emb_key)
+
+    def _read_part(self, name):
+        path = self.path(name)
+        if name.endswith(".npz"):
+            return sparse.load_npz(path).tocsr()
+        return np.load(path)
+
+    def load_matrix(self, emb_key, default_path, is_sparse=False, mmap=True, manifest=None):
+        """Ma trận base (memory-map) + các dòng từ segment."""
+        manifest = manifest or self.manifest
+        path = self._base_matrix_path(emb_key, default_path, manifest)
+        matrix = load_sparse(path, mmap) if is_sparse else load_dense(path, mmap)
+        return self.extend_matrix(emb_key, matrix, manifest)
+
+    def extend_matrix(self, emb_key, matrix, manifest=None):
+        """
+        Nối các dòng segment còn thiếu (row id >= số dòng hiện có) vào cuối ma trận.
+        Segment thiếu ma trận emb_key (model chưa có lúc ingest) -> dừng, các dòng sau nhận điểm 0.
+        """
+        manifest = manifest or self.manifest
+        parts, n_rows = [matrix], matrix.shape[0]
+        for seg in manifest["segments"]:
+            if seg["start"] + seg["rows"] <= n_rows: continue
+            if seg["start"] != n_rows or emb_key not in seg["matrices"]:
+                print(f"⚠️ {emb_key}: không có dòng của segment {seg['id']} -> dừng ở {n_rows} dòng")
+                break
+            parts.append(self._read_part(seg["matrices"][emb_key]))
+            n_rows += seg["rows"]
+        if len(parts) == 1: return matrix
+        if sparse.issparse(matrix):
+            return sparse.vstack(parts, format="csr")
+        return np.concatenate(parts)
+
+    def load_jobs(self, read_base, manifest=None):
+        """Dữ liệu job của snapshot (base + segment). read_base(): đọc dữ liệu gốc khi chưa có base đã gộp."""
+        manifest = manifest or self.manifest
+        name = manifest["base"]["jobs"]
+        jobs = pd.read_pickle(self.path(name)) if name else read_base()
+        if manifest["n_base"] is not None and len(jobs) != manifest["n_base"]:
+            raise ValueError(f"Dữ liệu gốc có {len(jobs)} job nhưng {self.path(MANIFEST_NAME)} ghi "
+                             f"{manifest['n_base']} -> dữ liệu gốc đã đổi, xóa thư mục segment hoặc dựng lại")
+        return self.extend_jobs(jobs, manifest)
+
+    def extend_jobs(self, jobs, manifest=None):
+        """Nối các job segment còn thiếu vào cuối (RangeIndex, row id = vị trí dòng)."""
+        manifest = manifest or self.manifest
+        parts, n_rows = [jobs], len(jobs)
+        for seg in manifest["segments"]:
+            if seg["start"] + seg["rows"] <= n_rows: continue
+            if seg["start"] != n_rows:
+                raise ValueError(f"Segment {seg['id']} bắt đầu ở dòng {seg['start']}, dữ liệu có {n_rows} dòng")
+            parts.append(pd.read_pickle(self.path(seg["jobs"])))
+            n_rows += seg["rows"]
+        if len(parts) == 1: return jobs
+        return pd.concat(parts, ignore_index=True)
+
+    # ------------------ GHI (đang giữ writer()) ------------------
+    def _save_part(self, name, matrix):
+        if sparse.issparse(matrix):
+            name += ".npz"
+            sparse.save_npz(self.path(name), sparse.csr_matrix(matrix))
+        else:
+            name += ".npy"
+            np.save(self.path(name), np.asarray(matrix))
+        return name
+
+    def add_segment(self, jobs, matrices, removed=(), n_base=None):
+        """
+        Ghi 1 segment rồi manifest mới (phiên bản + 1).
+        jobs: DataFrame job mới (index = row id nối tiếp) hoặc None; matrices: {emb_key: ma trận các dòng đó};
+        removed: row id bị xóa; n_base: số job hiện có (ghi ở lần ingest đầu).
+        """
+        manifest = self.read_manifest()
+        version = manifest["version"] + 1
+        if manifest["n_base"] is None:
+            manifest["n_base"] = n_base
+        if jobs is not None and len(jobs):
+            start = self.n_rows(manifest)
+            if jobs.index[0] != start:
+                raise ValueError(f"Job mới phải bắt đầu ở row id {start}, nhận {jobs.index[0]}")
+            name = f"seg_{version:06d}"
+            files = {}
+            for emb_key, matrix in matrices.items():
+                if matrix.shape[0] != len(jobs):
+                    raise ValueError(f"{emb_key}: {matrix.shape[0]} dòng cho {len(jobs)} job")
+                files[emb_key] = self._save_part(f"{name}.{emb_key}", matrix)
+            jobs.to_pickle(self.path(f"{name}.jobs.pkl"))
+            manifest["segments"].append({"id": version, "start": int(start), "rows": len(jobs),
+                                         "jobs": f"{name}.jobs.pkl", "matrices": files})
+        manifest["deleted"] = sorted(set(manifest["deleted"]) | {int(r) for r in removed})
+        manifest["version"] = version
+        self._write_manifest(manifest)
+        return manifest
+
+    def _files(self, manifest):
+        """Tên các file manifest đang tham chiếu."""
+        names = {seg["jobs"] for seg in manifest["segments"]}
+        names.update(name for seg in manifest["segments"] for name in seg["matrices"].values())
+        if manifest["base"]["jobs"]: names.add(manifest["base"]["jobs"])
+        for name in manifest["base"]["matrices"].values():
+            names.add(name)
+            if name.endswith(".pkl"):
+                names.update(os.path.basename(p) for p in sparse_mmap_paths(name).values())
+        return names
+
+    def compact(self, matrix_paths, read_base):
+        """
+        Gộp base + mọi segment thành thế hệ base mới: jobs (.pkl), dense (.npy), TF-IDF (.pkl + các phần
+        .npy memory-map). Row id giữ nguyên (job đã xóa vẫn chiếm dòng, chỉ dựng lại offline mới bỏ hẳn).
+        File không còn dùng xóa ở lần gộp sau (worker chưa kịp đổi snapshot vẫn đọc được).
+        matrix_paths: {emb_key: (file ma trận gốc, sparse?)}. -> manifest mới, None nếu không có segment.
+        """
+        manifest = self.read_manifest()
+        if not manifest["segments"]: return None
+        generation = manifest["generation"] + 1
+        prefix = f"gen_{generation:04d}"
+
+        jobs = self.load_jobs(read_base, manifest)
+        base = {"jobs": f"{prefix}.jobs.pkl", "matrices": dict(manifest["base"]["matrices"])}
+        jobs.to_pickle(self.path(base["jobs"]))
+        for emb_key in sorted({k for seg in manifest["segments"] for k in seg["matrices"]}):
+            default_path, is_sparse = matrix_paths.get(emb_key, (None, False))
+            if not default_path and emb_key not in base["matrices"]:
+                print(f"⚠️ Bỏ qua {emb_key}: không có ma trận gốc")
+                continue
+            matrix = self.load_matrix(emb_key, default_path, is_sparse, True, manifest)
+            if is_sparse:
+                name = f"{prefix}.{emb_key}.pkl"
+                joblib.dump(matrix, self.path(name))
+                save_sparse_mmap(matrix, self.path(name))
+            else:
+                name = f"{prefix}.{emb_key}.npy"
+                np.save(self.path(name), np.asarray(matrix))
+            base["matrices"][emb_key] = name
+            print(f"💾 Gộp {emb_key}: {matrix.shape[0]} dòng -> {name}")
+
+        new = dict(manifest, version=manifest["version"] + 1, generation=generation,
+                   n_base=len(jobs), base=base, segments=[])
+        new["garbage"] = sorted(self._files(manifest) - self._files(new))
+        self._write_manifest(new)
+        for name in manifest["garbage"]:
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+        return new
+
+
+segment_store = SegmentStore(settings.SEGMENTS_DIR)
@@ -0,0 +1,150 @@
+import re
+import string
+import threading
+import time
+from collections import Counter
+
+TOKENIZERS = ("underthesea", "longest_match")
+
+# Biên dịch 1 lần (trước đây dựng lại regex mỗi lần gọi)
+PUNCT_RE = re.compile(f"[{re.escape(string.punctuation)}]")
+SPACE_RE = re.compile(r"\s+")
+
+# Lần gọi đầu underthesea nạp model CRF, nhiều thread cùng gọi lúc đó -> lỗi: lần đầu đi qua lock
+_underthesea_lock = threading.Lock()
+_underthesea_ready = False
+
+
+def underthesea_tokenize(text):
+    global _underthesea_ready
+    # Import lần đầu cần tách từ (chậm) thay vì lúc import module
+    from underthesea import word_tokenize
+    if not _underthesea_ready:
+        with _underthesea_lock:
+            tokens = word_tokenize(text, format="text")
+            _underthesea_ready = True
+        return tokens.split()
+    return word_tokenize(text, format="text").split()
+
+
+def load_stopwords(path):
+    """Stopword (1 từ / dòng, từ ghép nối bằng '_') -> frozenset để tra O(1)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return frozenset(w.strip() for w in f.read().splitlines() if w.strip())
+    except Exception:
+        return frozenset()
+
+
+class LongestMatchSegmenter:
+    """
+    Tách từ theo từ điển, ghép tham lam cụm âm tiết dài nhất có trong từ điển
+    (vd: từ điển TF-IDF đã học: "kế_toán", "nhân_viên"). Nhanh hơn underthesea nhiều lần,
+    nhưng không xử lý được từ ghép chưa có trong từ điển.
+    """
+
+    def __init__(self, words):
+        self.words = set()
+        self.max_len = 1
+        for word in words:
+            syllables = tuple(word.split("_"))
+            if len(syllables) > 1:
+                self.words.add(syllables)
+                self.max_len = max(self.max_len, len(syllables))
+
+    def segment(self, text):
+        syllables = text.split()
+        tokens = []
+        i, n = 0, len(syllables)
+        while i < n:
+            for size in range(min(self.max_len, n - i), 1, -1):
+                if tuple(syllables[i:i + size]) in self.words:
+                    tokens.append("_".join(syllables[i:i + size]))
+                    i += size
+                    break
+            else:
+                tokens.append(syllables[i])
+                i += 1
+        return tokens
+
+
+class TextPreprocessor:
+    """
+    lower -> bỏ dấu câu -> gộp khoảng trắng -> tách từ -> bỏ stopword.
+    tokenizer: "underthesea" (mặc định, như lúc train) hoặc "longest_match"
+    (cần set_vocabulary; chưa có từ điển thì dùng underthesea).
+    """
+
+    def __init__(self, stopwords=(), tokenizer="underthesea"):
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"Tokenizer không hỗ trợ: {tokenizer}")
+        self.stopwords = frozenset(stopwords)
+        self.tokenizer = tokenizer
+        self.segmenter = None
+
+    def set_vocabulary(self, vocabulary):
+        """Từ điển cho longest_match: vocabulary TF-IDF + stopword ghép (để bỏ được stopword nhiều âm tiết)."""
+        self.segmenter = LongestMatchSegmenter(list(vocabulary) + list(self.stopwords))
+
+    @staticmethod
+    def normalize(text):
+        text = PUNCT_RE.sub(" ", text.lower())
+        return SPACE_RE.sub(" ", text).strip()
+
+    def tokenize(self, text, tokenizer=None):
+        """Tách từ trên text đã normalize."""
+        if (tokenizer or self.tokenizer) == "longest_match" and self.segmenter is not None:
+            return self.segmenter.segment(text)
+        return underthesea_tokenize(text)
+
+    def preprocess(self, text, tokenizer=None):
+        if not text or not isinstance(text, str): return ""
+        tokens = self.tokenize(self.normalize(text), tokenizer)
+        return " ".join([w for w in tokens if w not in self.stopwords])
+
+    def preprocess_many(self, texts, tokenizer=None):
+        """Tiền xử lý hàng loạt (offline / eval): text trùng nhau chỉ xử lý 1 lần."""
+        done = {}
+        out = []
+        for text in texts:
+            key = text if isinstance(text, str) else None
+            if key not in done:
+                done[key] = self.preprocess(text, tokenizer)
+            out.append(done[key])
+        return out
+
+
+def tokenizer_agreement(preprocessor, texts):
+    """
+    So sánh longest_match với underthesea trên cùng danh sách text:
+    tỉ lệ text cho kết quả giống hệt, precision / recall / F1 theo token, thời gian mỗi text (ms).
+    """
+    stats = {"texts": 0, "exact": 0, "matched": 0, "fast_tokens": 0, "ref_tokens": 0,
+             "ms_underthesea": 0.0, "ms_longest_match": 0.0}
+    for text in texts:
+        if not isinstance(text, str) or not text.strip(): continue
+        start = time.perf_counter()
+        ref = preprocessor.preprocess(text, "underthesea").split()
+        stats["ms_underthesea"] += (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        fast = preprocessor.preprocess(text, "longest_match").split()
+        stats["ms_longest_match"] += (time.perf_counter() - start) * 1000
+
+        stats["texts"] += 1
+        stats["exact"] += ref == fast
+        stats["matched"] += sum((Counter(ref) & Counter(fast)).values())
+        stats["ref_tokens"] += len(ref)
+        stats["fast_tokens"] += len(fast)
+
+    n = max(stats["texts"], 1)
+    precision = stats["matched"] / max(stats["fast_tokens"], 1)
+    recall = stats["matched"] / max(stats["ref_tokens"], 1)
+    return {
+        "texts": stats["texts"],
+        "exact_match": stats["exact"] / n,
+        "token_precision": precision,
+        "token_recall": recall,
+        "token_f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "ms_per_text_underthesea": stats["ms_underthesea"] / n,
+        "ms_per_text_longest_match": stats["ms_longest_match"] / n,
+    }
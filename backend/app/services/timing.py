@@ -0,0 +1,71 @@
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+# Các stage của 1 request search (dùng cho benchmark / metrics)
+STAGES = ("preprocess", "load", "encode", "score", "fusion", "topk", "serialize")
+
+
+class _Recording:
+    __slots__ = ("times", "labels", "active")
+
+    def __init__(self, labels):
+        self.times = {}
+        self.labels = labels
+        self.active = None
+
+
+# ContextVar (không phải thread-local): endpoint sync chạy trong threadpool vẫn thấy
+# bản ghi do middleware mở (context được copy sang thread, cùng object _Recording)
+_current = contextvars.ContextVar("timing_recording", default=None)
+
+
+@contextmanager
+def record_stages(labels=None):
+    """
+    Bật đo thời gian từng stage trong khối (chỉ context hiện tại):
+        with record_stages() as times: ...   # times = {stage: ms}
+    labels: dict nhận các nhãn set_label() trong khối (vd: model).
+    Ngoài khối này stage() gần như không tốn gì.
+    """
+    token = _current.set(_Recording(labels if labels is not None else {}))
+    try:
+        yield _current.get().times
+    finally:
+        _current.reset(token)
+
+
+def set_label(name, value):
+    """Gắn nhãn cho bản ghi đang mở (bỏ qua nếu không có)."""
+    recording = _current.get()
+    if recording is not None:
+        recording.labels[name] = value
+
+
+@contextmanager
+def stage(name):
+    """Cộng thời gian khối vào stage `name`. Stage lồng trong stage khác không tính riêng (tránh đếm 2 lần)."""
+    recording = _current.get()
+    if recording is None or recording.active is not None:
+        yield
+        return
+    recording.active = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        times = recording.times
+        times[name] = times.get(name, 0.0) + (time.perf_counter() - start) * 1000
+        recording.active = None
+
+
+def timed(name):
+    """Decorator: cả hàm tính vào stage `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class UserProfile:
+    """
+    Hồ sơ user = trung bình có trọng số, giảm dần theo thời gian (time-decay)
+    của vector BGE-M3 + TF-IDF đã lưu của các job đã xem.
+        S_n = decay * S_{n-1} + w * x_n ;  W_n = decay * W_{n-1} + w
+        profile = S_n / W_n
+    Thêm 1 lượt xem mới chỉ tốn O(d) (không encode lại lịch sử).
+    """
+
+    def __init__(self, decay=0.8):
+        self.decay = decay
+        self.viewed = ()
+        self.dense_sum = None
+        self.sparse_sum = None
+        self.weight_sum = 0.0
+
+    def add_view(self, job_id, dense_row, sparse_row, weight=1.0):
+        """Thêm 1 job vừa xem (dense_row: vector 1 x d, sparse_row: dòng TF-IDF 1 x V)."""
+        dense_row = np.asarray(dense_row, dtype=np.float64).ravel()
+        norm = np.linalg.norm(dense_row)
+        if norm > 0:
+            dense_row = dense_row / norm
+
+        if self.dense_sum is None:
+            self.dense_sum = weight * dense_row
+            self.sparse_sum = weight * sparse_row
+        else:
+            self.dense_sum = self.decay * self.dense_sum + weight * dense_row
+            self.sparse_sum = self.decay * self.sparse_sum + weight * sparse_row
+        self.weight_sum = self.decay * self.weight_sum + weight
+        self.viewed = self.viewed + (job_id,)
+        return self
+
+    def copy(self):
+        other = UserProfile(self.decay)
+        other.viewed = self.viewed
+        other.dense_sum = None if self.dense_sum is None else self.dense_sum.copy()
+        other.sparse_sum = None if self.sparse_sum is None else self.sparse_sum.copy()
+        other.weight_sum = self.weight_sum
+        return other
+
+    def vectors(self):
+        """Trả về (dense 1 x d, sparse 1 x V) của profile."""
+        return (self.dense_sum / self.weight_sum).reshape(1, -1), self.sparse_sum / self.weight_sum
+
+
+class UserProfileCache:
+    """
+    LRU cache profile theo lịch sử xem (tuple id).
+    Request mới = lịch sử cũ + 1 job -> lấy profile của tiền tố và cập nhật O(d).
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, viewed):
+        with self._lock:
+            profile = self._profiles.get(viewed)
+            if profile is not None:
+                self._profiles.move_to_end(viewed)
+            return profile
+
+    def put(self, profile):
+        with self._lock:
+            self._profiles[profile.viewed] = profile
+            self._profiles.move_to_end(profile.viewed)
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
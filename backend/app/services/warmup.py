@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Warmup:
+    """
+    Nạp các artifact khởi động (dữ liệu, model, bảng dựng sẵn) song song trong thread pool,
+    ghi lại tiến độ từng artifact cho GET /ready.
+    tasks: [(tên, hàm load, các tên phải xong trước)] - task phụ thuộc phải đứng sau trong danh sách
+    (thread pool lấy task theo thứ tự -> không bao giờ chờ 1 task chưa được chạy).
+    Hàm load ném exception -> artifact "failed" (các task khác vẫn chạy tiếp).
+    """
+
+    def __init__(self, tasks, workers=4):
+        self.tasks = list(tasks)
+        self.workers = max(1, workers)
+        self.artifacts = {name: {"state": "pending", "seconds": None} for name, _, _ in self.tasks}
+        self._done = {name: threading.Event() for name, _, _ in self.tasks}
+        self._lock = threading.Lock()
+        self._started = None
+        self._seconds = None
+
+    def _update(self, name, **fields):
+        with self._lock:
+            self.artifacts[name] = dict(self.artifacts[name], **fields)
+
+    def _run_task(self, name, load, after):
+        for dep in after:
+            self._done[dep].wait()
+        self._update(name, state="loading")
+        start = time.perf_counter()
+        try:
+            load()
+            self._update(name, state="ready", seconds=round(time.perf_counter() - start, 3))
+        except Exception as e:
+            print(f"❌ Warmup {name}: {e}")
+            self._update(name, state="failed", seconds=round(time.perf_counter() - start, 3), error=str(e))
+        finally:
+            self._done[name].set()
+
+    def run(self):
+        """Chạy mọi task, chặn tới khi xong."""
+        self._started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="warmup") as pool:
+            for name, load, after in self.tasks:
+                pool.submit(self._run_task, name, load, after)
+        self._seconds = time.perf_counter() - self._started
+        return self
+
+    def start(self):
+        """Chạy nền (không chặn): server nhận request ngay, model chưa nạp thì load theo request."""
+        thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        with self._lock:
+            artifacts = {name: dict(info) for name, info in self.artifacts.items()}
+        finished = self._seconds is not None
+        if finished:
+            seconds = self._seconds
+        else:
+            seconds = time.perf_counter() - self._started if self._started is not None else 0.0
+        return {
+            # Sẵn sàng = đã chạy xong và không artifact nào lỗi
+            "ready": finished and all(a["state"] == "ready" for a in artifacts.values()),
+            "loaded": sum(1 for a in artifacts.values() if a["state"] == "ready"),
+            "total": len(artifacts),
+            "seconds": round(seconds, 3),
+            "artifacts": artifacts,
+        }
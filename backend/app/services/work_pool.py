@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+
+
+class Overloaded(Exception):
+    """Pool đầy / request chờ quá lâu. retry_after: số giây gợi ý client thử lại (header Retry-After)."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class WorkPool:
+    """
+    Pool thread cố định cho việc nặng CPU (encode query + chấm điểm), thay cho threadpool mặc định
+    của Starlette (không giới hạn theo số core, không giới hạn hàng đợi):
+    - Nhận tối đa workers + queue_size request cùng lúc (đang chạy + đang chờ); vượt -> Overloaded ngay.
+    - Request chờ trong hàng đợi quá queue_timeout giây -> Overloaded khi tới lượt (không chạy nữa).
+    - Retry-After ước lượng từ thời gian xử lý trung bình và số request đang có.
+    Endpoint nhẹ vẫn chạy trong threadpool của Starlette -> không bao giờ chờ sau search nặng.
+    Thread (không phải process): model / ma trận / cache dùng chung trong tiến trình, numpy / torch nhả GIL.
+    """
+
+    def __init__(self, workers, queue_size, queue_timeout=None):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="work-pool")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._service_seconds = None  # Trung bình trượt thời gian chạy 1 request
+        self._counts = Counter()
+
+    def _retry_after(self):
+        # Gọi khi đang giữ self._lock
+        service = self._service_seconds or 1.0
+        return max(1, math.ceil(service * self._in_flight / self.workers))
+
+    def _release(self, _future):
+        # Gọi khi task xong, lỗi hoặc bị hủy trước khi chạy (client ngắt kết nối)
+        with self._lock:
+            self._in_flight -= 1
+
+    def _run(self, context, fn, args, kwargs, submitted):
+        with self._lock:
+            if self.queue_timeout and time.perf_counter() - submitted > self.queue_timeout:
+                self._counts["queue_timeout"] += 1
+                raise Overloaded("queue_timeout", self._retry_after())
+            self._running += 1
+        start = time.perf_counter()
+        try:
+            return context.run(fn, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._running -= 1
+                self._counts["completed"] += 1
+                self._service_seconds = elapsed if self._service_seconds is None \
+                    else 0.9 * self._service_seconds + 0.1 * elapsed
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Chạy fn(*args, **kwargs) trong pool, chờ không chặn event loop. Giữ context của request
+        (đo stage / nhãn metrics). Pool đầy -> Overloaded ngay, không xếp hàng.
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._counts["queue_full"] += 1
+                raise Overloaded("queue_full", self._retry_after())
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(
+                self._run, contextvars.copy_context(), fn, args, kwargs, time.perf_counter()
+            )
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self._in_flight,
+                "running": self._running,
+                "queued": max(0, self._in_flight - self._running),
+                "avg_service_ms": round((self._service_seconds or 0.0) * 1000, 2),
+                "completed": self._counts["completed"],
+                "rejected": {"queue_full": self._counts["queue_full"], "queue_timeout": self._counts["queue_timeout"]},
+                "retry_after": self._retry_after(),
+            }
+
+
+work_pool = WorkPool(settings.WORK_POOL_WORKERS, settings.WORK_POOL_QUEUE, settings.WORK_POOL_QUEUE_TIMEOUT)
@@ -0,0 +1,80 @@
+"""
+Benchmark: chấm điểm toàn corpus rồi slice (cách cũ) vs chỉ chấm các dòng ứng viên.
+
+Chạy từ thư mục backend:
+    python -m scripts.bench_candidate_scoring
+    python -m scripts.bench_candidate_scoring --rows 200000 --dim 1024 --repeat 20
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.services.search_engine import SearchEngine
+
+SELECTIVITIES = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0]
+
+
+def make_corpus(n_rows, dim, vocab, nnz_per_row, seed=0):
+    rng = np.random.default_rng(seed)
+    dense = rng.standard_normal((n_rows, dim), dtype=np.float32)
+    # CSR dựng trực tiếp (sparse.random cần O(rows * vocab) bộ nhớ)
+    indptr = np.arange(n_rows + 1, dtype=np.int64) * nnz_per_row
+    indices = rng.integers(0, vocab, n_rows * nnz_per_row)
+    data = rng.random(n_rows * nnz_per_row)
+    tfidf = sparse.csr_matrix((data, indices, indptr), shape=(n_rows, vocab))
+    tfidf.sum_duplicates()
+    q_dense = rng.standard_normal((1, dim), dtype=np.float32)
+    q_sparse = sparse.csr_matrix((rng.random(10), (np.zeros(10, dtype=int), rng.integers(0, vocab, 10))),
+                                 shape=(1, vocab))
+    return dense, tfidf, q_dense, q_sparse
+
+
+def timeit(fn, repeat):
+    fn()  # warm
+    t = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        t.append(time.perf_counter() - start)
+    return np.median(t) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--nnz", type=int, default=120, help="số phần tử khác 0 / dòng TF-IDF")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = SearchEngine()
+    dense, tfidf, q_dense, q_sparse = make_corpus(args.rows, args.dim, args.vocab, args.nnz)
+    rng = np.random.default_rng(1)
+
+    print(f"Corpus: {args.rows} jobs | dense {args.dim}d | TF-IDF vocab {args.vocab}")
+    print(f"{'selectivity':>11} {'rows':>8} | {'full+slice (ms)':>15} {'candidate (ms)':>15} {'speedup':>8}")
+    for sel in SELECTIVITIES:
+        n_cand = max(1, int(args.rows * sel))
+        rows = np.sort(rng.choice(args.rows, n_cand, replace=False))
+        # 100% = không lọc -> đường full scan
+        cand_rows = None if n_cand == args.rows else rows
+
+        def old():
+            cosine_similarity(q_sparse, tfidf).flatten()[rows]
+            cosine_similarity(q_dense, dense).flatten()[rows]
+
+        def new():
+            engine._score_rows(q_sparse, tfidf, cand_rows)
+            engine._score_rows(q_dense, dense, cand_rows)
+
+        t_old = timeit(old, args.repeat)
+        t_new = timeit(new, args.repeat)
+        print(f"{sel:>10.1%} {n_cand:>8} | {t_old:>15.2f} {t_new:>15.2f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+So sánh thời gian khởi động + RSS khi nạp dữ liệu job: Excel (openpyxl) vs snapshot Arrow.
+Mỗi cách đo trong 1 process mới (giống 1 uvicorn worker khởi động).
+
+Chạy từ thư mục backend (cần snapshot: python -m scripts.build_data_snapshot):
+    python -m scripts.bench_data_load
+"""
+import multiprocessing as mp
+import resource
+import time
+
+from app.config import settings
+
+
+def _rss_mb():
+    # Đọc RSS hiện tại từ /proc (Linux)
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+
+
+def _load(source, queue):
+    from app.services.job_store import prepare_jobs, read_excel_source, read_snapshot
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    if source == "excel":
+        df = read_excel_source(settings.DATA_PATH)
+    else:
+        df = read_snapshot(settings.DATA_SNAPSHOT_PATH)
+    df = prepare_jobs(df)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((len(df), elapsed, rss_before, _rss_mb(), peak_mb))
+
+
+def main():
+    ctx = mp.get_context("spawn")
+    print(f"{'source':>8} | {'rows':>7} {'load (s)':>9} {'RSS before':>11} {'RSS after':>10} {'peak RSS':>9}")
+    for source in ("excel", "snapshot"):
+        queue = ctx.Queue()
+        p = ctx.Process(target=_load, args=(source, queue))
+        p.start()
+        rows, elapsed, before, after, peak = queue.get()
+        p.join()
+        print(f"{source:>8} | {rows:>7} {elapsed:>9.2f} {before:>9.0f}MB {after:>8.0f}MB {peak:>7.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
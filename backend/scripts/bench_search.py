@@ -0,0 +1,301 @@
+"""
+Benchmark chất lượng + độ trễ cho các model_name của SearchEngine.search trên bộ nhãn trong evalutation/:
+- query: kq.xlsx, nhãn: eval_with_gt_min2.xlsx (gộp nhãn của mọi model, job chưa gán nhãn = không liên quan)
+- chất lượng: R@k, P@k, NDCG@k, MRR@k, judged@k (k mặc định 5 10 20)
+- độ trễ mỗi query: p50 / p95 / p99 + trung bình từng stage (preprocess, encode, score, topk, serialize).
+  Mặc định xóa cache query trước mỗi query (đo cả tiền xử lý + encode), --warm-cache để giữ cache.
+- cột ref_NDCG@10: số liệu đã báo cáo trong eval_min2_final2.xlsx (nếu model có trong bảng)
+Tên model theo bảng đánh giá: "bge basic" -> model_name bge_m3 + search_type title,
+"bge upgrade" -> overall. Thêm "bm25 ..." và "ensemble_fast ..." (không có trong bảng nhãn gốc).
+
+--stub: chạy offline, không cần thư mục model:
+- transformer -> encoder giả (băm token thành vector --stub-dim chiều), embedding job tính lại bằng encoder giả
+- TF-IDF chưa có file -> fit lại trên cột text đã xử lý
+- chưa có file dữ liệu -> corpus = các job đã gán nhãn trong kq.xlsx
+- Word2Vec / Doc2Vec chưa có file -> bỏ qua
+Điểm chất lượng ở chế độ stub chỉ để kiểm tra pipeline, không so được với model thật.
+
+Chạy từ thư mục backend:
+    python -m scripts.bench_search --out bench.json
+    python -m scripts.bench_search --stub --models "bge basic" "tfidf upgrade" "ensemble upgrade"
+    python -m scripts.bench_search --compare bench.json   # exit 1 nếu chất lượng giảm quá --tolerance
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.config import BASE_DIR, settings
+from app.services.timing import STAGES, record_stages, stage
+from scripts.eval_ensemble_fast import load_eval_set, ranking_metrics
+
+MODEL_NAMES = {
+    "tfidf": "tfidf", "bm25": "bm25",
+    "w2v": "w2v", "w2v_sg": "w2v_sg",
+    "doc2vec": "doc2vec", "doc2vec_dbow": "doc2vec_dbow",
+    "labse": "labse", "bge": "bge_m3", "mpnet": "mpnet",
+    "ensemble": "ensemble", "ensemble_fast": "ensemble_fast",
+}
+VARIANTS = {"basic": "title", "upgrade": "overall"}
+EXTRA_MODELS = ["bm25 basic", "bm25 upgrade", "ensemble_fast basic", "ensemble_fast upgrade"]
+QUALITY = ("R", "P", "NDCG", "MRR")
+
+
+def parse_model(label):
+    """'bge basic' -> ('bge_m3', 'title')"""
+    short, variant = label.rsplit(" ", 1)
+    return MODEL_NAMES[short], VARIANTS[variant]
+
+
+def load_reference(eval_dir):
+    """Số liệu đã báo cáo theo model (eval_min2_final2.xlsx), {} nếu không có file."""
+    path = os.path.join(eval_dir, "eval_min2_final2.xlsx")
+    if not os.path.exists(path): return {}
+    table = pd.read_excel(path).dropna(subset=["model"])
+    cols = [c for c in table.columns if "@" in str(c)]
+    return {row["model"]: {c: float(row[c]) for c in cols} for _, row in table.iterrows()}
+
+
+# ------------------ STUB (offline) ------------------
+class StubEncoder:
+    """Encoder giả thay SentenceTransformer: mỗi token băm vào 1 chiều (dấu +/-), chuẩn hóa L2."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def encode(self, sentences, normalize_embeddings=False, batch_size=32, **kwargs):
+        if isinstance(sentences, str): sentences = [sentences]
+        out = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for i, text in enumerate(sentences):
+            for token in str(text).lower().split():
+                h = zlib.crc32(token.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.where(norms > 0, norms, 1.0)
+        return out
+
+
+def stub_jobs(eval_dir):
+    """Corpus offline: các job đã gán nhãn trong kq.xlsx (đủ cột như file dữ liệu gốc)."""
+    from app.services.job_store import prepare_jobs
+
+    kq = pd.read_excel(os.path.join(eval_dir, "kq.xlsx"))
+    jobs = kq.drop_duplicates("id").drop(
+        columns=["model_short", "model_type", "query_id", "query_text", "rank", "job_id", "score", "label"],
+        errors="ignore"
+    ).reset_index(drop=True)
+    return prepare_jobs(jobs)
+
+
+def prepare_stub_artifacts(df, out_dir, dim):
+    """Dựng embedding giả cho transformer, fit TF-IDF nếu thiếu file; trỏ settings sang các file này."""
+    encoder = StubEncoder(dim)
+    for family in ("mpnet", "bge_m3", "labse"):
+        for variant, field in VARIANTS.items():
+            key = f"{family}_{variant}"
+            path = os.path.join(out_dir, f"{key}_{field}.npy")
+            np.save(path, encoder.encode(df[settings.EMBEDDING_TEXT_COLUMNS[field]].fillna("").astype(str).tolist()))
+            settings.EMBEDDING_PATHS[key] = {"title": None, "overall": None, field: path}
+
+    for variant, field in VARIANTS.items():
+        key = f"tfidf_{variant}"
+        if os.path.exists(settings.MODEL_PATHS[key]) and os.path.exists(settings.EMBEDDING_PATHS[key]):
+            continue
+        vectorizer = TfidfVectorizer(token_pattern=r"(?u)\b\w+\b")
+        matrix = vectorizer.fit_transform(df[settings.TFIDF_TEXT_COLUMNS[key]].fillna("").astype(str))
+        settings.MODEL_PATHS[key] = os.path.join(out_dir, f"{key}.joblib")
+        settings.EMBEDDING_PATHS[key] = os.path.join(out_dir, f"{key}_matrix.pkl")
+        joblib.dump(vectorizer, settings.MODEL_PATHS[key])
+        joblib.dump(matrix, settings.EMBEDDING_PATHS[key])
+
+
+def make_stub_engine(df, dim):
+    from app.services.search_engine import SearchEngine
+
+    class StubSearchEngine(SearchEngine):
+        def _jobs_df(self):
+            return df
+
+        def _load_transformer(self, key):
+            if key in self.models: return
+            self.models[key] = StubEncoder(dim)
+            self.load_embeddings(key)
+
+    return StubSearchEngine()
+
+
+def model_available(model_name, field):
+    """Stub: Word2Vec / Doc2Vec cần file model thật."""
+    if "w2v" not in model_name and "doc2vec" not in model_name:
+        return True
+    base = "w2v_doc2vec" if "doc2vec" in model_name else "w2v_average"
+    suffix = "basic" if field == "title" else "upgrade"
+    key = f"{base}_{suffix}" + ("_dbow" if "dbow" in model_name else "_sg" if "_sg" in model_name else "")
+    return os.path.exists(settings.MODEL_PATHS.get(key, ""))
+
+
+# ------------------ RUN ------------------
+def run_model(engine, df, cards, queries, model_name, field, top_k, cold_cache):
+    from app.services.search_engine import frame_rows
+
+    for text in queries.values():  # Lượt làm nóng: load model, dựng index lười
+        engine.search(text, df, model_name, field, top_k)
+
+    results, totals, stage_ms = {}, [], []
+    for qid, text in queries.items():
+        if cold_cache: engine.query_cache.invalidate()
+        with record_stages() as times:
+            start = time.perf_counter()
+            rows, scores = frame_rows(engine.search(text, df, model_name, field, top_k))
+            with stage("serialize"):
+                cards.render(rows, scores)
+            totals.append((time.perf_counter() - start) * 1000)
+        stage_ms.append(times)
+        results[qid] = df["id"].to_numpy()[rows].tolist()
+    return results, totals, stage_ms
+
+
+def summarize(results, totals, stage_ms, relevant, judged, ks):
+    summary = {}
+    for k in ks:
+        rows = [ranking_metrics(ids, relevant.get(qid, set()), judged.get(qid, set()), k) for qid, ids in results.items()]
+        summary.update({m: float(np.mean([r[m] for r in rows])) for m in rows[0]})
+    summary["empty"] = sum(1 for ids in results.values() if not ids)
+
+    totals = np.asarray(totals)
+    summary["latency_ms"] = {
+        "mean": float(totals.mean()),
+        "p50": float(np.percentile(totals, 50)),
+        "p95": float(np.percentile(totals, 95)),
+        "p99": float(np.percentile(totals, 99)),
+    }
+    per_stage = {name: np.array([t.get(name, 0.0) for t in stage_ms]) for name in STAGES}
+    per_stage["other"] = totals - sum(per_stage.values())
+    summary["stages_ms"] = {name: {"mean": float(v.mean()), "p95": float(np.percentile(v, 95))}
+                            for name, v in per_stage.items()}
+    return summary
+
+
+def compare(report, baseline_path, tolerance):
+    """In chênh lệch so với 1 lần chạy trước; trả về số chỉ số chất lượng giảm quá tolerance."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["model"]: r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nSo với {baseline_path} (giảm > {tolerance} -> ❌)")
+    for r in report["results"]:
+        old = baseline.get(r["model"])
+        if old is None: continue
+        deltas = []
+        for metric, value in r.items():
+            if metric.split("@")[0] not in QUALITY or metric not in old: continue
+            delta = value - old[metric]
+            if delta < -tolerance:
+                regressions += 1
+                deltas.append(f"❌ {metric} {delta:+.3f}")
+            elif abs(delta) >= 5e-4:
+                deltas.append(f"{metric} {delta:+.3f}")
+        ratio = r["latency_ms"]["p95"] / max(old["latency_ms"]["p95"], 1e-9)
+        print(f"{r['model']:>22} | p95 x{ratio:.2f} | " + (", ".join(deltas) or "chất lượng không đổi"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval-dir", default=os.path.join(BASE_DIR, "evalutation"))
+    parser.add_argument("--models", nargs="+", help='Tên theo bảng đánh giá, vd: "bge basic" "tfidf upgrade"')
+    parser.add_argument("--k", nargs="+", type=int, default=[5, 10, 20])
+    parser.add_argument("--warm-cache", action="store_true", help="Giữ cache query giữa các query (mặc định xóa)")
+    parser.add_argument("--stub", action="store_true", help="Encoder giả, chạy offline không cần thư mục model")
+    parser.add_argument("--stub-dim", type=int, default=256)
+    parser.add_argument("--out", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của 1 lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    queries, relevant, judged = load_eval_set(args.eval_dir)
+    reference = load_reference(args.eval_dir)
+    labels = args.models or (
+        pd.read_excel(os.path.join(args.eval_dir, "eval_with_gt_min2.xlsx"))["model"].drop_duplicates().tolist()
+        + EXTRA_MODELS
+    )
+
+    has_data = os.path.exists(settings.DATA_SNAPSHOT_PATH) or os.path.exists(settings.DATA_PATH)
+    stub_dir = tempfile.TemporaryDirectory() if args.stub else None
+    if args.stub:
+        if has_data:
+            from app.services.data_loader import data_loader
+            df = data_loader.df
+        else:
+            df = stub_jobs(args.eval_dir)
+        prepare_stub_artifacts(df, stub_dir.name, args.stub_dim)
+        engine = make_stub_engine(df, args.stub_dim)
+    else:
+        from app.services.data_loader import data_loader
+        from app.services.search_engine import search_engine
+        df, engine = data_loader.df, search_engine
+
+    from app.services.job_cards import JobCardStore
+    cards = JobCardStore(df)
+    top_k = max(args.k)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "stub": args.stub, "cold_cache": not args.warm_cache,
+            "n_queries": len(queries), "n_jobs": len(df), "k": args.k,
+            "settings": {name: getattr(settings, name) for name in (
+                "PREPROCESS_TOKENIZER", "EMBEDDING_QUANTIZATION", "ANN_ENABLED", "SPARSE_SCORING",
+                "ENSEMBLE_FAST_POOL", "ENCODER_BATCH_WINDOW_MS")},
+        },
+        "results": [],
+    }
+
+    for label in labels:
+        model_name, field = parse_model(label)
+        if args.stub and not model_available(model_name, field):
+            print(f"⚠️ {label}: thiếu file model -> bỏ qua (stub)")
+            continue
+        results, totals, stage_ms = run_model(engine, df, cards, queries, model_name, field, top_k, not args.warm_cache)
+        summary = summarize(results, totals, stage_ms, relevant, judged, args.k)
+        if summary["empty"]:
+            print(f"⚠️ {label}: {summary['empty']}/{len(queries)} query không có kết quả (model chưa load được?)")
+        if label in reference and not args.stub:
+            summary["reference"] = reference[label]
+        report["results"].append({"model": label, "model_name": model_name, "search_type": field, **summary})
+
+    ks = [k for k in (10,) if k in args.k] or args.k[:1]
+    k = ks[0]
+    cols = [f"R@{k}", f"P@{k}", f"NDCG@{k}", f"MRR@{k}"]
+    print(f"\n{len(queries)} query | {len(df)} job" + (" | STUB" if args.stub else ""))
+    print(f"{'model':>22} | " + " ".join(f"{c:>8}" for c in cols) + f" {'ref':>6} | "
+          + " ".join(f"{c:>6}" for c in ("p50", "p95", "p99")) + " | " + " ".join(f"{s[:6]:>6}" for s in STAGES))
+    for r in report["results"]:
+        ref = r.get("reference", {}).get(f"NDCG@{k}")
+        lat, st = r["latency_ms"], r["stages_ms"]
+        print(f"{r['model']:>22} | " + " ".join(f"{r[c]:>8.3f}" for c in cols)
+              + (f" {ref:>6.3f}" if ref is not None else f" {'-':>6}") + " | "
+              + " ".join(f"{lat[p]:>6.1f}" for p in ("p50", "p95", "p99")) + " | "
+              + " ".join(f"{st[s]['mean']:>6.2f}" for s in STAGES))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Đã ghi {args.out}")
+
+    if args.compare and compare(report, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
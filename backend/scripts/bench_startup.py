@@ -0,0 +1,85 @@
+"""
+Thời gian khởi động của backend, mỗi phần đo trong 1 process mới (giống 1 uvicorn worker khởi động):
+1. Import: `python -X importtime -c "import app.main"` -> tổng thời gian import + các package tốn nhất
+   (thư viện nặng như torch / gensim / underthesea chỉ được import khi load model đầu tiên của họ đó)
+2. Time-to-ready: import app.main rồi chạy warmup (song song WARMUP_WORKERS thread) như lifespan của server,
+   in thời gian từng artifact. --workers 1 để so với nạp tuần tự.
+
+Chạy từ thư mục backend:
+    python -m scripts.bench_startup
+    python -m scripts.bench_startup --workers 1
+"""
+import argparse
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import time
+
+from app.config import BASE_DIR
+
+BACKEND_DIR = os.path.join(BASE_DIR, "backend")
+
+
+def import_breakdown():
+    """-> (tổng giây import app.main, {module app.*: giây}, {package gốc: giây}) - giây cumulative"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                         cwd=BACKEND_DIR, capture_output=True, text=True)
+    app_modules, packages = {}, {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2: continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit(): continue  # dòng tiêu đề
+        seconds, name = int(cumulative) / 1e6, name.strip()
+        if name.startswith("app."):
+            app_modules[name] = seconds
+        elif "." not in name:
+            packages[name] = seconds  # lần import đầu của package (gồm cả module con)
+    return app_modules.get("app.main", 0.0), app_modules, packages
+
+
+def _print_top(title, seconds_by_name, top):
+    print(title)
+    for name, seconds in sorted(seconds_by_name.items(), key=lambda x: -x[1])[:top]:
+        print(f"  {name:<40} {seconds:>7.3f}s")
+
+
+def _time_to_ready(workers, queue):
+    os.environ["WARMUP_WORKERS"] = str(workers)
+    start = time.perf_counter()
+    import app.main
+    import_seconds = time.perf_counter() - start
+    report = app.main.warmup.run().report()
+    queue.put((import_seconds, report))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None, help="Số thread warmup (mặc định WARMUP_WORKERS)")
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    total, app_modules, packages = import_breakdown()
+    print(f"Import app.main: {total:.2f}s")
+    _print_top("Module của app (cumulative):", {k: v for k, v in app_modules.items() if k != "app.main"}, args.top)
+    _print_top("Package (lần import đầu, cumulative):", packages, args.top)
+
+    from app.config import settings
+    workers = args.workers or settings.WARMUP_WORKERS
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    p = ctx.Process(target=_time_to_ready, args=(workers, queue))
+    p.start()
+    import_seconds, report = queue.get()
+    p.join()
+
+    print(f"\nWarmup ({workers} thread): {report['seconds']:.2f}s | "
+          f"{report['loaded']}/{report['total']} artifact | ready={report['ready']}")
+    for name, info in sorted(report["artifacts"].items(), key=lambda x: -(x[1]["seconds"] or 0)):
+        error = f"  ({info['error']})" if info.get("error") else ""
+        print(f"  {name:<20} {info['state']:<8} {info['seconds'] or 0:>7.2f}s{error}")
+    print(f"\nTime-to-ready (import + warmup): {import_seconds + report['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
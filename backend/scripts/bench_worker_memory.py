@@ -0,0 +1,91 @@
+"""
+So sánh bộ nhớ khi chạy 1 / 2 / 4 worker, mỗi worker nạp toàn bộ ma trận embedding + TF-IDF:
+- load: np.load / joblib.load đầy đủ (mỗi process 1 bản riêng)
+- mmap: memory-map read-only (các process dùng chung page cache)
+
+RSS đếm cả trang dùng chung nên cộng RSS các worker sẽ đếm trùng; PSS chia đều trang
+dùng chung cho các process -> tổng PSS ~ bộ nhớ vật lý thực tế. Chỉ chạy trên Linux.
+
+Chạy từ thư mục backend:
+    python -m scripts.bench_worker_memory
+    python -m scripts.bench_worker_memory --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing as mp
+
+
+from app.config import settings
+
+
+def _memory_mb():
+    """(RSS, PSS) MB của process hiện tại, đọc từ /proc/self/smaps_rollup."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values.get("Rss:", 0.0), values.get("Pss:", 0.0)
+
+
+def _matrix_paths():
+    paths = []
+    for key, conf in settings.EMBEDDING_PATHS.items():
+        if isinstance(conf, dict):
+            paths += [(key, p) for p in conf.values() if p]
+        else:
+            paths.append((key, conf))
+    return paths
+
+
+def _worker(mode, paths, barrier, queue):
+    from app.services.matrix_store import load_dense, load_sparse
+
+    base_rss, base_pss = _memory_mb()
+    matrices = []
+    for key, path in paths:
+        try:
+            if key.startswith("tfidf"):
+                matrices.append(load_sparse(path, mmap=mode == "mmap"))
+            else:
+                matrices.append(load_dense(path, mmap=mode == "mmap"))
+        except FileNotFoundError:
+            continue
+
+    # Chạm vào mọi trang (giống 1 lượt quét full corpus khi search)
+    total = 0.0
+    for m in matrices:
+        total += float(m.sum())
+
+    barrier.wait()  # Đo khi tất cả worker cùng đang giữ ma trận
+    rss, pss = _memory_mb()
+    barrier.wait()  # Chưa worker nào thoát trước khi các worker khác đo xong
+    queue.put((len(matrices), rss - base_rss, pss - base_pss))
+
+
+def run(mode, n_workers):
+    ctx = mp.get_context("spawn")
+    barrier, queue = ctx.Barrier(n_workers), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(mode, _matrix_paths(), barrier, queue)) for _ in range(n_workers)]
+    for p in procs: p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs: p.join()
+    n_matrices = results[0][0]
+    return n_matrices, sum(r[1] for r in results), sum(r[2] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    args = parser.parse_args()
+
+    print("Tăng bộ nhớ do ma trận (tổng trên các worker):")
+    print(f"{'mode':>5} {'workers':>8} | {'matrices':>8} {'sum RSS':>10} {'sum PSS':>10}")
+    for mode in ("load", "mmap"):
+        for n in args.workers:
+            n_matrices, rss, pss = run(mode, n)
+            print(f"{mode:>5} {n:>8} | {n_matrices:>8} {rss:>8.0f}MB {pss:>8.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Dựng ANN index (HNSW) từ các file embedding .npy trong settings.EMBEDDING_PATHS.
+Index được lưu cạnh file .npy (job_xxx.hnsw + job_xxx.hnsw.json) và load lúc warmup
+khi ANN_ENABLED=1. ef_search được hiệu chỉnh trên query trong evalutation/kq.xlsx (encode bằng chính model);
+không có thì trên các dòng corpus cộng nhiễu (bỏ chính dòng đó khi đo recall).
+
+Chạy từ thư mục backend:
+    python -m scripts.build_ann_index
+    python -m scripts.build_ann_index --keys bge_m3_basic bge_m3_upgrade --recall 0.98 --k 20
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.config import BASE_DIR, settings
+from app.services.ann_index import AnnIndex, ann_index_path
+
+TRANSFORMER_FAMILIES = ("mpnet", "bge_m3", "labse")
+
+
+def eval_query_vectors(key, limit):
+    """Query trong evalutation/kq.xlsx, tiền xử lý + encode như lúc search. None nếu không có / không load được model."""
+    kq_path = os.path.join(BASE_DIR, "evalutation", "kq.xlsx")
+    if not limit or not os.path.exists(kq_path): return None
+    from app.services.search_engine import search_engine
+    encode = search_engine.job_encoder(key)
+    if encode is None: return None
+    raw = pd.read_excel(kq_path)["query_text"].dropna().drop_duplicates().head(limit).tolist()
+    queries = [q for q in search_engine.preprocess_many(raw) if q]
+    vectors = np.asarray(encode(queries), dtype=np.float32) if queries else None
+    search_engine.registry.release(key)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", nargs="*", help="Model key (mặc định: toàn bộ MPNet / BGE-M3 / LaBSE)")
+    parser.add_argument("--M", type=int, default=settings.ANN_M)
+    parser.add_argument("--ef-construction", type=int, default=settings.ANN_EF_CONSTRUCTION)
+    parser.add_argument("--k", type=int, default=settings.ANN_RECALL_K, help="k dùng để đo recall@k")
+    parser.add_argument("--recall", type=float, default=settings.ANN_TARGET_RECALL, help="recall@k mục tiêu")
+    parser.add_argument("--queries", type=int, default=500,
+                        help="Số query eval dùng hiệu chỉnh ef_search (0 -> dòng corpus cộng nhiễu)")
+    args = parser.parse_args()
+
+    keys = args.keys or [k for k in settings.EMBEDDING_PATHS if k.startswith(TRANSFORMER_FAMILIES)]
+    for key in keys:
+        queries = eval_query_vectors(key, args.queries)
+        for field, path in (settings.EMBEDDING_PATHS.get(key) or {}).items():
+            if not path: continue
+            if not os.path.exists(path):
+                print(f"⚠️ Bỏ qua {key}_{field}: không tìm thấy {path}")
+                continue
+
+            embeddings = np.load(path, mmap_mode="r")
+            start = time.perf_counter()
+            index = AnnIndex.build(embeddings, M=args.M, ef_construction=args.ef_construction)
+            build_time = time.perf_counter() - start
+            ef, recall = index.calibrate(embeddings, k=args.k, target_recall=args.recall, queries=queries)
+
+            out = ann_index_path(path)
+            index.save(out)
+            print(f"✅ {key}_{field}: {embeddings.shape} | build {build_time:.1f}s | "
+                  f"ef_search={ef} recall@{args.k}={recall:.3f} ({index.meta['calibration']}) -> {out}")
+
+
+if __name__ == "__main__":
+    main()
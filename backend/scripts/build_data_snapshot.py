@@ -0,0 +1,39 @@
+"""
+Chuyển file Excel dữ liệu (settings.DATA_PATH) thành snapshot cột Arrow IPC
+(settings.DATA_SNAPSHOT_PATH). DataLoader sẽ memory-map snapshot này lúc khởi động
+và chỉ đọc Excel khi snapshot không có hoặc cũ hơn file Excel. Cần pyarrow.
+
+Chạy từ thư mục backend:
+    python -m scripts.build_data_snapshot
+"""
+import argparse
+import os
+import time
+
+from app.config import settings
+from app.services.job_store import prepare_jobs, read_excel_source, write_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default=settings.DATA_PATH)
+    parser.add_argument("--out", default=settings.DATA_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = prepare_jobs(read_excel_source(args.source))
+    read_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    converted = write_snapshot(df, args.out)
+    write_time = time.perf_counter() - start
+
+    if converted:
+        print(f"⚠️ Cột lẫn kiểu đã chuyển về chuỗi: {converted}")
+    size_mb = os.path.getsize(args.out) / 1024 / 1024
+    print(f"✅ {len(df)} dòng | đọc Excel {read_time:.1f}s | ghi snapshot {write_time:.2f}s "
+          f"({size_mb:.1f} MB) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Dựng lại offline toàn bộ ma trận embedding / TF-IDF của corpus (các file settings.EMBEDDING_PATHS) từ 1 manifest:
+1. Đọc job theo khối từ snapshot Arrow (memory-map; không có thì file Excel), tách từ bằng process pool
+   (chỉ khi thiếu cột *_processed hoặc --reprocess). Text đã xử lý lưu theo khối trong --work-dir.
+2. Từng model trong manifest: mỗi khối sort theo độ dài text rồi encode theo batch lớn (ít padding),
+   ghi thẳng vào file .npy (open_memmap) -> server memory-map được ngay. TF-IDF: chỉ transform
+   (không fit lại) từng khối rồi ghép thành .pkl + các file .npy memory-map.
+3. Tiến độ ghi sau mỗi khối: chạy lại đúng lệnh -> làm tiếp từ khối dở (model / dữ liệu đổi -> làm lại).
+Encode bằng đúng hàm SearchEngine dùng khi ingest job mới -> vector khớp với job thêm sau.
+In tốc độ (docs/s) từng model.
+
+Chạy từ thư mục backend:
+    python -m scripts.build_embeddings                                  # cả 16 model, ghi đè file trong settings
+    python -m scripts.build_embeddings --write-manifest build.json      # manifest mặc định để sửa
+    python -m scripts.build_embeddings --manifest build.json --out-dir /data/embeddings_new
+    python -m scripts.build_embeddings --models tfidf_basic bert_base_uncased --workers 8
+Sau khi dựng lại cần dựng lại các bản phụ (build_inverted_index, build_quantized_index, build_ann_index,
+build_similar_jobs). Dữ liệu nguồn không gồm job ingest (segment) -> xóa SEGMENTS_DIR nếu ghi đè tại chỗ.
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+from scipy import sparse
+
+from app.config import BASE_DIR, settings
+from app.services.job_store import feather, overall_texts, read_excel_source, snapshot_is_fresh
+from app.services.matrix_store import save_sparse_mmap, sparse_mmap_paths
+from app.services.text_preprocess import TextPreprocessor, load_stopwords
+
+CHUNK_ROWS = 8192
+# Text / tiến trình tách từ mỗi lần gửi sang process pool
+PREPROCESS_BATCH = 256
+# Batch encode mặc định theo họ model (transformer tốn RAM theo batch x độ dài)
+BATCH_SIZES = {"tfidf": 0, "w2v": 1024, "transformer": 128}
+
+
+def model_family(key):
+    if key.startswith("tfidf"): return "tfidf"
+    if key.startswith("w2v"): return "w2v"
+    return "transformer"
+
+
+def default_manifest():
+    """Mọi model trong settings.MODEL_PATHS, mọi trường embedding, ghi vào đúng file settings trỏ tới."""
+    return {
+        "chunk_rows": CHUNK_ROWS,
+        "models": [
+            {"key": key, "batch_size": BATCH_SIZES[model_family(key)]}
+            for key in settings.MODEL_PATHS if key in settings.EMBEDDING_PATHS
+        ],
+    }
+
+
+def output_paths(entry, out_dir):
+    """field -> file đích ('matrix' với TF-IDF): 'outputs' trong manifest > out_dir/tên file gốc > file gốc."""
+    paths = settings.EMBEDDING_PATHS[entry["key"]]
+    if not isinstance(paths, dict):
+        paths = {"matrix": paths}
+    fields = entry.get("fields") or [f for f, p in paths.items() if p]
+    custom = entry.get("outputs", {})
+    return {
+        field: custom.get(field) or (os.path.join(out_dir, os.path.basename(paths[field])) if out_dir else paths[field])
+        for field in fields
+    }
+
+
+# ------------------ TIẾN ĐỘ ------------------
+def read_json(path):
+    if not os.path.exists(path): return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def file_mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+# ------------------ BƯỚC 1: TEXT ------------------
+def source_path():
+    if snapshot_is_fresh(settings.DATA_SNAPSHOT_PATH, settings.DATA_PATH):
+        return settings.DATA_SNAPSHOT_PATH
+    return settings.DATA_PATH
+
+
+def iter_job_chunks(chunk_rows, columns, first_chunk=0):
+    """DataFrame từng khối chunk_rows job (chỉ các cột cần, theo thứ tự row id), bắt đầu từ khối first_chunk."""
+    path = source_path()
+    if path == settings.DATA_SNAPSHOT_PATH:
+        table = feather.read_table(path, memory_map=True)
+        table = table.select([c for c in columns if c in table.column_names])
+        for start in range(first_chunk * chunk_rows, table.num_rows, chunk_rows):
+            yield table.slice(start, chunk_rows).to_pandas()
+        return
+    df = read_excel_source(path)
+    df = df[[c for c in columns if c in df.columns]]
+    for start in range(first_chunk * chunk_rows, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+_preprocessor = None
+
+
+def _init_worker(tokenizer, vocabulary):
+    global _preprocessor
+    _preprocessor = TextPreprocessor(load_stopwords(settings.STOPWORDS_PATH), tokenizer)
+    if vocabulary is not None:
+        _preprocessor.set_vocabulary(vocabulary)
+
+
+def _preprocess(texts):
+    return _preprocessor.preprocess_many(texts)
+
+
+def make_pool(workers):
+    """Process pool tách từ, mỗi tiến trình 1 TextPreprocessor cấu hình như SearchEngine."""
+    tokenizer, vocabulary = settings.PREPROCESS_TOKENIZER, None
+    if tokenizer == "longest_match":
+        vocabulary = list(joblib.load(settings.MODEL_PATHS[settings.TOKENIZER_VOCAB_KEY]).vocabulary_)
+    return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tokenizer, vocabulary))
+
+
+def raw_texts(df, field):
+    if field == "title":
+        return df["title"].fillna("").astype(str).tolist()
+    if "overall_text" in df.columns:
+        return df["overall_text"].fillna("").astype(str).tolist()
+    return overall_texts(df)
+
+
+def prepare_texts(work_dir, chunk_rows, workers, reprocess):
+    """
+    Bước 1: text đã tiền xử lý (title / overall) từng khối -> work_dir/texts/NNNNN.pkl.
+    Khối đã có (cùng nguồn, cùng tham số) được dùng lại. -> trạng thái {"fingerprint", "chunks", "n_rows"}.
+    """
+    texts_dir = os.path.join(work_dir, "texts")
+    state_path = os.path.join(texts_dir, "state.json")
+    path = source_path()
+    fingerprint = {"source": path, "mtime": file_mtime(path), "chunk_rows": chunk_rows,
+                   "reprocess": reprocess, "tokenizer": settings.PREPROCESS_TOKENIZER}
+    state = read_json(state_path)
+    if state is None or state["fingerprint"] != fingerprint:
+        shutil.rmtree(texts_dir, ignore_errors=True)
+        os.makedirs(texts_dir)
+        state = {"fingerprint": fingerprint, "chunks": [], "n_rows": 0, "done": False}
+    if state["done"]:
+        print(f"📂 Text: dùng lại {len(state['chunks'])} khối ({state['n_rows']} job) trong {texts_dir}")
+        return state
+
+    columns = list(dict.fromkeys(["title", "overall_text", "description", "requirements", "benefit"]
+                                 + list(settings.EMBEDDING_TEXT_COLUMNS.values())))
+    pool, n_processed = None, 0
+    start = time.perf_counter()
+    try:
+        for i, df in enumerate(iter_job_chunks(chunk_rows, columns, len(state["chunks"])), len(state["chunks"])):
+            texts = {}
+            for field, col in settings.EMBEDDING_TEXT_COLUMNS.items():
+                if col in df.columns and not reprocess:
+                    texts[field] = df[col].fillna("").astype(str).tolist()
+                    continue
+                raw = raw_texts(df, field)
+                pool = pool or make_pool(workers)
+                batches = [raw[j:j + PREPROCESS_BATCH] for j in range(0, len(raw), PREPROCESS_BATCH)]
+                texts[field] = [t for batch in pool.map(_preprocess, batches) for t in batch]
+                n_processed += len(raw)
+            name = f"{i:05d}.pkl"
+            with open(os.path.join(texts_dir, name), "wb") as f:
+                pickle.dump(texts, f, protocol=pickle.HIGHEST_PROTOCOL)
+            state["chunks"].append({"name": name, "rows": len(df)})
+            state["n_rows"] += len(df)
+            write_json(state_path, state)
+    finally:
+        if pool is not None: pool.shutdown()
+    state["done"] = True
+    write_json(state_path, state)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Text: {state['n_rows']} job, {len(state['chunks'])} khối, tách từ {n_processed} text "
+          f"({workers} tiến trình) | {elapsed:.1f}s")
+    return state
+
+
+def read_chunk(work_dir, chunk):
+    with open(os.path.join(work_dir, "texts", chunk["name"]), "rb") as f:
+        return pickle.load(f)
+
+
+# ------------------ BƯỚC 2: ENCODE ------------------
+def encode_sorted(encode, texts, batch_size):
+    """Encode theo batch text dài gần nhau (sort theo độ dài -> ít padding), trả về đúng thứ tự ban đầu."""
+    order = np.argsort([-len(t) for t in texts], kind="stable")
+    out = None
+    for start in range(0, len(texts), batch_size):
+        rows = order[start:start + batch_size]
+        vectors = np.asarray(encode([texts[i] for i in rows]), dtype=np.float32)
+        if out is None:
+            out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        out[rows] = vectors
+    return out
+
+
+def build_dense(engine, entry, outputs, work_dir, state):
+    """Ma trận .npy từng trường của model dense, ghi dần qua open_memmap. -> {field: (số job, giây)}."""
+    key = entry["key"]
+    encode = engine.job_encoder(key, entry.get("batch_size"))
+    if encode is None:
+        print(f"❌ {key}: không load được model")
+        return {}
+    batch_size = entry.get("batch_size") or BATCH_SIZES["w2v"]
+    fingerprint = dict(state["fingerprint"], model=file_mtime(settings.MODEL_PATHS[key]))
+    stats = {}
+    for field, out in outputs.items():
+        partial, progress_path = out + ".partial.npy", out + ".progress.json"
+        progress = read_json(progress_path)
+        matrix, done = None, 0
+        if progress and progress["fingerprint"] == fingerprint and os.path.exists(partial):
+            matrix, done = np.lib.format.open_memmap(partial, mode="r+"), progress["chunks_done"]
+            print(f"📂 {key}/{field}: làm tiếp từ khối {done}/{len(state['chunks'])}")
+
+        offset = sum(c["rows"] for c in state["chunks"][:done])
+        n_docs, start = 0, time.perf_counter()
+        for i, chunk in enumerate(state["chunks"][done:], done):
+            vectors = encode_sorted(encode, read_chunk(work_dir, chunk)[field], batch_size)
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(partial, mode="w+", dtype=np.float32,
+                                                   shape=(state["n_rows"], vectors.shape[1]))
+            matrix[offset:offset + len(vectors)] = vectors
+            matrix.flush()
+            write_json(progress_path, {"fingerprint": fingerprint, "chunks_done": i + 1})
+            offset += len(vectors)
+            n_docs += len(vectors)
+            elapsed = time.perf_counter() - start
+            print(f"🔄 {key}/{field}: {offset}/{state['n_rows']} job ({n_docs / max(elapsed, 1e-9):.0f} docs/s)")
+        del matrix
+        os.replace(partial, out)
+        os.remove(progress_path)
+        stats[field] = (n_docs, time.perf_counter() - start)
+    return stats
+
+
+def build_tfidf(entry, outputs, work_dir, state):
+    """TF-IDF: transform từng khối (vectorizer đã fit) -> .pkl + bản tách .npy memory-map. -> {field: (số job, giây)}."""
+    key = entry["key"]
+    out = outputs["matrix"]
+    field = {col: f for f, col in settings.EMBEDDING_TEXT_COLUMNS.items()}[settings.TFIDF_TEXT_COLUMNS[key]]
+    vectorizer = joblib.load(settings.MODEL_PATHS[key])
+    fingerprint = dict(state["fingerprint"], model=file_mtime(settings.MODEL_PATHS[key]))
+    parts_dir = os.path.join(work_dir, key)
+    progress_path = os.path.join(parts_dir, "progress.json")
+    progress = read_json(progress_path)
+    if progress is None or progress["fingerprint"] != fingerprint:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        os.makedirs(parts_dir)
+        progress = {"fingerprint": fingerprint, "chunks_done": 0}
+    elif progress["chunks_done"]:
+        print(f"📂 {key}: làm tiếp từ khối {progress['chunks_done']}/{len(state['chunks'])}")
+
+    n_docs, start = 0, time.perf_counter()
+    for i, chunk in enumerate(state["chunks"][progress["chunks_done"]:], progress["chunks_done"]):
+        part = vectorizer.transform(read_chunk(work_dir, chunk)[field])
+        sparse.save_npz(os.path.join(parts_dir, f"{i:05d}.npz"), part.tocsr())
+        progress["chunks_done"] = i + 1
+        write_json(progress_path, progress)
+        n_docs += part.shape[0]
+    matrix = sparse.vstack(
+        [sparse.load_npz(os.path.join(parts_dir, f"{i:05d}.npz")) for i in range(len(state["chunks"]))], format="csr"
+    )
+
+    # Ghi file tạm rồi đổi tên: worker đang memory-map bản cũ không đọc phải file ghi dở
+    tmp = out + ".tmp.pkl"
+    joblib.dump(matrix, tmp)
+    tmp_parts = save_sparse_mmap(matrix, tmp)
+    for part, path in sparse_mmap_paths(out).items():
+        os.replace(tmp_parts[part], path)
+    os.replace(tmp, out)
+    shutil.rmtree(parts_dir)
+    return {"matrix": (n_docs, time.perf_counter() - start)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifest", help="File JSON: {chunk_rows, models: [{key, batch_size, fields, outputs}]}")
+    parser.add_argument("--write-manifest", help="Ghi manifest mặc định (mọi model) ra file rồi thoát")
+    parser.add_argument("--models", nargs="+", help="Chỉ dựng các model này (lọc manifest)")
+    parser.add_argument("--out-dir", help="Ghi vào thư mục này thay vì ghi đè file trong settings")
+    parser.add_argument("--work-dir", default=os.path.join(BASE_DIR, "build_embeddings"),
+                        help="Text đã xử lý + tiến độ (để chạy tiếp)")
+    parser.add_argument("--chunk-rows", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Số tiến trình tách từ")
+    parser.add_argument("--reprocess", action="store_true", help="Tách từ lại từ text gốc thay vì dùng cột *_processed")
+    parser.add_argument("--report", help="Ghi tốc độ từng model ra file JSON")
+    args = parser.parse_args()
+
+    if args.write_manifest:
+        write_json(args.write_manifest, default_manifest())
+        print(f"💾 Manifest mặc định -> {args.write_manifest}")
+        return
+
+    manifest = read_json(args.manifest) if args.manifest else default_manifest()
+    entries = [e for e in manifest["models"] if not args.models or e["key"] in args.models]
+    unknown = [e["key"] for e in entries if e["key"] not in settings.EMBEDDING_PATHS]
+    if unknown:
+        raise SystemExit(f"Model không có trong settings.EMBEDDING_PATHS: {unknown}")
+    chunk_rows = args.chunk_rows or manifest.get("chunk_rows", CHUNK_ROWS)
+    os.makedirs(args.work_dir, exist_ok=True)
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    state = prepare_texts(args.work_dir, chunk_rows, max(1, args.workers or 1), args.reprocess)
+
+    from app.services.search_engine import search_engine
+    report = []
+    for entry in entries:
+        key = entry["key"]
+        outputs = output_paths(entry, args.out_dir)
+        if model_family(key) == "tfidf":
+            stats = build_tfidf(entry, outputs, args.work_dir, state)
+        else:
+            stats = build_dense(search_engine, entry, outputs, args.work_dir, state)
+            search_engine.registry.release(key)
+        for field, (n_docs, seconds) in stats.items():
+            rate = n_docs / max(seconds, 1e-9)
+            report.append({"key": key, "field": field, "docs": n_docs, "seconds": round(seconds, 2),
+                           "docs_per_s": round(rate, 1), "output": outputs[field]})
+            print(f"✅ {key}/{field}: {n_docs} job | {seconds:.1f}s | {rate:.0f} docs/s -> {outputs[field]}")
+
+    print(f"\n{'model':<36}{'field':<10}{'docs':>9}{'giây':>9}{'docs/s':>10}")
+    for row in report:
+        print(f"{row['key']:<36}{row['field']:<10}{row['docs']:>9}{row['seconds']:>9.1f}{row['docs_per_s']:>10.0f}")
+    if args.report:
+        write_json(args.report, report)
+    print("⚠️ Nhớ dựng lại inverted index / ANN / quantized / bảng job tương tự cho các ma trận mới")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Dựng inverted index (cosine TF-IDF + BM25) cho các ma trận TF-IDF và lưu cạnh file .pkl
+(tfidf_matrix_x.cosine.*.npy, tfidf_matrix_x.bm25.*.npy). SearchEngine memory-map các file này;
+không có thì tự dựng lúc load (cosine) / lần đầu dùng BM25.
+
+Chạy từ thư mục backend:
+    python -m scripts.build_inverted_index
+    python -m scripts.build_inverted_index --keys tfidf_upgrade --scorings bm25
+"""
+import argparse
+import time
+
+from app.config import settings
+from app.services.inverted_index import SCORINGS, InvertedIndex, term_counts
+from app.services.matrix_store import load_sparse
+
+TFIDF_KEYS = ["tfidf_basic", "tfidf_upgrade"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", nargs="+", default=TFIDF_KEYS)
+    parser.add_argument("--scorings", nargs="+", choices=SCORINGS, default=list(SCORINGS))
+    args = parser.parse_args()
+
+    import joblib
+    df = None
+    if "bm25" in args.scorings:
+        from app.services.data_loader import data_loader
+        df = data_loader.df
+
+    for key in args.keys:
+        path = settings.EMBEDDING_PATHS[key]
+        matrix = load_sparse(path)
+        for scoring in args.scorings:
+            start = time.perf_counter()
+            if scoring == "cosine":
+                index = InvertedIndex.from_tfidf(matrix)
+            else:
+                texts = df[settings.TFIDF_TEXT_COLUMNS[key]].fillna("").astype(str)
+                counts = term_counts(joblib.load(settings.MODEL_PATHS[key]), texts)
+                if counts.shape[0] != matrix.shape[0]:
+                    print(f"⚠️ {key}: dữ liệu có {counts.shape[0]} job, ma trận TF-IDF có {matrix.shape[0]} dòng")
+                index = InvertedIndex.from_counts(counts, settings.BM25_K1, settings.BM25_B)
+            paths = index.save(path)
+            print(f"✅ {key} ({scoring}): {index.n_docs} job x {index.n_terms} term, "
+                  f"{len(index.docs)} posting | {time.perf_counter() - start:.1f}s -> {paths['docs']}")
+
+
+if __name__ == "__main__":
+    main()
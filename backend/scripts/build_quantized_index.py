@@ -0,0 +1,49 @@
+"""
+Dựng bản nén int8 cho các ma trận embedding .npy trong settings.EMBEDDING_PATHS (nhỏ hơn 4 lần).
+Lưu cạnh file gốc (job_xxx.int8.npy + job_xxx.int8.npz), SearchEngine dùng khi
+EMBEDDING_QUANTIZATION=int8. Đo recall: python -m scripts.eval_quantized_recall
+
+Chạy từ thư mục backend:
+    python -m scripts.build_quantized_index
+    python -m scripts.build_quantized_index --keys bge_m3_basic bge_m3_upgrade
+"""
+import argparse
+import os
+import time
+
+from app.config import settings
+from app.services.matrix_store import load_dense
+from app.services.quantized_index import QUANT_KINDS, QuantizedMatrix
+
+
+def dense_embedding_paths(keys=None):
+    """[(emb_key, path)] của các ma trận dense (.npy) đang có trên đĩa."""
+    out = []
+    for key, conf in settings.EMBEDDING_PATHS.items():
+        if not isinstance(conf, dict) or (keys and key not in keys): continue
+        for field, path in conf.items():
+            if not path: continue
+            if not os.path.exists(path):
+                print(f"⚠️ Bỏ qua {key}_{field}: không tìm thấy {path}")
+                continue
+            out.append((f"{key}_{field}", path))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kind", choices=QUANT_KINDS, default="int8")
+    parser.add_argument("--keys", nargs="*", help="Model key (mặc định: toàn bộ ma trận dense)")
+    args = parser.parse_args()
+
+    for emb_key, path in dense_embedding_paths(args.keys):
+        embeddings = load_dense(path)
+        start = time.perf_counter()
+        quantized = QuantizedMatrix.build(embeddings, args.kind)
+        out = quantized.save(path)
+        print(f"✅ {emb_key}: {embeddings.shape} {embeddings.nbytes / 1024 / 1024:.0f} MB -> "
+              f"{args.kind} {quantized.nbytes / 1024 / 1024:.0f} MB | {time.perf_counter() - start:.1f}s -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Dựng bảng top-N job tương tự (Item-to-Item) cho /job/{id}/similar.
+Điểm = Ensemble 0.7 BGE-M3 + 0.3 TF-IDF trên vector đã lưu (giống SearchEngine.item_scores).
+Kết quả lưu ở settings.SIMILAR_JOBS_PATH (ids + scores, shape N x top_n).
+
+Chạy từ thư mục backend:
+    python -m scripts.build_similar_jobs --top-n 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.data_loader import data_loader
+from app.services.ranking import top_k_indices
+from app.services.search_engine import search_engine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-n", type=int, default=settings.SIMILAR_JOBS_TOP_N)
+    parser.add_argument("--out", default=settings.SIMILAR_JOBS_PATH)
+    args = parser.parse_args()
+
+    df = data_loader.df
+    n_jobs = len(df)
+    top_n = min(args.top_n, n_jobs - 1)
+    ids = np.zeros((n_jobs, top_n), dtype=np.int32)
+    scores = np.zeros((n_jobs, top_n), dtype=np.float32)
+
+    start = time.perf_counter()
+    for row in range(n_jobs):
+        s = search_engine.item_scores(row, df)
+        s[row] = -np.inf  # bỏ chính nó
+        top = top_k_indices(s, top_n)
+        ids[row], scores[row] = top, s[top]
+        if (row + 1) % 1000 == 0:
+            print(f"   {row + 1}/{n_jobs} jobs ({(row + 1) / (time.perf_counter() - start):.0f} jobs/s)")
+
+    np.savez(args.out, ids=ids, scores=scores)
+    print(f"✅ Đã lưu bảng láng giềng {ids.shape} -> {args.out} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Kiểm tra độ lệch khi đổi backend suy luận của encoder transformer (settings.ENCODER_BACKENDS):
+- job (lấy mẫu): encode lại bằng cấu hình mới, cosine với vector gốc trong ma trận embedding trên đĩa
+- query trong evalutation/kq.xlsx: cosine giữa cấu hình mới và model gốc (torch, max_seq_length mặc định),
+  độ trùng top-10 job, thời gian encode 1 query của 2 bên
+Đạt khi cosine nhỏ nhất >= ENCODER_DRIFT_MIN_COSINE, không đạt -> exit code 1.
+
+Chạy từ thư mục backend:
+    python -m scripts.check_encoder_drift                      # cấu hình trong settings, mọi transformer
+    python -m scripts.check_encoder_drift --keys bge_m3_upgrade --backend torch_int8 --max-seq-length 128
+    python -m scripts.check_encoder_drift --keys bge_m3_upgrade --export-onnx --quantize avx512_vnni
+        # export onnx/model.onnx (+ onnx/model_qint8_avx512_vnni.onnx) vào thư mục model rồi kiểm tra
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.config import BASE_DIR, settings
+from app.services.encoder_backend import BACKENDS, encoder_options, load_encoder, onnx_files
+from app.services.matrix_store import inverse_row_norms
+from app.services.ranking import top_k_indices
+
+TRANSFORMER_FAMILIES = ("mpnet", "bge_m3", "labse")
+REFERENCE = {"backend": "torch", "max_seq_length": None, "threads": None, "onnx_file": None}
+TOP_K = 10
+
+
+def export_onnx(key, quantize, import_module):
+    """Export bản ONNX (và bản int8 nếu có quantize) vào <thư mục model>/onnx. -> file onnx nên dùng."""
+    st = import_module("sentence_transformers")
+    path = settings.MODEL_PATHS[key]
+    if "onnx/model.onnx" not in onnx_files(path):
+        model = st.SentenceTransformer(path, backend="onnx", device="cpu")
+        with tempfile.TemporaryDirectory() as tmp:
+            model.save_pretrained(tmp)
+            os.makedirs(os.path.join(path, "onnx"), exist_ok=True)
+            for root, _, files in os.walk(tmp):
+                for name in files:
+                    if name.endswith(".onnx"):
+                        shutil.copy(os.path.join(root, name), os.path.join(path, "onnx", name))
+        print(f"💾 {key}: export -> {os.path.join(path, 'onnx', 'model.onnx')}")
+    if not quantize:
+        return "onnx/model.onnx"
+    model = st.SentenceTransformer(path, backend="onnx", device="cpu")
+    st.export_dynamic_quantized_onnx_model(model, quantize, path)
+    print(f"💾 {key}: export int8 -> onnx/model_qint8_{quantize}.onnx")
+    return f"onnx/model_qint8_{quantize}.onnx"
+
+
+def encode_each(model, texts):
+    """Encode từng text (batch 1, như query) -> (ma trận, ms / text)."""
+    start = time.perf_counter()
+    vectors = np.vstack([model.encode([t], normalize_embeddings=True) for t in texts])
+    return vectors, (time.perf_counter() - start) * 1000 / max(len(texts), 1)
+
+
+def row_cosines(a, b):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return np.einsum("ij,ij->i", a, b) / np.where(norms > 0, norms, 1)
+
+
+def top_overlap(matrix, inv_norms, ref, new, k=TOP_K):
+    """Trung bình |top-k(ref) ∩ top-k(new)| / k khi xếp hạng ma trận job theo từng cặp vector query."""
+    overlaps = []
+    for u, v in zip(ref, new):
+        a = set(top_k_indices((matrix @ u) * inv_norms, k).tolist())
+        b = set(top_k_indices((matrix @ v) * inv_norms, k).tolist())
+        overlaps.append(len(a & b) / k)
+    return float(np.mean(overlaps)) if overlaps else None
+
+
+def check_key(key, options, jobs, queries, args, import_module):
+    from app.services.segments import segment_store
+
+    path = settings.MODEL_PATHS[key]
+    model = load_encoder(path, options, import_module)
+    result = {"key": key, "backend": options["backend"], "max_seq_length": model.max_seq_length}
+    cosines = []
+
+    for field, emb_path in (settings.EMBEDDING_PATHS.get(key) or {}).items():
+        if not emb_path or not segment_store.has_matrix(f"{key}_{field}", emb_path): continue
+        matrix = segment_store.load_matrix(f"{key}_{field}", emb_path, False, True)
+        rows = jobs.index[jobs.index < matrix.shape[0]]
+        texts = jobs.loc[rows, settings.EMBEDDING_TEXT_COLUMNS[field]].fillna("").astype(str).tolist()
+        vectors = model.encode(texts, normalize_embeddings=True, batch_size=settings.ENCODER_MAX_BATCH)
+        job_cos = row_cosines(vectors, matrix[np.asarray(rows)])
+        cosines.append(job_cos)
+        result[f"job_{field}"] = (float(job_cos.min()), float(job_cos.mean()), len(job_cos))
+        result["matrix"] = matrix
+
+    if queries:
+        new, result["ms_new"] = encode_each(model, queries)
+        del model
+        reference = load_encoder(path, REFERENCE, import_module)
+        ref, result["ms_ref"] = encode_each(reference, queries)
+        del reference
+        query_cos = row_cosines(ref, new)
+        cosines.append(query_cos)
+        result["query"] = (float(query_cos.min()), float(query_cos.mean()), len(query_cos))
+        if "matrix" in result:
+            matrix = np.asarray(result["matrix"], dtype=np.float32)
+            result["top_overlap"] = top_overlap(matrix, inverse_row_norms(matrix), ref, new)
+
+    result.pop("matrix", None)
+    result["min_cosine"] = float(min(c.min() for c in cosines)) if cosines else None
+    result["ok"] = result["min_cosine"] is not None and result["min_cosine"] >= args.min_cosine
+    return result
+
+
+def fmt(stat):
+    return "-" if stat is None else f"{stat[0]:.4f} / {stat[1]:.4f} ({stat[2]})"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", nargs="+", help="Mặc định: mọi transformer trong settings.MODEL_PATHS")
+    parser.add_argument("--backend", choices=BACKENDS, help="Ghi đè settings.ENCODER_BACKENDS")
+    parser.add_argument("--max-seq-length", type=int)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--onnx-file", help="vd: onnx/model_qint8_avx512_vnni.onnx")
+    parser.add_argument("--export-onnx", action="store_true", help="Export ONNX vào thư mục model trước khi kiểm tra")
+    parser.add_argument("--quantize", help="Kèm --export-onnx: cấu hình int8 (arm64 / avx2 / avx512 / avx512_vnni)")
+    parser.add_argument("--jobs", type=int, default=256, help="Số job lấy mẫu")
+    parser.add_argument("--queries", type=int, default=200, help="Số query từ evalutation/kq.xlsx (0 -> bỏ)")
+    parser.add_argument("--min-cosine", type=float, default=settings.ENCODER_DRIFT_MIN_COSINE)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app.services.data_loader import data_loader
+    from app.services.search_engine import lazy_import, search_engine
+
+    keys = args.keys or [k for k in settings.MODEL_PATHS if k.startswith(TRANSFORMER_FAMILIES)]
+    keys = [k for k in keys if os.path.exists(settings.MODEL_PATHS[k])]
+    jobs = data_loader.df.sample(min(args.jobs, len(data_loader.df)), random_state=args.seed)
+    queries = []
+    kq_path = os.path.join(BASE_DIR, "evalutation", "kq.xlsx")
+    if args.queries and os.path.exists(kq_path):
+        raw = pd.read_excel(kq_path)["query_text"].dropna().drop_duplicates()
+        raw = raw.sample(min(args.queries, len(raw)), random_state=args.seed).tolist()
+        queries = [q for q in search_engine.preprocess_many(raw) if q]
+
+    results = []
+    for key in keys:
+        onnx_file = args.onnx_file
+        if args.export_onnx:
+            onnx_file = export_onnx(key, args.quantize, lazy_import)
+        options = encoder_options(key, backend="onnx" if args.export_onnx else args.backend,
+                                  max_seq_length=args.max_seq_length, threads=args.threads, onnx_file=onnx_file)
+        print(f"🔄 {key}: {options}")
+        results.append(check_key(key, options, jobs, queries, args, lazy_import))
+
+    print(f"\n{'model':<16}{'backend':<12}{'seq':>5}  {'job cos min / mean':<30}{'query cos min / mean':<26}"
+          f"{'top10':>6}{'ms gốc':>9}{'ms mới':>9}")
+    for r in results:
+        jobs_stat = r.get("job_title") or r.get("job_overall")
+        overlap = "-" if r.get("top_overlap") is None else f"{r['top_overlap']:.3f}"
+        ms_ref = f"{r['ms_ref']:.1f}" if "ms_ref" in r else "-"
+        ms_new = f"{r['ms_new']:.1f}" if "ms_new" in r else "-"
+        print(f"{r['key']:<16}{r['backend']:<12}{str(r['max_seq_length']):>5}  {fmt(jobs_stat):<30}{fmt(r.get('query')):<26}"
+              f"{overlap:>6}{ms_ref:>9}{ms_new:>9}  {'✅' if r['ok'] else '❌'}")
+    if not all(r["ok"] for r in results):
+        print(f"❌ Có model lệch quá ngưỡng cosine {args.min_cosine}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
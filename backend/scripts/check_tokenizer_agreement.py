@@ -0,0 +1,57 @@
+"""
+Kiểm tra tokenizer longest_match (từ điển TF-IDF) so với underthesea trên:
+- query trong evalutation/kq.xlsx
+- title + mô tả của các job (lấy mẫu)
+In tỉ lệ khớp hoàn toàn, precision / recall / F1 theo token và thời gian mỗi text.
+Nên đạt F1 cao trước khi bật PREPROCESS_TOKENIZER=longest_match.
+
+Chạy từ thư mục backend:
+    python -m scripts.check_tokenizer_agreement
+    python -m scripts.check_tokenizer_agreement --jobs 2000 --show 10
+"""
+import argparse
+import os
+
+import joblib
+import pandas as pd
+
+from app.config import BASE_DIR, settings
+from app.services.text_preprocess import TextPreprocessor, load_stopwords, tokenizer_agreement
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=500, help="Số job lấy mẫu")
+    parser.add_argument("--show", type=int, default=5, help="In vài ví dụ khác nhau")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app.services.data_loader import data_loader
+
+    preprocessor = TextPreprocessor(load_stopwords(settings.STOPWORDS_PATH))
+    vectorizer = joblib.load(settings.MODEL_PATHS[settings.TOKENIZER_VOCAB_KEY])
+    preprocessor.set_vocabulary(vectorizer.vocabulary_)
+
+    sample = data_loader.df.sample(min(args.jobs, len(data_loader.df)), random_state=args.seed)
+    datasets = {"title": sample["title"].tolist(), "description": sample["description"].tolist()}
+    kq_path = os.path.join(BASE_DIR, "evalutation", "kq.xlsx")
+    if os.path.exists(kq_path):
+        datasets["query"] = pd.read_excel(kq_path)["query_text"].drop_duplicates().tolist()
+
+    print(f"{'dataset':>12} | {'texts':>6} {'exact':>6} {'P':>6} {'R':>6} {'F1':>6} {'ms UTS':>8} {'ms LM':>7}")
+    for name, texts in datasets.items():
+        r = tokenizer_agreement(preprocessor, texts)
+        print(f"{name:>12} | {r['texts']:>6} {r['exact_match']:>6.3f} {r['token_precision']:>6.3f} "
+              f"{r['token_recall']:>6.3f} {r['token_f1']:>6.3f} {r['ms_per_text_underthesea']:>8.2f} "
+              f"{r['ms_per_text_longest_match']:>7.3f}")
+
+    shown = 0
+    for text in datasets.get("query", datasets["title"]):
+        ref, fast = preprocessor.preprocess(text, "underthesea"), preprocessor.preprocess(text, "longest_match")
+        if ref != fast and shown < args.show:
+            print(f"\n{text}\n  underthesea:   {ref}\n  longest_match: {fast}")
+            shown += 1
+
+
+if __name__ == "__main__":
+    main()
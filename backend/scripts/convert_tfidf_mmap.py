@@ -0,0 +1,33 @@
+"""
+Tách ma trận TF-IDF (pickle CSR) thành các file .npy (data / indices / indptr / shape)
+để SearchEngine memory-map được thay vì unpickle 1 bản riêng trong mỗi worker.
+
+Chạy từ thư mục backend:
+    python -m scripts.convert_tfidf_mmap
+"""
+import argparse
+
+import joblib
+
+from app.config import settings
+from app.services.matrix_store import load_sparse, save_sparse_mmap
+
+TFIDF_KEYS = ["tfidf_basic", "tfidf_upgrade"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", nargs="+", default=TFIDF_KEYS)
+    args = parser.parse_args()
+
+    for key in args.keys:
+        path = settings.EMBEDDING_PATHS[key]
+        matrix = joblib.load(path)
+        paths = save_sparse_mmap(matrix, path)
+        check = load_sparse(path)
+        assert check.shape == matrix.shape and (check != matrix).nnz == 0, f"{key}: bản memory-map khác bản gốc"
+        print(f"✅ {key}: {matrix.shape}, nnz={matrix.nnz} -> {paths['data']} ...")
+
+
+if __name__ == "__main__":
+    main()
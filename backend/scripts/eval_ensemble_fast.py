@@ -0,0 +1,114 @@
+"""
+So sánh ensemble (quét toàn bộ) với ensemble_fast (pool TF-IDF / ANN rồi mới fusion)
+trên bộ query + nhãn trong thư mục evalutation/:
+- query: kq.xlsx (query_id, query_text)
+- nhãn: eval_with_gt_min2.xlsx (query_id, id, label) - job chưa gán nhãn coi là không liên quan
+Chỉ số: P@10, NDCG@10, MRR@10, judged@10 (tỉ lệ top 10 đã có nhãn), overlap@20 với ensemble,
+độ trễ mỗi query (ms, đo sau 1 lượt chạy làm nóng cache vector query).
+
+Chạy từ thư mục backend:
+    python -m scripts.eval_ensemble_fast
+    python -m scripts.eval_ensemble_fast --fields overall --pools 100 300 500 1000 --out eval_fast.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.config import BASE_DIR
+
+
+def load_eval_set(eval_dir):
+    """-> ({query_id: query_text}, {query_id: set(id job liên quan)}, {query_id: set(id job đã gán nhãn)})"""
+    kq = pd.read_excel(os.path.join(eval_dir, "kq.xlsx"))
+    queries = kq.drop_duplicates("query_id").set_index("query_id")["query_text"].astype(str).to_dict()
+
+    gt = pd.read_excel(os.path.join(eval_dir, "eval_with_gt_min2.xlsx"))
+    gt = gt.groupby(["query_id", "id"])["label"].max().reset_index()
+    relevant = gt[gt["label"] > 0].groupby("query_id")["id"].apply(set).to_dict()
+    judged = gt.groupby("query_id")["id"].apply(set).to_dict()
+    return queries, relevant, judged
+
+
+def ranking_metrics(ranked_ids, relevant, judged, k=10):
+    top = list(ranked_ids[:k])
+    gains = [1.0 if i in relevant else 0.0 for i in top]
+    dcg = sum(g / np.log2(r + 2) for r, g in enumerate(gains))
+    idcg = sum(1.0 / np.log2(r + 2) for r in range(min(len(relevant), k)))
+    first = next((r for r, g in enumerate(gains) if g), None)
+    return {
+        f"P@{k}": sum(gains) / k,
+        f"R@{k}": sum(gains) / len(relevant) if relevant else 0.0,
+        f"NDCG@{k}": dcg / idcg if idcg else 0.0,
+        f"MRR@{k}": 1.0 / (first + 1) if first is not None else 0.0,
+        f"judged@{k}": sum(1 for i in top if i in judged) / k,
+    }
+
+
+def run_mode(engine, df, queries, model_name, field, pool_size=None, top_k=20):
+    results, latencies = {}, []
+    for qid, text in queries.items():  # Lượt làm nóng (load model, cache vector query)
+        engine.search(text, df, model_name, field, top_k, pool_size=pool_size)
+    for qid, text in queries.items():
+        start = time.perf_counter()
+        df_result = engine.search(text, df, model_name, field, top_k, pool_size=pool_size)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results[qid] = df_result["id"].tolist() if not df_result.empty else []
+    return results, latencies
+
+
+def summarize(results, latencies, relevant, judged, reference=None):
+    rows = [ranking_metrics(ids, relevant.get(qid, set()), judged.get(qid, set())) for qid, ids in results.items()]
+    summary = {k: float(np.mean([r[k] for r in rows])) for k in rows[0]}
+    if reference is not None:
+        summary["overlap@20"] = float(np.mean([
+            len(set(ids[:20]) & set(reference[qid][:20])) / max(len(reference[qid][:20]), 1)
+            for qid, ids in results.items()
+        ]))
+    summary["ms_mean"] = float(np.mean(latencies))
+    summary["ms_p50"] = float(np.percentile(latencies, 50))
+    summary["ms_p95"] = float(np.percentile(latencies, 95))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval-dir", default=os.path.join(BASE_DIR, "evalutation"))
+    parser.add_argument("--fields", nargs="+", default=["title", "overall"])
+    parser.add_argument("--pools", nargs="+", type=int, default=[100, 200, 500, 1000])
+    parser.add_argument("--out", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    from app.services.data_loader import data_loader
+    from app.services.search_engine import search_engine
+
+    queries, relevant, judged = load_eval_set(args.eval_dir)
+    df = data_loader.df
+    report = []
+
+    for field in args.fields:
+        base_results, base_lat = run_mode(search_engine, df, queries, "ensemble", field)
+        report.append({"field": field, "mode": "ensemble", "pool": None,
+                       **summarize(base_results, base_lat, relevant, judged)})
+        for pool in args.pools:
+            results, lat = run_mode(search_engine, df, queries, "ensemble_fast", field, pool)
+            report.append({"field": field, "mode": "ensemble_fast", "pool": pool,
+                           **summarize(results, lat, relevant, judged, base_results)})
+
+    cols = ["P@10", "NDCG@10", "MRR@10", "judged@10", "overlap@20", "ms_mean", "ms_p50", "ms_p95"]
+    print(f"{len(queries)} query | {len(df)} job")
+    print(f"{'field':>8} {'mode':>14} {'pool':>5} | " + " ".join(f"{c:>10}" for c in cols))
+    for r in report:
+        values = " ".join(f"{r[c]:>10.3f}" if c in r else f"{'-':>10}" for c in cols)
+        print(f"{r['field']:>8} {r['mode']:>14} {str(r['pool'] or '-'):>5} | {values}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Đo recall@k của bản nén so với quét chính xác trên float32, với query là vector đã lưu của
+các job lấy mẫu ngẫu nhiên:
+- approx: top-k lấy thẳng từ điểm xấp xỉ của bản nén
+- rerank@S: lấy shortlist S dòng từ bản nén rồi tính lại cosine chính xác (giống SearchEngine)
+Kèm dung lượng và thời gian quét 1 query (ms).
+
+Chạy từ thư mục backend (cần dựng trước: python -m scripts.build_quantized_index):
+    python -m scripts.eval_quantized_recall
+    python -m scripts.eval_quantized_recall --k 20 --queries 500
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.matrix_store import cosine_scores, inverse_row_norms, load_dense
+from app.services.quantized_index import QUANT_KINDS, QuantizedMatrix
+from app.services.ranking import top_k_indices
+from scripts.build_quantized_index import dense_embedding_paths
+
+
+def _recall(truth, found):
+    return len(set(truth.tolist()) & set(found.tolist())) / len(truth)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kind", choices=QUANT_KINDS, default="int8")
+    parser.add_argument("--keys", nargs="*")
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--shortlists", nargs="+", type=int, default=[50, 100, settings.QUANT_SHORTLIST, 500])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    header = f"{'matrix':<32} {'MB f32':>7} {'MB q':>6} {'ms f32':>7} {'ms q':>6} {'approx':>7}"
+    header += "".join(f" {'rerank@' + str(s):>11}" for s in args.shortlists)
+    print(f"recall@{args.k} ({args.kind}, {args.queries} query / ma trận)")
+    print(header)
+
+    for emb_key, path in dense_embedding_paths(args.keys):
+        matrix = np.asarray(load_dense(path, mmap=False), dtype=np.float32)
+        quantized = QuantizedMatrix.load(path, args.kind, mmap=False) or QuantizedMatrix.build(matrix, args.kind)
+        inv_norms = inverse_row_norms(matrix)
+
+        rng = np.random.default_rng(args.seed)
+        query_rows = rng.choice(matrix.shape[0], size=min(args.queries, matrix.shape[0]), replace=False)
+
+        recall_approx, recall_rerank = [], {s: [] for s in args.shortlists}
+        time_exact = time_quant = 0.0
+        for row in query_rows:
+            vec = matrix[row]
+
+            start = time.perf_counter()
+            exact = cosine_scores(vec, matrix, inv_norms)
+            time_exact += time.perf_counter() - start
+            truth = top_k_indices(exact, args.k)
+
+            start = time.perf_counter()
+            approx = quantized.scores(vec)
+            time_quant += time.perf_counter() - start
+            recall_approx.append(_recall(truth, top_k_indices(approx, args.k)))
+
+            for s in args.shortlists:
+                shortlist = np.sort(top_k_indices(approx, max(s, args.k)))
+                rescored = cosine_scores(vec, matrix, inv_norms, shortlist)
+                recall_rerank[s].append(_recall(truth, shortlist[top_k_indices(rescored, args.k)]))
+
+        n = len(query_rows)
+        line = (f"{emb_key:<32} {matrix.nbytes / 1024 / 1024:>7.0f} {quantized.nbytes / 1024 / 1024:>6.0f} "
+                f"{time_exact / n * 1000:>7.2f} {time_quant / n * 1000:>6.2f} {np.mean(recall_approx):>7.3f}")
+        line += "".join(f" {np.mean(recall_rerank[s]):>11.3f}" for s in args.shortlists)
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Thêm / xóa job mà không dựng lại toàn bộ dữ liệu / embedding: job mới được tiền xử lý + encode bằng
+model đang dùng rồi ghi thành segment (SEGMENTS_DIR). Server đang chạy tự đổi sang snapshot mới
+sau tối đa SNAPSHOT_POLL_SECONDS giây (không restart, không ngắt request).
+
+Chạy từ thư mục backend:
+    python -m scripts.ingest_jobs --add new_jobs.xlsx      # .xlsx / .csv / .json, cột như file dữ liệu
+    python -m scripts.ingest_jobs --remove 12 40
+    python -m scripts.ingest_jobs --compact                # gộp các segment thành 1 base
+    python -m scripts.ingest_jobs --check                  # số dòng dữ liệu vs mọi ma trận trên đĩa
+"""
+import argparse
+
+import pandas as pd
+
+from app.services.ingest import ingestor
+
+
+def read_jobs(path):
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    if path.endswith(".json"):
+        return pd.read_json(path)
+    return pd.read_excel(path, engine="openpyxl")
+
+
+def check_files():
+    """Số dòng của mọi ma trận trên đĩa (base + segment) so với số job, không cần load model."""
+    store, engine = ingestor.store, ingestor.engine
+    n_rows = len(ingestor.loader.jobs)
+    print(f"Manifest v{store.version}: {n_rows} job, {len(store.manifest['segments'])} segment, "
+          f"{len(store.manifest['deleted'])} job đã xóa")
+    ok = True
+    for emb_key, (path, is_sparse) in sorted(engine.matrix_paths().items()):
+        if not store.has_matrix(emb_key, path, is_sparse): continue
+        rows = store.load_matrix(emb_key, path, is_sparse, True).shape[0]
+        ok &= rows == n_rows
+        print(f"  {emb_key:<36} {rows:>8} {'' if rows == n_rows else '<- lệch'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--add", help="File job mới")
+    parser.add_argument("--remove", type=int, nargs="*", default=[], help="id job cần xóa")
+    parser.add_argument("--compact", action="store_true", help="Gộp segment thành 1 base")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    if args.add or args.remove:
+        result = ingestor.ingest(read_jobs(args.add) if args.add else None, args.remove)
+        print(f"Phiên bản {result['version']}: thêm id {result['added_ids']}, xóa id {result['removed_ids']}")
+    if args.compact:
+        manifest = ingestor.compact()
+        print("Không có segment để gộp" if manifest is None else f"Thế hệ base {manifest['generation']}")
+    if args.check or not (args.add or args.remove or args.compact):
+        if not check_files():
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
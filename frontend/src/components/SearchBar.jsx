@@ -16,12 +16,14 @@ export default function SearchBar({
           onChange={(e) => setModelName(e.target.value)}
         >
           <option value="ensemble">SemLex</option>
+          <option value="ensemble_fast">SemLex (nhanh)</option>
           <option value="bge">BGE-M3</option>
           <option value="mpnet">MPNet</option>
           <option value="labse">LaBSE</option>
           <option value="doc2vec">Doc2Vec</option>
           <option value="doc2vec_dbow">Doc2Vec_dbow</option>
           <option value="tfidf">TF-IDF</option>
+          <option value="bm25">BM25</option>
           <option value="w2v">Word2Vec</option>
           <option value="w2v_sg">Word2Vec_sg</option>
         </select>
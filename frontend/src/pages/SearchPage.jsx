@@ -14,6 +14,8 @@ export default function SearchPage() {
 
   const [jobs, setJobs] = useState([]);
   const [loading, setLoading] = useState(false);
+  // [MỚI] Phân trang: còn kết quả để "Xem thêm" không
+  const [hasMore, setHasMore] = useState(false);
   
   // [MỚI] State chứa danh sách địa điểm động
   const [locations, setLocations] = useState([]);
@@ -45,7 +47,9 @@ export default function SearchPage() {
       .catch(err => console.error("Lỗi tải địa điểm:", err));
   }, []);
 
-  const performSearch = async () => {
+  const PAGE_SIZE = 20;
+
+  const performSearch = async (offset = 0) => {
     setLoading(true);
     try {
       const payload = {
@@ -57,10 +61,14 @@ export default function SearchPage() {
           location: filters.location === "Tất cả" ? null : filters.location,
           job_type: filters.job_type === "Tất cả" ? null : filters.job_type,
           min_salary: Number(filters.min_salary),
-        }
+        },
+        offset: offset,
+        limit: PAGE_SIZE,
       };
       const res = await api.search(payload);
-      setJobs(res.data);
+      // Trang sau được backend trả từ cache kết quả -> chỉ nối thêm
+      setJobs(prev => offset === 0 ? res.data : [...prev, ...res.data]);
+      setHasMore(res.data.length === PAGE_SIZE);
     } catch (err) {
       console.error(err);
     } finally {
@@ -175,6 +183,11 @@ export default function SearchPage() {
           {jobs.map(job => (
             <JobCard key={job.id} job={job} onClick={() => handleJobClick(job.id)} />
           ))}
+          {hasMore && !loading && (
+            <button onClick={() => performSearch(jobs.length)} className="btn" style={{width: '100%', marginTop: '8px'}}>
+              Xem thêm
+            </button>
+          )}
           {!loading && jobs.length === 0 && (
             <div style={{textAlign:'center', padding:'40px', color:'#64748b'}}>
               <p style={{fontSize:'1.2rem', fontWeight:'bold'}}>Không tìm thấy kết quả nào.</p>